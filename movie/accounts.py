@@ -0,0 +1,134 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import jobs
+from .api.authentication import api_key_cache
+from .models import (
+                        AccountDeletion,
+                        APIKey,
+                        BackgroundJob,
+                        Comment,
+                        Follow,
+                        Movie,
+                        SiteUser,
+                        TimelineEntry,
+                        WatchProgress,
+                    )
+
+
+PURGE_TASK = 'movie.accounts.purge_account'
+
+
+def get_account_deletion_settings():
+    return getattr(settings, 'ACCOUNT_DELETION', {})
+
+
+def delete_account(siteuser):
+    """
+    Disables the account of ``siteuser`` at once, which also ends its
+    sessions and revokes its API keys, and queues the purge of its data.
+    Returns the AccountDeletion tracking it.
+    """
+    with transaction.atomic():
+        user = siteuser.user
+
+        if user is not None:
+            user.is_active = False
+            user.set_unusable_password()
+            user.save(update_fields=['is_active', 'password'])
+
+            # update() sends no post_save, so the key cache is invalidated
+            # here, once for all keys.
+            APIKey.objects.filter(user=user).update(revoked=True)
+            api_key_cache.invalidate()
+
+        deletion, created = AccountDeletion.objects.get_or_create(
+                                siteuser=siteuser,
+                                defaults={'user': user, 'username': user.username if user else ''}
+                            )
+
+        if created:
+            jobs.enqueue(PURGE_TASK, deletion_id=deletion.pk)
+    return deletion
+
+
+def purge_stages(siteuser_id):
+    """
+    The rows of an account, in the order they are purged, with the counter
+    of AccountDeletion they add to. The rows depending on the movies go
+    first, so deleting a batch of movies cascades to a few rows only.
+    """
+    return (
+        ('comments_deleted', Comment.all_objects.filter(commenter_id=siteuser_id)),
+        ('comments_deleted', Comment.all_objects.filter(movie__uploader_id=siteuser_id)),
+        (None, TimelineEntry.objects.filter(movie__uploader_id=siteuser_id)),
+        (None, WatchProgress.objects.filter(movie__uploader_id=siteuser_id)),
+        ('movies_deleted', Movie.all_objects.filter(uploader_id=siteuser_id)),
+        (None, TimelineEntry.objects.filter(owner_id=siteuser_id)),
+        (None, WatchProgress.objects.filter(user_id=siteuser_id)),
+        (None, Follow.objects.filter(follower_id=siteuser_id)),
+        (None, Follow.objects.filter(uploader_id=siteuser_id)),
+    )
+
+
+def purge_account(deletion_id):
+    """
+    Background job deleting a batch of BATCH_SIZE rows of a deleted account
+    and queueing the next one; the account itself goes last. Each batch
+    commits on its own, so a failed purge resumes where it stopped.
+    """
+    batch_size = get_account_deletion_settings().get('BATCH_SIZE', 100)
+    deletion = AccountDeletion.objects.select_for_update() \
+                                      .filter(pk=deletion_id, finished=None) \
+                                      .first()
+
+    if deletion is None:
+        return
+
+    # Without a siteuser, as when it was deleted in the admin, only the user
+    # is left.
+    stages = purge_stages(deletion.siteuser_id) if deletion.siteuser_id is not None else ()
+
+    for counter, queryset in stages:
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+
+        if pks:
+            # Movies are deleted with their files by the post_delete signal.
+            queryset.model._base_manager.filter(pk__in=pks).delete()
+            progress = {'updated': timezone.now()}
+
+            if counter:
+                progress[counter] = F(counter) + len(pks)
+            AccountDeletion.objects.filter(pk=deletion_id).update(**progress)
+            jobs.enqueue(PURGE_TASK, deletion_id=deletion_id)
+            return
+
+    SiteUser.objects.filter(pk=deletion.siteuser_id).delete()
+    User.objects.filter(pk=deletion.user_id).delete()
+    now = timezone.now()
+    AccountDeletion.objects.filter(pk=deletion_id).update(updated=now, finished=now)
+
+
+def resume_deletions():
+    """
+    Queues the purge of the accounts whose purge failed for good, or whose
+    job was lost. Returns their number.
+    """
+    resumed = 0
+
+    for deletion_id in AccountDeletion.objects.filter(finished=None).values_list('pk', flat=True):
+        queued = BackgroundJob.objects.filter(task=PURGE_TASK, payload=json.dumps({'deletion_id': deletion_id}))
+
+        if queued.exclude(status=BackgroundJob.FAILED).exists():
+            continue
+
+        with transaction.atomic():
+            queued.delete()
+            jobs.enqueue(PURGE_TASK, deletion_id=deletion_id)
+        resumed += 1
+    return resumed
@@ -1,12 +1,255 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import (
+                        connections,
+                        models,
+                      )
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.functional import cached_property
 
+from . import (
+                accounts,
+                autocomplete,
+              )
+from .api.authentication import api_key_cache
 from .models import (
+                        APIKey,
+                        AccountDeletion,
                         Comment,
+                        Follow,
                         Movie,
                         SiteUser,
+                        email_key,
                     )
 
 
-admin.site.register(Comment)
-admin.site.register(Movie)
-admin.site.register(SiteUser)
+def get_admin_settings():
+    return getattr(settings, 'ADMIN', {})
+
+
+def table_estimate(queryset):
+    """
+    The number of rows of the table of ``queryset`` from the statistics of
+    the database, or its highest id where there are none.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s',
+                [table]
+            )
+        else:
+            return queryset.model._default_manager.using(queryset.db).aggregate(count=models.Max('pk'))['count']
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def estimate_count(queryset):
+    """
+    Counts ``queryset`` up to COUNT_LIMIT rows. Unfiltered tables larger
+    than that are estimated, filtered querysets are reported as COUNT_LIMIT
+    rows.
+    """
+    limit = get_admin_settings().get('COUNT_LIMIT', 10000)
+    count = queryset.order_by()[:limit + 1].count()
+
+    if count <= limit:
+        return count
+
+    if not queryset.query.where:
+        return max(table_estimate(queryset) or 0, count)
+    return limit
+
+
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+
+class IndexedSearchMixin(object):
+    """
+    Searches for an id, the email of ``user_field`` or a case-sensitive
+    prefix of ``name_field``, with lookups an index serves, instead of
+    ``icontains`` over every search field.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    name_field = None
+    user_field = None
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+
+        if not term:
+            return queryset, False
+
+        if term.isdigit():
+            return queryset.filter(pk=term), False
+
+        if '@' in term and self.user_field:
+            users = User.objects.annotate(email_key=email_key()).filter(email_key=term.lower())
+            return queryset.filter(**{self.user_field + '__in': users}), False
+
+        if self.name_field:
+            return queryset.filter(**{
+                       self.name_field + '__gte': term,
+                       self.name_field + '__lt': term + '\U0010ffff',
+                   }), False
+        return queryset.none(), False
+
+
+class DeletedListFilter(admin.SimpleListFilter):
+    title = 'deleted'
+    parameter_name = 'deleted'
+
+    def lookups(self, request, model_admin):
+        return (('yes', 'Yes'), ('no', 'No'), )
+
+    def queryset(self, request, queryset):
+        if self.value() in ('yes', 'no'):
+            return queryset.filter(deleted_at__isnull=self.value() == 'yes')
+        return queryset
+
+
+class SoftDeleteAdminMixin(object):
+    """
+    Lists soft deleted rows too, with actions deleting and restoring them in
+    one UPDATE.
+    """
+    list_filter = (DeletedListFilter, )
+    actions = ['soft_delete_selected', 'restore_selected', ]
+
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def soft_delete_selected(self, request, queryset):
+        updated = queryset.filter(deleted_at=None).update(deleted_at=timezone.now())
+        self.message_user(request, 'Deleted {count} {name}.'.format(count=updated, name=self.opts.verbose_name_plural))
+    soft_delete_selected.short_description = 'Delete selected %(verbose_name_plural)s (restorable)'
+
+    def restore_selected(self, request, queryset):
+        updated = queryset.exclude(deleted_at=None).update(deleted_at=None)
+        self.message_user(request, 'Restored {count} {name}.'.format(count=updated, name=self.opts.verbose_name_plural))
+    restore_selected.short_description = 'Restore selected %(verbose_name_plural)s'
+
+
+@admin.register(SiteUser)
+class SiteUserAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ('__str__', 'user', 'follower_count', 'movie_count', 'storage_bytes', )
+    list_select_related = ('user', )
+    raw_id_fields = ('user', )
+    ordering = ('-id', )
+    search_fields = ('=id', '=user__email', '^user__username', )
+    name_field = 'user__username'
+    user_field = 'user'
+    actions = ['recount_followers', 'delete_accounts', ]
+
+    def recount_followers(self, request, queryset):
+        followers = Follow.objects.filter(uploader=models.OuterRef('pk')) \
+                                  .order_by() \
+                                  .values('uploader') \
+                                  .annotate(count=models.Count('*')) \
+                                  .values('count')
+        updated = queryset.update(
+                      follower_count=Coalesce(models.Subquery(followers, output_field=models.IntegerField()), 0)
+                  )
+        self.message_user(request, 'Recounted the followers of {count} users.'.format(count=updated))
+    recount_followers.short_description = 'Recount followers of selected users'
+
+    def delete_accounts(self, request, queryset):
+        for siteuser in queryset.select_related('user'):
+            accounts.delete_account(siteuser)
+        self.message_user(request, 'Disabled the selected accounts, which are purged in the background.')
+    delete_accounts.short_description = 'Delete selected accounts in the background'
+
+
+@admin.register(Movie)
+class MovieAdmin(SoftDeleteAdminMixin, IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ('movie_name', 'uploader', 'post_date', 'view_count', 'deleted_at', )
+    list_select_related = ('uploader__user', )
+    raw_id_fields = ('uploader', )
+    date_hierarchy = 'post_date'
+    ordering = ('-post_date', '-movie_name', '-id', )
+    search_fields = ('=id', '=uploader__user__email', '^movie_name', )
+    name_field = 'movie_name'
+    user_field = 'uploader__user'
+    actions = SoftDeleteAdminMixin.actions + ['reset_view_counts', ]
+
+    def soft_delete_selected(self, request, queryset):
+        # update() sends no post_save, so the movies are removed from the
+        # autocomplete index here.
+        pks = list(queryset.filter(deleted_at=None).values_list('pk', flat=True))
+        super(MovieAdmin, self).soft_delete_selected(request, queryset)
+        autocomplete.remove_movies(pks)
+    soft_delete_selected.short_description = SoftDeleteAdminMixin.soft_delete_selected.short_description
+
+    def restore_selected(self, request, queryset):
+        pks = list(queryset.exclude(deleted_at=None).values_list('pk', flat=True))
+        super(MovieAdmin, self).restore_selected(request, queryset)
+        autocomplete.add_movies(Movie.objects.filter(pk__in=pks))
+    restore_selected.short_description = SoftDeleteAdminMixin.restore_selected.short_description
+
+    def reset_view_counts(self, request, queryset):
+        updated = queryset.update(view_count=0)
+        self.message_user(request, 'Reset the view counts of {count} movies.'.format(count=updated))
+    reset_view_counts.short_description = 'Reset view counts of selected movies'
+
+
+@admin.register(Comment)
+class CommentAdmin(SoftDeleteAdminMixin, IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ('__str__', 'movie', 'commenter', 'post_date', 'deleted_at', )
+    list_select_related = ('movie', 'commenter__user', )
+    raw_id_fields = ('movie', 'commenter', )
+    date_hierarchy = 'post_date'
+    ordering = ('-post_date', '-id', )
+    search_fields = ('=id', '=commenter__user__email', )
+    user_field = 'commenter__user'
+    actions = SoftDeleteAdminMixin.actions + ['delete_comments', ]
+
+    def delete_comments(self, request, queryset):
+        # Nothing depends on comments, so this is a single DELETE.
+        deleted, rows = queryset.delete()
+        self.message_user(request, 'Deleted {count} comments.'.format(count=deleted))
+    delete_comments.short_description = 'Delete selected comments without confirmation'
+
+
+@admin.register(APIKey)
+class APIKeyAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ('__str__', 'user', 'scopes', 'created', 'revoked', )
+    list_select_related = ('user', )
+    raw_id_fields = ('user', )
+    ordering = ('-id', )
+    search_fields = ('=id', '=user__email', )
+    user_field = 'user'
+    actions = ['revoke_keys', ]
+
+    def revoke_keys(self, request, queryset):
+        # update() sends no post_save, so the key cache is invalidated here,
+        # once for all keys.
+        updated = queryset.update(revoked=True)
+        api_key_cache.invalidate()
+        self.message_user(request, 'Revoked {count} API keys.'.format(count=updated))
+    revoke_keys.short_description = 'Revoke selected API keys'
+
+
+@admin.register(AccountDeletion)
+class AccountDeletionAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'requested', 'updated', 'finished', 'movies_deleted', 'comments_deleted', )
+    readonly_fields = ('siteuser', 'user', 'username', 'requested', 'updated', 'finished', 'movies_deleted', 'comments_deleted', )
+    ordering = ('-id', )
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (
+                                            BaseAuthentication,
+                                            get_authorization_header,
+                                          )
+
+from ..models import APIKey
+
+
+GENERATION_CACHE_KEY = 'movie:api-key:generation'
+
+
+class APIKeyCache(object):
+    """
+    Bounded LRU cache of verified API keys, keyed by the key digest.
+
+    Every process keeps its own entries. Revocation bumps a generation number
+    in the shared cache, and each process compares its generation at most
+    once per ``revalidate_interval`` seconds, so the hot path is one
+    dictionary lookup.
+    """
+
+    def __init__(self, max_size=1024, ttl=300, revalidate_interval=5):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.revalidate_interval = revalidate_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._checked_at = None
+        self.epoch = 0
+
+    def _clear(self):
+        self._entries.clear()
+        self.epoch += 1
+
+    def _revalidate(self, now):
+        if self._checked_at is not None \
+           and now - self._checked_at < self.revalidate_interval:
+            return
+        self._checked_at = now
+        generation = cache.get(GENERATION_CACHE_KEY)
+
+        if generation != self._generation:
+            self._generation = generation
+            self._clear()
+
+    def get(self, digest):
+        now = time.monotonic()
+        with self._lock:
+            self._revalidate(now)
+            entry = self._entries.get(digest)
+
+            if entry is None:
+                return None
+            credentials, expires_at = entry
+
+            if expires_at < now:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return credentials
+
+    def set(self, digest, credentials, epoch):
+        with self._lock:
+            if epoch != self.epoch:
+                return
+            self._entries[digest] = (credentials, time.monotonic() + self.ttl)
+            self._entries.move_to_end(digest)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        try:
+            generation = cache.incr(GENERATION_CACHE_KEY)
+        except ValueError:
+            generation = 1
+            cache.set(GENERATION_CACHE_KEY, generation, None)
+
+        with self._lock:
+            self._generation = generation
+            self._clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+api_key_cache = APIKeyCache(**getattr(settings, 'API_KEY_CACHE', {}))
+
+
+class APIKeyAuthentication(BaseAuthentication):
+    """
+    Clients authenticate by passing an issued key in the "Authorization"
+    header, for example:
+
+        Authorization: Api-Key 3q2-7wABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijk
+    """
+
+    keyword = 'Api-Key'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid API key header.'))
+
+        try:
+            raw_key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid API key header.'))
+
+        return self.authenticate_credentials(raw_key)
+
+    def authenticate_credentials(self, raw_key):
+        digest = APIKey.hash_key(raw_key)
+        credentials = api_key_cache.get(digest)
+
+        if credentials is not None:
+            return credentials
+
+        epoch = api_key_cache.epoch
+        try:
+            api_key = APIKey.objects.select_related('user').get(
+                          hashed_key=digest,
+                          revoked=False
+                      )
+        except APIKey.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid API key.'))
+
+        if not api_key.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        credentials = (api_key.user, api_key)
+        api_key_cache.set(digest, credentials, epoch)
+        return credentials
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,15 @@
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import exception_handler as default_exception_handler
+
+from ..quotas import QuotaExceeded
+
+
+def exception_handler(exc, context):
+    """
+    Answers uploads over the storage quota, stopped while the body is parsed,
+    with 413.
+    """
+    if isinstance(exc, QuotaExceeded):
+        return Response({'detail': str(exc)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    return default_exception_handler(exc, context)
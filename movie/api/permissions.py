@@ -0,0 +1,38 @@
+from rest_framework import permissions
+
+from ..models import APIKey
+
+
+class IsAdminUserOrAPIKey(permissions.IsAdminUser):
+    """
+    Staff users, and requests authenticated with an API key of any user,
+    such as the ingest accounts, whose scopes HasAPIKeyScope checks.
+    """
+
+    def has_permission(self, request, view):
+        if isinstance(request.auth, APIKey):
+            return True
+        return super(IsAdminUserOrAPIKey, self).has_permission(request, view)
+
+
+class HasAPIKeyScope(permissions.BasePermission):
+    """
+    Requests authenticated with an API key need '<scope>:read' for safe
+    methods and '<scope>:write' for the others, where the scope is the
+    viewset's ``api_key_scope``. Other authentication methods pass through.
+    """
+
+    def has_permission(self, request, view):
+        if not isinstance(request.auth, APIKey):
+            return True
+
+        scope = getattr(view, 'api_key_scope', None)
+
+        if scope is None:
+            return False
+
+        if request.method in permissions.SAFE_METHODS:
+            access = 'read'
+        else:
+            access = 'write'
+        return '{scope}:{access}'.format(scope=scope, access=access) in request.auth.scope_set
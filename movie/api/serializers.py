@@ -74,7 +74,11 @@ class MovieSerializer(serializers.ModelSerializer):
                     'movie_name',
                     'description',
                     'uploaded_file',
+                    'view_count',
                  )
+        read_only_fields = (
+                              'view_count',
+                           )
 
 
 class CommentSerializer(serializers.ModelSerializer):
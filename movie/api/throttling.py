@@ -0,0 +1,40 @@
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from ..throttling import (
+                            check_rate,
+                            content_length,
+                            get_ident,
+                         )
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Takes one token per request from the bucket of the view's
+    ``throttle_scope``, keyed by API key, user or client address.
+    """
+
+    scope = 'api'
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', self.scope)
+        allowed, self.wait_time = check_rate(scope, get_ident(request))
+        return allowed
+
+    def wait(self):
+        return self.wait_time
+
+
+class UploadBytesThrottle(TokenBucketThrottle):
+    """
+    Takes one token per request body byte of unsafe requests.
+    """
+
+    scope = 'api-upload-bytes'
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+
+        allowed, self.wait_time = check_rate(self.scope, get_ident(request), content_length(request))
+        return allowed
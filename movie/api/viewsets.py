@@ -1,5 +1,15 @@
-from rest_framework import viewsets
+from django.db import transaction
+from rest_framework import (
+                                status,
+                                viewsets,
+                            )
+from rest_framework.response import Response
 
+from .. import (
+                accounts,
+                quotas,
+                rankings,
+               )
 from ..models import (
                         Comment,
                         Movie,
@@ -11,19 +21,51 @@ from . import serializers
 class SiteUserListRestApiViewSet(viewsets.ModelViewSet):
     queryset = SiteUser.objects.all()
     serializer_class = serializers.SiteUserSerializer
+    api_key_scope = 'user'
 
     def destroy(self, request, *args, **kwargs):
-        user_obj = self.get_object().user
-        result = super(SiteUserListRestApiViewSet, self).destroy(request, *args, **kwargs)
-        user_obj.delete()
-        return result
+        # The account is disabled now and purged by a background job.
+        accounts.delete_account(self.get_object())
+        return Response(status=status.HTTP_202_ACCEPTED)
 
 
 class MovieListRestApiViewSet(viewsets.ModelViewSet):
     queryset = Movie.objects.all()
     serializer_class = serializers.MovieSerializer
+    api_key_scope = 'movie'
+    is_movie_upload = True
+
+    def initial(self, request, *args, **kwargs):
+        if self.is_movie_upload and self.action == 'create':
+            quotas.mark_upload(request._request)
+        super(MovieListRestApiViewSet, self).initial(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super(MovieListRestApiViewSet, self).get_queryset()
+
+        if self.action == 'list':
+            queryset = rankings.order_by_ranking(queryset, self.request.query_params.get('sort'))
+        return queryset
+
+    def perform_create(self, serializer):
+        # The movie and the storage counters of its uploader are saved
+        # together.
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        instance.soft_delete()
 
 
 class CommentListRestApiViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all()
+    # Comments of soft deleted movies are hidden with them.
+    queryset = Comment.objects.filter(movie__deleted_at=None)
     serializer_class = serializers.CommentSerializer
+    api_key_scope = 'comment'
+
+    def perform_destroy(self, instance):
+        instance.soft_delete()
@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class MovieConfig(AppConfig):
     name = 'movie'
+
+    def ready(self):
+        from . import (
+                        metrics,
+                        slow_queries,
+                      )
+        from .instrumentation import (
+                                        add_query_observer,
+                                        install_cursor_wrappers,
+                                     )
+        connection_created.connect(install_cursor_wrappers)
+        add_query_observer(metrics.observe_query)
+        add_query_observer(slow_queries.observe_query)
@@ -0,0 +1,387 @@
+import asyncio
+import mimetypes
+import os
+import re
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.utils.http import http_date
+
+from . import (
+                signed_media,
+                uploads,
+                view_counts,
+                watch_progress,
+              )
+
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+_pools = {}
+
+
+def get_asgi_settings():
+    return getattr(settings, 'ASGI', {})
+
+
+def get_pool(name):
+    pool = _pools.get(name)
+
+    if pool is None:
+        workers = get_asgi_settings().get(name, 8)
+        pool = _pools[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name.lower())
+    return pool
+
+
+def parse_range(header, size):
+    """
+    Returns ``(start, end)`` (inclusive) of a single byte range, None when the
+    header is missing or not understood, and raises ValueError when the range
+    is not satisfiable.
+    """
+    match = RANGE.match(header or '')
+
+    if match is None or size == 0 and not match.group(1):
+        return None
+
+    first, last = match.groups()
+
+    if not first:
+        if not last:
+            return None
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable.')
+    return start, end
+
+
+def get_header(scope, name):
+    for key, value in scope.get('headers', ()):
+        if key.decode('latin1').lower() == name:
+            return value.decode('latin1')
+    return None
+
+
+def encode_headers(headers):
+    return [[name.encode('latin1'), str(value).encode('latin1')] for name, value in headers]
+
+
+async def watch_disconnect(receive):
+    while True:
+        message = await receive()
+
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def read_chunk(fp, offset, size):
+    fp.seek(offset)
+    return fp.read(size)
+
+
+async def send_simple(send, status, headers=(), body=b''):
+    await send({'type': 'http.response.start', 'status': status, 'headers': encode_headers(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def serve_file(scope, receive, send, path):
+    """
+    Streams the file with single byte range support. Reads run on the
+    FILE_THREADS pool; the next chunk is only read once ``send`` accepted the
+    previous one, so a slow client holds one chunk and no thread.
+    """
+    loop = asyncio.get_event_loop()
+    pool = get_pool('FILE_THREADS')
+    chunk_size = get_asgi_settings().get('MEDIA_CHUNK_SIZE', 64 * 1024)
+
+    try:
+        fp = await loop.run_in_executor(pool, open, path, 'rb')
+    except OSError:
+        await send_simple(send, 404)
+        return
+
+    disconnected = asyncio.ensure_future(watch_disconnect(receive))
+    try:
+        stat = os.fstat(fp.fileno())
+        content_type, _ = mimetypes.guess_type(path)
+        headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Accept-Ranges', 'bytes'),
+            ('Last-Modified', http_date(stat.st_mtime)),
+        ]
+
+        try:
+            byte_range = parse_range(get_header(scope, 'range'), stat.st_size)
+        except ValueError:
+            await send_simple(send, 416, [('Content-Range', 'bytes */{size}'.format(size=stat.st_size))])
+            return
+
+        if byte_range is None:
+            status, start, end = 200, 0, stat.st_size - 1
+        else:
+            status, (start, end) = 206, byte_range
+            headers.append(('Content-Range', 'bytes {start}-{end}/{size}'.format(start=start, end=end, size=stat.st_size)))
+        headers.append(('Content-Length', end - start + 1))
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': encode_headers(headers)})
+
+        offset = start
+        more_body = True
+        while scope['method'] != 'HEAD' and offset <= end and not disconnected.done():
+            chunk = await loop.run_in_executor(pool, read_chunk, fp, offset, min(chunk_size, end - offset + 1))
+
+            if not chunk:
+                break
+            offset += len(chunk)
+            more_body = offset <= end
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+
+        if more_body and not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        await loop.run_in_executor(pool, fp.close)
+
+
+async def send_text(send, status, message):
+    await send_simple(send, status, [('Content-Type', 'text/plain'), ], message.encode())
+
+
+async def receive_upload(scope, receive, send):
+    """
+    Writes the body of a PUT to a signed upload URL to its staged file as it
+    arrives, on the FILE_THREADS pool, without running the WSGI application.
+    """
+    if scope['method'] != 'PUT':
+        await send_text(send, 405, 'PUT the movie to this URL.')
+        return
+
+    loop = asyncio.get_event_loop()
+    pool = get_pool('FILE_THREADS')
+    try:
+        staged = await loop.run_in_executor(
+                     pool,
+                     uploads.start,
+                     scope['path'],
+                     scope.get('query_string', b'').decode('latin1'),
+                     uploads.content_length(get_header(scope, 'content-length'))
+                 )
+    except uploads.InvalidUpload as e:
+        await send_text(send, e.status, str(e))
+        return
+
+    try:
+        while True:
+            message = await receive()
+
+            if message['type'] == 'http.disconnect':
+                return
+            await loop.run_in_executor(pool, staged.write, message.get('body', b''))
+
+            if not message.get('more_body', False):
+                break
+        await loop.run_in_executor(pool, staged.commit)
+    except uploads.InvalidUpload as e:
+        await send_text(send, e.status, str(e))
+        return
+    finally:
+        await loop.run_in_executor(pool, staged.close)
+    await send_text(send, 201, 'Uploaded.')
+
+
+def media_path(path):
+    name = unquote(path[len(settings.MEDIA_URL):])
+
+    try:
+        full_path = os.path.realpath(default_storage.path(name))
+    except SuspiciousFileOperation:
+        return None
+
+    roots = [os.path.realpath(root) for root in getattr(default_storage, 'roots', [settings.MEDIA_ROOT])]
+
+    if not any(full_path.startswith(root + os.sep) for root in roots) or not os.path.isfile(full_path):
+        return None
+    return full_path
+
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': 'HTTP/{version}'.format(version=scope.get('http_version', '1.1')),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+    for key, value in scope.get('headers', ()):
+        key = key.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+
+        if key in environ:
+            value = environ[key] + ',' + value
+        environ[key] = value
+    return environ
+
+
+def run_wsgi(wsgi_application, environ, send, loop):
+    """
+    Runs the WSGI application on a worker thread. Every part of the response
+    is handed to the event loop and waited for, so the whole request, closing
+    included, happens on this one thread.
+    """
+    def call_soon(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def send_start():
+        if not start['started']:
+            call_soon({'type': 'http.response.start', 'status': start['status'], 'headers': start['headers']})
+            start['started'] = True
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and start['started']:
+            raise exc_info[1].with_traceback(exc_info[2])
+        start['status'] = int(status.split(' ', 1)[0])
+        start['headers'] = encode_headers(headers)
+        return write
+
+    def write(data):
+        # The legacy write() of PEP 3333, sending data right away.
+        send_start()
+
+        if data:
+            call_soon({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+    start = {'started': False, }
+    result = wsgi_application(environ, start_response)
+    try:
+        for chunk in result:
+            write(chunk)
+
+        send_start()
+        call_soon({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+async def read_body(receive):
+    body = tempfile.SpooledTemporaryFile(max_size=get_asgi_settings().get('MAX_BUFFERED_BODY', 1024 * 1024))
+
+    while True:
+        message = await receive()
+
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None
+        body.write(message.get('body', b''))
+
+        if not message.get('more_body', False):
+            break
+    body.seek(0)
+    return body
+
+
+class ASGIHandler(object):
+    """
+    ASGI application serving MEDIA_URL with async range streaming, to signed
+    URLs only when SIGNED_MEDIA is enabled, receiving the uploads to signed
+    upload URLs as they stream in, and every other request with the WSGI
+    application on the WSGI_THREADS pool.
+    """
+
+    def __init__(self, wsgi_application):
+        self.wsgi_application = wsgi_application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError('Unsupported scope type {type}.'.format(type=scope['type']))
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+
+            if message['type'] == 'lifespan.startup':
+                # Loaded before the first request, which would wait for it
+                # otherwise. Imported here, as the models are not ready when
+                # this module is.
+                from .autocomplete import get_index
+                await asyncio.get_event_loop().run_in_executor(None, get_index)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for flush in (view_counts.flush_at_shutdown, watch_progress.flush_at_shutdown):
+                    await asyncio.get_event_loop().run_in_executor(None, flush)
+
+                for pool in list(_pools.values()):
+                    pool.shutdown(wait=False)
+                _pools.clear()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        if scope['path'].startswith(uploads.url_prefix()):
+            await receive_upload(scope, receive, send)
+            return
+
+        if scope['method'] in ('GET', 'HEAD') and settings.MEDIA_URL and scope['path'].startswith(settings.MEDIA_URL):
+            # The signature is checked first, so unsigned requests cannot
+            # probe for files.
+            if signed_media.is_enabled() and not signed_media.verify(
+                unquote(scope['path'][len(settings.MEDIA_URL):]),
+                scope.get('query_string', b'').decode('latin1'),
+                get_header(scope, 'cookie')
+            ):
+                await send_simple(send, 403)
+                return
+            path = media_path(scope['path'])
+
+            if path is None:
+                await send_simple(send, 404)
+            else:
+                await serve_file(scope, receive, send, path)
+            return
+
+        body = await read_body(receive)
+
+        if body is None:
+            return
+
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(
+                get_pool('WSGI_THREADS'),
+                run_wsgi,
+                self.wsgi_application,
+                build_environ(scope, body),
+                send,
+                loop
+            )
+        finally:
+            body.close()
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+
+
+USER_CACHE_KEY = 'movie:auth-user:{pk}'
+GENERATION_CACHE_KEY = 'movie:auth-user-generation'
+
+
+def get_cached_auth_settings():
+    return getattr(settings, 'CACHED_AUTH', {})
+
+
+def get_cache():
+    return caches[get_cached_auth_settings().get('CACHE_ALIAS', 'default')]
+
+
+def user_cache_key(pk):
+    return USER_CACHE_KEY.format(pk=pk)
+
+
+def get_user(request):
+    """
+    Same as ``django.contrib.auth.get_user()``, but the user is read from the
+    cache when CACHED_AUTH is enabled. The session hash is still verified
+    against the cached user, so a password change logs out other sessions.
+    """
+    options = get_cached_auth_settings()
+
+    if not options.get('ENABLED', False):
+        return auth.get_user(request)
+
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+
+    cache = get_cache()
+    key = user_cache_key(user_id)
+    cached = cache.get_many([GENERATION_CACHE_KEY, key])
+    generation = cached.get(GENERATION_CACHE_KEY, 0)
+    entry = cached.get(key)
+    user = entry[1] if entry is not None and entry[0] == generation else None
+
+    if user is None:
+        user = auth.load_backend(backend_path).get_user(user_id)
+
+        if user is None:
+            return AnonymousUser()
+        cache.set(key, (generation, user), options.get('USER_TIMEOUT', 300))
+    user.backend = backend_path
+
+    if hasattr(user, 'get_session_auth_hash'):
+        session_hash = request.session.get(auth.HASH_SESSION_KEY)
+
+        if not (session_hash and constant_time_compare(session_hash, user.get_session_auth_hash())):
+            request.session.flush()
+            return AnonymousUser()
+    return user
+
+
+def invalidate_user(sender, instance, **kwargs):
+    if get_cached_auth_settings().get('ENABLED', False):
+        get_cache().delete(user_cache_key(instance.pk))
+
+
+def invalidate_users():
+    """
+    Drops every cached user by bumping the generation their entries are
+    stored under. Call it after changing users with ``QuerySet.update()``
+    (e.g. ``is_active=False``), which sends no signal to ``invalidate_user``.
+    """
+    if not get_cached_auth_settings().get('ENABLED', False):
+        return
+    cache = get_cache()
+
+    try:
+        cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(GENERATION_CACHE_KEY, 1, None)
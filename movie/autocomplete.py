@@ -0,0 +1,267 @@
+import bisect
+import heapq
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Movie
+
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Appended to a prefix, sorts after every word starting with the prefix.
+HIGHEST = '\U0010ffff'
+
+SNAPSHOT_VERSION = 1
+
+
+def get_autocomplete_settings():
+    return getattr(settings, 'AUTOCOMPLETE', {})
+
+
+def normalize(text):
+    """
+    The words of ``text``, case folded and without accents.
+    """
+    text = unicodedata.normalize('NFKD', text)
+    return TOKEN_RE.findall(''.join(char for char in text if not unicodedata.combining(char)).casefold())
+
+
+class PrefixIndex(object):
+    """
+    Movies by the prefixes of the words of their names: a sorted array of
+    the words and a parallel array of movie ids, searched with bisect.
+    """
+
+    def __init__(self):
+        # pk -> (name, popularity, words)
+        self.movies = {}
+        self._words = []
+        self._ids = []
+        self._results = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.movies)
+
+    @classmethod
+    def build(cls, movies):
+        """
+        From (pk, name, popularity) tuples.
+        """
+        index = cls()
+        entries = []
+
+        for pk, name, popularity in movies:
+            entries.extend((word, pk) for word in index._set_movie(pk, name, popularity))
+        entries.sort()
+        index._words = [word for word, pk in entries]
+        index._ids = [pk for word, pk in entries]
+        return index
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as fp:
+            data = json.load(fp)
+
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported autocomplete snapshot version: {version!r}'.format(version=data.get('version')))
+
+        index = cls()
+        for pk, name, popularity, words in data['movies']:
+            index.movies[pk] = (name, popularity, tuple(sys.intern(word) for word in words))
+        index._words = [sys.intern(word) for word in data['words']]
+        index._ids = data['ids']
+        return index
+
+    def save(self, path):
+        with self._lock:
+            data = {
+                'version': SNAPSHOT_VERSION,
+                'movies': [[pk, name, popularity, words] for pk, (name, popularity, words) in self.movies.items()],
+                'words': self._words,
+                'ids': self._ids,
+            }
+            temp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+
+            with open(temp_path, 'w') as fp:
+                json.dump(data, fp, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+    def _set_movie(self, pk, name, popularity):
+        words = tuple(sorted({sys.intern(word) for word in normalize(name)}))
+        self.movies[pk] = (name, popularity, words)
+        return words
+
+    def _forget_results(self, words):
+        """
+        Drops the cached results of the queries matching a movie with these
+        words.
+        """
+        for key in list(self._results):
+            if all(any(word.startswith(prefix) for word in words) for prefix in key[0]):
+                del self._results[key]
+
+    def add(self, pk, name, popularity):
+        with self._lock:
+            self.remove(pk)
+            words = self._set_movie(pk, name, popularity)
+
+            for word in words:
+                position = bisect.bisect_left(self._words, word)
+                self._words.insert(position, word)
+                self._ids.insert(position, pk)
+            self._forget_results(words)
+
+    def remove(self, pk):
+        with self._lock:
+            movie = self.movies.pop(pk, None)
+
+            if movie is None:
+                return
+
+            for word in movie[2]:
+                start = bisect.bisect_left(self._words, word)
+                position = self._ids.index(pk, start, bisect.bisect_right(self._words, word, start))
+                del self._words[position]
+                del self._ids[position]
+            self._forget_results(movie[2])
+
+    def search(self, query, limit):
+        """
+        The (pk, name) of the ``limit`` most popular movies with a word
+        starting with each word of ``query``, of which one must have at least
+        MIN_LENGTH characters. Matches are collected from the rarest prefix;
+        results of queries matching more than SCAN_LIMIT words are kept until
+        a matching movie changes.
+        """
+        options = get_autocomplete_settings()
+        prefixes = tuple(sorted(set(normalize(query))))
+
+        if not prefixes or max(map(len, prefixes)) < options.get('MIN_LENGTH', 2):
+            return []
+
+        with self._lock:
+            key = (prefixes, limit)
+            results = self._results.get(key)
+
+            if results is not None:
+                return results
+
+            start, stop = min(
+                              ((bisect.bisect_left(self._words, prefix), bisect.bisect_left(self._words, prefix + HIGHEST))
+                               for prefix in prefixes),
+                              key=lambda bounds: bounds[1] - bounds[0]
+                          )
+            candidates = set(self._ids[start:stop])
+
+            if len(prefixes) > 1:
+                candidates = [
+                    pk for pk in candidates
+                    if all(any(word.startswith(prefix) for word in self.movies[pk][2]) for prefix in prefixes)
+                ]
+
+            results = [
+                (pk, self.movies[pk][0])
+                for pk in heapq.nlargest(limit, candidates, key=lambda pk: (self.movies[pk][1], pk))
+            ]
+
+            if stop - start > options.get('SCAN_LIMIT', 500):
+                if len(self._results) >= options.get('CACHE_SIZE', 1000):
+                    self._results.clear()
+                self._results[key] = results
+        return results
+
+
+def build_index():
+    return PrefixIndex.build(Movie.objects.order_by().values_list('pk', 'movie_name', 'view_count').iterator())
+
+
+_index = None
+_index_lock = threading.Lock()
+_snapshot_mtime = None
+_checked_at = 0
+
+
+def get_index():
+    """
+    The index of this process, loaded from SNAPSHOT if there is one and
+    built from the database otherwise. Reloaded when the snapshot changes,
+    which is checked every CHECK_INTERVAL seconds. The ASGI handler loads it
+    at startup; under WSGI the first request of each process does.
+    """
+    global _index, _snapshot_mtime, _checked_at
+
+    options = get_autocomplete_settings()
+    path = options.get('SNAPSHOT')
+
+    if _index is not None and (not path or time.monotonic() - _checked_at < options.get('CHECK_INTERVAL', 30)):
+        return _index
+
+    with _index_lock:
+        _checked_at = time.monotonic()
+        try:
+            mtime = os.stat(path).st_mtime if path else None
+        except OSError:
+            mtime = None
+
+        if _index is None or (mtime is not None and mtime != _snapshot_mtime):
+            _index = PrefixIndex.load(path) if mtime is not None else build_index()
+            _snapshot_mtime = mtime
+    return _index
+
+
+@receiver(setting_changed)
+def reset_index(setting, **kwargs):
+    global _index, _snapshot_mtime
+
+    if setting == 'AUTOCOMPLETE':
+        _index = _snapshot_mtime = None
+
+
+def update_index(sender, instance, **kwargs):
+    """
+    Keeps the index of this process up to date with saved and deleted
+    movies. Other processes see them only once they load the next snapshot,
+    and keep suggesting deleted movies and missing new ones until then.
+    """
+    if _index is None:
+        return
+
+    if kwargs.get('signal') is post_delete or instance.deleted_at is not None:
+        _index.remove(instance.pk)
+    else:
+        _index.add(instance.pk, instance.movie_name, instance.view_count)
+
+
+def remove_movies(pks):
+    """
+    Removes movies soft deleted with ``QuerySet.update()``, which sends no
+    signal to ``update_index``, from the index of this process.
+    """
+    if _index is None:
+        return
+
+    for pk in pks:
+        _index.remove(pk)
+
+
+def add_movies(movies):
+    """
+    Adds movies restored with ``QuerySet.update()`` to the index of this
+    process.
+    """
+    if _index is None:
+        return
+
+    for pk, name, popularity in movies.values_list('pk', 'movie_name', 'view_count'):
+        _index.add(pk, name, popularity)
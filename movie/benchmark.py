@@ -0,0 +1,492 @@
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.test import (
+                            Client,
+                            override_settings,
+                        )
+from django.urls import reverse
+from django.utils import timezone
+
+from . import instrumentation
+from .models import (
+                        Comment,
+                        Movie,
+                        SiteUser,
+                    )
+
+
+# Smallest box layout accepted as video/mp4 by libmagic (see MovieUploadForm).
+MP4_STUB = b'\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2' + b'\x00\x00\x00\x08free'
+
+WORDS = (
+    'action', 'adventure', 'cat', 'city', 'comedy', 'cooking', 'dance', 'dog',
+    'drama', 'family', 'game', 'guitar', 'history', 'holiday', 'horror', 'live',
+    'music', 'night', 'ocean', 'party', 'piano', 'review', 'river', 'science',
+    'soccer', 'space', 'summer', 'travel', 'tutorial', 'winter',
+)
+
+USER_PREFIX = 'bench-user-'
+ADMIN_USERNAME = 'bench-admin@example.com'
+BATCH_SIZE = 500
+
+
+def zipf_cum_weights(count, exponent=1.1):
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def seed(users, movies, comments, rng=None):
+    """
+    Bulk-creates users, movies with mp4 stub files and comments. Uploads and
+    comments follow a Zipf distribution, so a few users and movies get most
+    of them, as in production.
+    """
+    rng = rng or random.Random()
+    password = make_password('benchmark')
+    run_id = uuid.uuid4().hex[:8]
+    now = timezone.now()
+
+    with transaction.atomic():
+        User.objects.get_or_create(
+            username=ADMIN_USERNAME,
+            defaults={
+                'email': ADMIN_USERNAME,
+                'password': password,
+                'is_staff': True,
+            }
+        )
+        User.objects.bulk_create(
+            [
+                User(
+                    username='{prefix}{run_id}-{num}@example.com'.format(prefix=USER_PREFIX, run_id=run_id, num=num),
+                    email='{prefix}{run_id}-{num}@example.com'.format(prefix=USER_PREFIX, run_id=run_id, num=num),
+                    first_name=rng.choice(WORDS).title(),
+                    last_name=rng.choice(WORDS).title(),
+                    password=password,
+                )
+                for num in range(users)
+            ],
+            batch_size=BATCH_SIZE
+        )
+        user_ids = list(
+                       User.objects.filter(
+                           username__startswith='{prefix}{run_id}-'.format(prefix=USER_PREFIX, run_id=run_id)
+                       ).values_list('id', flat=True)
+                   )
+        SiteUser.objects.bulk_create(
+            [SiteUser(user_id=user_id, bio='benchmark user') for user_id in user_ids],
+            batch_size=BATCH_SIZE
+        )
+        site_user_ids = list(SiteUser.objects.filter(user_id__in=user_ids).values_list('id', flat=True))
+        rng.shuffle(site_user_ids)
+        user_weights = zipf_cum_weights(len(site_user_ids))
+
+        movie_objects = []
+        uploader_ids = rng.choices(site_user_ids, cum_weights=user_weights, k=movies)
+        for num in range(movies):
+            name = default_storage.save(
+                       'files/benchmark/{run_id}/{num}.mp4'.format(run_id=run_id, num=num),
+                       ContentFile(MP4_STUB)
+                   )
+            movie_objects.append(
+                Movie(
+                    uploader_id=uploader_ids[num],
+                    movie_name=' '.join(rng.sample(WORDS, 3)),
+                    description=' '.join(rng.choice(WORDS) for num in range(20)),
+                    uploaded_file=name,
+                    post_date=now - timezone.timedelta(minutes=rng.randrange(60 * 24 * 365)),
+                )
+            )
+        Movie.objects.bulk_create(movie_objects, batch_size=BATCH_SIZE)
+        movie_ids = list(
+                        Movie.objects.filter(
+                            uploaded_file__startswith='files/benchmark/{run_id}/'.format(run_id=run_id)
+                        ).values_list('id', flat=True)
+                    )
+        rng.shuffle(movie_ids)
+        movie_weights = zipf_cum_weights(len(movie_ids))
+
+        for start in range(0, comments if movie_ids else 0, BATCH_SIZE):
+            size = min(BATCH_SIZE, comments - start)
+            Comment.objects.bulk_create([
+                Comment(
+                    movie_id=movie_id,
+                    commenter_id=commenter_id,
+                    description=' '.join(rng.choice(WORDS) for num in range(8)),
+                    post_date=now - timezone.timedelta(minutes=rng.randrange(60 * 24 * 30)),
+                )
+                for movie_id, commenter_id in zip(
+                    rng.choices(movie_ids, cum_weights=movie_weights, k=size),
+                    rng.choices(site_user_ids, cum_weights=user_weights, k=size)
+                )
+            ])
+
+    return {
+        'users': len(site_user_ids),
+        'movies': len(movie_ids),
+        'comments': comments if movie_ids else 0,
+    }
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = max(int(math.ceil(fraction * len(sorted_values))) - 1, 0)
+    return sorted_values[index]
+
+
+class QueryCounter(object):
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, db, sql, params, many, duration):
+        self.count += 1
+
+
+def summarize(durations, queries, errors, elapsed):
+    durations = sorted(durations)
+    count = len(durations)
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': round(percentile(durations, .50) * 1000, 3) if count else None,
+        'p95_ms': round(percentile(durations, .95) * 1000, 3) if count else None,
+        'p99_ms': round(percentile(durations, .99) * 1000, 3) if count else None,
+        'mean_ms': round(sum(durations) / count * 1000, 3) if count else None,
+        'queries_per_request': round(queries / count, 2) if count else None,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else None,
+    }
+
+
+def build_scenarios(rng):
+    movie_ids = list(Movie.objects.values_list('id', flat=True)[:1000])
+    site_user_ids = list(SiteUser.objects.values_list('id', flat=True)[:1000])
+    uploader = SiteUser.objects.select_related('user').filter(user__isnull=False).first()
+    admin = User.objects.filter(is_staff=True).first()
+
+    scenarios = [
+        ('movie-list', None, lambda: ('get', reverse('movie-list'), {})),
+        ('movie-list-search', None, lambda: ('get', reverse('movie-list'), {'q': rng.choice(WORDS)})),
+    ]
+
+    if movie_ids:
+        scenarios.append((
+            'movie-detail',
+            None,
+            lambda: ('get', reverse('movie-detail', kwargs={'pk': rng.choice(movie_ids)}), {})
+        ))
+
+    if site_user_ids:
+        scenarios.append((
+            'user-detail',
+            None,
+            lambda: ('get', reverse('user-detail', kwargs={'pk': rng.choice(site_user_ids)}), {})
+        ))
+
+    if admin is not None:
+        for name in ('api:movie-list', 'api:comment-list', 'api:siteuser-list'):
+            scenarios.append((name, admin, lambda name=name: ('get', reverse(name), {})))
+
+    if uploader is not None:
+        def upload():
+            upload_file = ContentFile(MP4_STUB, name='benchmark.mp4')
+            return (
+                'post',
+                reverse('upload-movie'),
+                {'movie_name': 'benchmark upload', 'description': 'benchmark', 'uploaded_file': upload_file, },
+            )
+        scenarios.append(('upload-movie', uploader.user, upload))
+    return scenarios
+
+
+def run(requests=100, warmup=5, scenario_names=None, seed=None):
+    """
+    Drives each scenario through the Django test client and returns the
+    report as a dict. Throttling is disabled while running, and uploaded
+    movies are deleted afterwards.
+    """
+    rng = random.Random(seed)
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'movies': Movie.objects.count(),
+            'requests_per_scenario': requests,
+        },
+        'scenarios': {},
+    }
+    counter = QueryCounter()
+    started_at = timezone.now()
+    instrumentation.add_query_observer(counter)
+
+    try:
+        with override_settings(THROTTLE=dict(getattr(settings, 'THROTTLE', {}), ENABLED=False)):
+            for name, user, make_request in build_scenarios(rng):
+                if scenario_names and name not in scenario_names:
+                    continue
+                client = Client()
+
+                if user is not None:
+                    client.force_login(user)
+
+                for num in range(warmup):
+                    method, path, data = make_request()
+                    getattr(client, method)(path, data)
+
+                durations = []
+                errors = 0
+                counter.count = 0
+                start = time.perf_counter()
+
+                for num in range(requests):
+                    method, path, data = make_request()
+                    request_start = time.perf_counter()
+                    resp = getattr(client, method)(path, data)
+                    durations.append(time.perf_counter() - request_start)
+
+                    if resp.status_code >= 400:
+                        errors += 1
+                report['scenarios'][name] = summarize(
+                                                durations,
+                                                counter.count,
+                                                errors,
+                                                time.perf_counter() - start
+                                            )
+    finally:
+        instrumentation.remove_query_observer(counter)
+        for movie in Movie.objects.filter(movie_name='benchmark upload', post_date__gte=started_at):
+            movie.delete()
+    return report
+
+
+def compare(baseline, current):
+    """
+    Returns per scenario and metric the relative change from ``baseline``.
+    """
+    changes = {}
+
+    for name, metrics in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+
+        if base is None:
+            continue
+        changes[name] = {}
+
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'throughput_rps'):
+            if base.get(key) and metrics.get(key) is not None:
+                changes[name][key] = round((metrics[key] - base[key]) / base[key], 4)
+    return changes
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+                   ['git', 'rev-parse', 'HEAD'],
+                   cwd=settings.BASE_DIR,
+                   stderr=subprocess.DEVNULL
+               ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(report, path):
+    with open(path, 'w') as fp:
+        json.dump(report, fp, indent=2, sort_keys=True)
+
+
+def read_report(path):
+    with open(os.path.expanduser(path)) as fp:
+        return json.load(fp)
+
+
+class SoakStats(object):
+
+    def __init__(self):
+        self.first_byte_times = []
+        self.bytes = 0
+        self.completed = 0
+        self.errors = 0
+        self.streams = 0
+        self.peak_streams = 0
+        self.peak_threads = threading.active_count()
+
+    def stream_started(self):
+        self.streams += 1
+        self.peak_streams = max(self.peak_streams, self.streams)
+        self.peak_threads = max(self.peak_threads, threading.active_count())
+
+    def stream_finished(self):
+        self.streams -= 1
+
+    def report(self, clients, elapsed):
+        first_byte_times = sorted(self.first_byte_times)
+        return {
+            'clients': clients,
+            'completed': self.completed,
+            'errors': self.errors,
+            'peak_streams': self.peak_streams,
+            'peak_threads': self.peak_threads,
+            'ttfb_p50_ms': round(percentile(first_byte_times, .50) * 1000, 3) if first_byte_times else None,
+            'ttfb_p99_ms': round(percentile(first_byte_times, .99) * 1000, 3) if first_byte_times else None,
+            'megabytes': round(self.bytes / 2 ** 20, 2),
+            'throughput_mbps': round(self.bytes * 8 / 10 ** 6 / elapsed, 2) if elapsed else None,
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+
+async def soak_asgi_client(application, path, delay, duration, stats):
+    """
+    One slow viewer driving the ASGI application directly: every body chunk
+    takes ``delay`` seconds to be accepted, and the viewer leaves after
+    ``duration`` seconds.
+    """
+    path, _, query_string = path.partition('?')
+    scope = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'query_string': query_string.encode(),
+        'root_path': '',
+        'headers': [[b'host', b'localhost'], [b'range', b'bytes=0-']],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    left = asyncio.Event()
+    requested = []
+    started = time.perf_counter()
+    status = []
+
+    async def receive():
+        if not requested:
+            requested.append(True)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await left.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+            stats.first_byte_times.append(time.perf_counter() - started)
+            stats.stream_started()
+        elif message.get('body'):
+            stats.bytes += len(message['body'])
+            await asyncio.sleep(delay)
+
+    timer = asyncio.get_event_loop().call_later(duration, left.set)
+    try:
+        await application(scope, receive, send)
+    except Exception:
+        stats.errors += 1
+    else:
+        if status and status[0] in (200, 206):
+            stats.completed += 1
+        else:
+            stats.errors += 1
+    finally:
+        timer.cancel()
+        if status:
+            stats.stream_finished()
+
+
+async def soak_http_client(url, delay, duration, stats):
+    """
+    One slow viewer against a running server: reads 64 KiB every ``delay``
+    seconds and disconnects after ``duration`` seconds.
+    """
+    parts = urlsplit(url)
+    started = time.perf_counter()
+    writer = None
+    streaming = False
+    try:
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        writer.write(
+            'GET {path} HTTP/1.1\r\nHost: {host}\r\nRange: bytes=0-\r\nConnection: close\r\n\r\n'.format(
+                path=parts.path + ('?' + parts.query if parts.query else ''),
+                host=parts.netloc
+            ).encode('latin1')
+        )
+        status_line = await reader.readline()
+
+        if b' 200 ' not in status_line and b' 206 ' not in status_line:
+            stats.errors += 1
+            return
+        stats.first_byte_times.append(time.perf_counter() - started)
+        stats.stream_started()
+        streaming = True
+
+        while time.perf_counter() - started < duration:
+            chunk = await reader.read(64 * 1024)
+
+            if not chunk:
+                break
+            stats.bytes += len(chunk)
+            await asyncio.sleep(delay)
+        stats.completed += 1
+    except OSError:
+        stats.errors += 1
+    finally:
+        if streaming:
+            stats.stream_finished()
+        if writer is not None:
+            writer.close()
+
+
+def soak(clients=1000, duration=10.0, delay=0.05, path=None, url=None, application=None, ramp_up=1.0):
+    """
+    Opens ``clients`` concurrent slow video streams, either against a server
+    at ``url`` or in process against ``application`` (movie_hosting.asgi by
+    default), and reports time to first byte, throughput, and peak streams,
+    threads and memory.
+    """
+    if application is None and url is None:
+        from movie_hosting.asgi import application
+
+    loop = asyncio.new_event_loop()
+    stats = SoakStats()
+
+    async def start_client(num):
+        await asyncio.sleep(ramp_up * num / clients)
+
+        if url is not None:
+            await soak_http_client(url, delay, duration, stats)
+        else:
+            await soak_asgi_client(application, path, delay, duration, stats)
+
+    start = time.perf_counter()
+    try:
+        loop.run_until_complete(asyncio.gather(*[start_client(num) for num in range(clients)], loop=loop))
+    finally:
+        loop.close()
+    report = stats.report(clients, time.perf_counter() - start)
+    report['meta'] = {
+        'commit': git_commit(),
+        'timestamp': timezone.now().isoformat(),
+        'target': url or path,
+        'duration': duration,
+        'delay': delay,
+    }
+    return report
@@ -7,7 +7,10 @@ from django import forms
 from django.forms import ModelForm
 from django.utils.translation import ugettext_lazy as _
 
-from .models import Movie
+from .models import (
+                        Movie,
+                        email_key,
+                    )
 
 
 class MovieUploadForm(ModelForm):
@@ -60,7 +63,7 @@ class SiteUserCreateForm(ModelForm):
     def clean_email(self):
         data = self.cleaned_data['email']
 
-        if User.objects.filter(email=data).exists():
+        if User.objects.annotate(email_key=email_key()).filter(email_key=data.lower()).exists():
             raise ValidationError(_('Duplicate Email Address - this email address already exists'))
         return data
 
@@ -83,6 +86,30 @@ class SiteUserUpdateEmailForm(ModelForm):
     def clean_email(self):
         data = self.cleaned_data['email']
 
-        if User.objects.filter(email=data).exists():
+        if User.objects.annotate(email_key=email_key()).filter(email_key=data.lower()).exists():
             raise ValidationError(_('Duplicate Email Address - this email address already exists'))
         return data
+
+
+class UploadURLForm(forms.Form):
+    size = forms.IntegerField(min_value=1)
+
+
+class DirectUploadForm(ModelForm):
+
+    class Meta:
+        model = Movie
+        fields = ['movie_name', 'description', ]
+
+
+class WatchProgressForm(forms.Form):
+    position = forms.FloatField(min_value=0)
+    duration = forms.FloatField(min_value=0, required=False)
+
+    def clean(self):
+        cleaned_data = super(WatchProgressForm, self).clean()
+        duration = cleaned_data.get('duration')
+
+        if duration and cleaned_data.get('position', 0) > duration:
+            cleaned_data['position'] = duration
+        return cleaned_data
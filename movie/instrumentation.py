@@ -0,0 +1,117 @@
+import threading
+import time
+
+from django.db.backends.utils import (
+                                        CursorDebugWrapper,
+                                        CursorWrapper,
+                                     )
+
+
+_local = threading.local()
+_query_observers = []
+
+
+def add_query_observer(observer):
+    """
+    Registers ``observer(connection, sql, params, many, duration)``, called
+    after every executed query.
+    """
+    if observer not in _query_observers:
+        _query_observers.append(observer)
+
+
+def remove_query_observer(observer):
+    if observer in _query_observers:
+        _query_observers.remove(observer)
+
+
+class RequestStats(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_name = None
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.view_started = None
+        self.view_finished = None
+        self.render_finished = None
+        self.finished = None
+
+    @property
+    def total_time(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def view_time(self):
+        if self.view_started is None:
+            return 0.0
+        return (self.view_finished or self.finished or time.perf_counter()) - self.view_started
+
+    @property
+    def render_time(self):
+        if self.view_finished is None or self.render_finished is None:
+            return 0.0
+        return self.render_finished - self.view_finished
+
+
+def start_request():
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def finish_request():
+    stats = getattr(_local, 'stats', None)
+    _local.stats = None
+
+    if stats is not None:
+        stats.finished = time.perf_counter()
+    return stats
+
+
+def current_stats():
+    return getattr(_local, 'stats', None)
+
+
+def _record(db, sql, params, many, duration):
+    stats = getattr(_local, 'stats', None)
+
+    if stats is not None:
+        stats.query_count += 1
+        stats.sql_time += duration
+
+    for observer in _query_observers:
+        observer(db, sql, params, many, duration)
+
+
+class InstrumentedCursorMixin(object):
+
+    def execute(self, sql, params=None):
+        start = time.perf_counter()
+        try:
+            return super(InstrumentedCursorMixin, self).execute(sql, params)
+        finally:
+            _record(self.db, sql, params, False, time.perf_counter() - start)
+
+    def executemany(self, sql, param_list):
+        start = time.perf_counter()
+        try:
+            return super(InstrumentedCursorMixin, self).executemany(sql, param_list)
+        finally:
+            _record(self.db, sql, param_list, True, time.perf_counter() - start)
+
+
+class InstrumentedCursorWrapper(InstrumentedCursorMixin, CursorWrapper):
+    pass
+
+
+class InstrumentedCursorDebugWrapper(InstrumentedCursorMixin, CursorDebugWrapper):
+    pass
+
+
+def install_cursor_wrappers(sender, connection, **kwargs):
+    """
+    ``connection_created`` receiver making the connection hand out
+    instrumented cursors.
+    """
+    connection.make_cursor = lambda cursor: InstrumentedCursorWrapper(cursor, connection)
+    connection.make_debug_cursor = lambda cursor: InstrumentedCursorDebugWrapper(cursor, connection)
@@ -0,0 +1,108 @@
+import json
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (
+                        models,
+                        transaction,
+                      )
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import BackgroundJob
+
+
+logger = logging.getLogger('movie.jobs')
+
+
+def get_job_settings():
+    return getattr(settings, 'JOBS', {})
+
+
+def enqueue(task, run_after=None, **kwargs):
+    """
+    Queues a call of the function at the dotted path ``task`` with
+    ``kwargs``, which must be JSON serializable. Enqueued within a
+    transaction, the job only exists if the transaction commits.
+    """
+    return BackgroundJob.objects.create(
+               task=task,
+               payload=json.dumps(kwargs),
+               run_after=run_after or timezone.now()
+           )
+
+
+def due_jobs(now):
+    return models.Q(status=BackgroundJob.PENDING, run_after__lte=now) \
+           | models.Q(status=BackgroundJob.RUNNING, locked_until__lt=now)
+
+
+def claim(batch_size, owner):
+    """
+    Marks up to ``batch_size`` due jobs as running for ``owner`` and returns
+    them. Jobs not finished within LEASE seconds are due again, in case
+    their worker died.
+    """
+    now = timezone.now()
+    pks = list(
+              BackgroundJob.objects.filter(due_jobs(now))
+                                   .order_by('run_after', 'pk')
+                                   .values_list('pk', flat=True)[:batch_size]
+          )
+
+    if not pks:
+        return []
+
+    # Of several workers selecting the same jobs, only the first update
+    # still finds them due.
+    BackgroundJob.objects.filter(due_jobs(now), pk__in=pks).update(
+        status=BackgroundJob.RUNNING,
+        owner=owner,
+        locked_until=now + timedelta(seconds=get_job_settings().get('LEASE', 300)),
+        attempts=models.F('attempts') + 1
+    )
+    return list(
+               BackgroundJob.objects.filter(pk__in=pks, owner=owner, status=BackgroundJob.RUNNING)
+                                    .order_by('run_after', 'pk')
+           )
+
+
+def run(job):
+    """
+    Runs a claimed job in a transaction which also deletes it. A failing job
+    is retried after RETRY_DELAY seconds, doubled for each failed attempt,
+    and kept as failed after MAX_ATTEMPTS attempts. Returns whether it
+    succeeded.
+    """
+    options = get_job_settings()
+
+    try:
+        with transaction.atomic():
+            import_string(job.task)(**json.loads(job.payload))
+            BackgroundJob.objects.filter(pk=job.pk).delete()
+    except Exception:
+        logger.exception('Job %s failed.', job)
+        BackgroundJob.objects.filter(pk=job.pk, owner=job.owner).update(
+            status=BackgroundJob.FAILED if job.attempts >= options.get('MAX_ATTEMPTS', 5) else BackgroundJob.PENDING,
+            run_after=timezone.now() + timedelta(seconds=options.get('RETRY_DELAY', 10) * 2 ** (job.attempts - 1)),
+            locked_until=None,
+            last_error=traceback.format_exc()
+        )
+        return False
+    return True
+
+
+def work(batch_size=None):
+    """
+    Claims and runs one batch of due jobs. Returns the number of jobs run.
+    Tasks should do a bounded amount of work and enqueue a job for the
+    rest, as each runs in one transaction.
+    """
+    jobs = claim(batch_size or get_job_settings().get('BATCH_SIZE', 10), uuid.uuid4().hex)
+
+    for job in jobs:
+        run(job)
+    return len(jobs)
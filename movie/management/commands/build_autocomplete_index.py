@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import (
+                                            BaseCommand,
+                                            CommandError,
+                                        )
+
+from movie import autocomplete
+
+
+class Command(BaseCommand):
+    help = 'Builds the search suggestion index from the database and writes its snapshot.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Snapshot to write, AUTOCOMPLETE["SNAPSHOT"] by default.')
+
+    def handle(self, *args, **options):
+        path = options['path'] or autocomplete.get_autocomplete_settings().get('SNAPSHOT')
+
+        if not path:
+            raise CommandError('No snapshot path: pass --path or set AUTOCOMPLETE["SNAPSHOT"].')
+
+        started = time.monotonic()
+        index = autocomplete.build_index()
+        index.save(path)
+        self.stdout.write('Indexed {movies} movies into {path} in {seconds:.1f}s.'.format(
+            movies=len(index),
+            path=path,
+            seconds=time.monotonic() - started
+        ))
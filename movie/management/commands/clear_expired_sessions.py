@@ -0,0 +1,32 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired sessions in batches, so the table is never locked for long.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to wait between batches.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+
+        while True:
+            keys = list(
+                       Session.objects.filter(expire_date__lt=now)
+                                      .values_list('session_key', flat=True)[:options['batch_size']]
+                   )
+
+            if not keys:
+                break
+            Session.objects.filter(session_key__in=keys).delete()
+            deleted += len(keys)
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write('Deleted {deleted} expired sessions.'.format(deleted=deleted))
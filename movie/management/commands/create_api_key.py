@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from movie.models import APIKey
+
+
+class Command(BaseCommand):
+    help = 'Issues an API key for the user with the given email address.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('name')
+        parser.add_argument(
+            '--scope',
+            action='append',
+            default=[],
+            dest='scopes',
+            help="Scope granted to the key, such as 'movie:read'. Can be repeated.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError('User "{email}" does not exist.'.format(email=options['email']))
+
+        api_key, raw_key = APIKey.objects.create_key(user, options['name'], options['scopes'])
+        self.stderr.write('Created {api_key}. The key is shown only once:'.format(api_key=api_key))
+        self.stdout.write(raw_key)
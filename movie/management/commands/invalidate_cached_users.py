@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from movie import auth
+
+
+class Command(BaseCommand):
+    help = 'Drops the cached users of CACHED_AUTH, after users were changed with QuerySet.update().'
+
+    def handle(self, *args, **options):
+        auth.invalidate_users()
+        self.stdout.write('Invalidated the cached users.')
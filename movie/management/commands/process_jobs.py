@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movie import jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs the queued background jobs, polling for new ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Jobs claimed at a time.')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due.')
+
+    def handle(self, *args, **options):
+        processed = 0
+
+        while True:
+            count = jobs.work(options['batch_size'])
+            processed += count
+
+            if count:
+                continue
+            if options['once']:
+                break
+            time.sleep(jobs.get_job_settings().get('POLL_INTERVAL', 1))
+        self.stdout.write('Processed {processed} jobs.'.format(processed=processed))
@@ -0,0 +1,63 @@
+import glob
+import io
+import os
+import pstats
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movie import profiling
+
+
+class Command(BaseCommand):
+    help = 'Shows the hottest functions of the collected profiles per URL name.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='Only report this URL name, e.g. "api:movie-list".')
+        parser.add_argument('--limit', type=int, default=20, help='Number of functions to show.')
+        parser.add_argument(
+            '--sort',
+            default='cumulative',
+            choices=('cumulative', 'tottime', 'ncalls'),
+            help='Sort key of the function table.',
+        )
+        parser.add_argument('--collapsed', help='Write the merged collapsed stacks of the views to this file.')
+
+    def handle(self, *args, **options):
+        directory = profiling.get_profiling_settings().get('DIRECTORY')
+
+        if not directory or not os.path.isdir(directory):
+            raise CommandError('No profiles have been collected.')
+
+        if options['view']:
+            view_directories = [os.path.join(directory, profiling.view_directory_name(options['view'])), ]
+        else:
+            view_directories = sorted(glob.glob(os.path.join(directory, '*')))
+
+        stacks = Counter()
+
+        for view_directory in view_directories:
+            profile_files = sorted(glob.glob(os.path.join(view_directory, '*.prof')))
+
+            if not profile_files:
+                continue
+
+            out = io.StringIO()
+            stats = pstats.Stats(*profile_files, stream=out)
+            stats.sort_stats(options['sort']).print_stats(options['limit'])
+            self.stdout.write('=== {view} ({count} requests)'.format(
+                                  view=os.path.basename(view_directory),
+                                  count=len(profile_files)
+                              ))
+            self.stdout.write(out.getvalue())
+
+            for path in glob.glob(os.path.join(view_directory, '*.collapsed')):
+                with open(path) as fp:
+                    for line in fp:
+                        stack, count = line.rsplit(' ', 1)
+                        stacks[stack] += int(count)
+
+        if options['collapsed']:
+            with open(options['collapsed'], 'w') as fp:
+                for stack, count in stacks.most_common():
+                    fp.write('{stack} {count}\n'.format(stack=stack, count=count))
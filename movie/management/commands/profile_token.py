@@ -0,0 +1,19 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from movie import profiling
+
+
+class Command(BaseCommand):
+    help = 'Issues a token for the profiling request header to a staff user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['email'], is_staff=True)
+        except User.DoesNotExist:
+            raise CommandError('Staff user "{email}" does not exist.'.format(email=options['email']))
+
+        self.stdout.write(profiling.make_token(user))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from movie import (
+                    trash,
+                    uploads,
+                  )
+
+
+class Command(BaseCommand):
+    help = 'Hard deletes the movies and comments deleted longer ago than the retention period, and abandoned uploads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Rows deleted per transaction.')
+        parser.add_argument('--pause', type=float, help='Seconds to wait between chunks.')
+
+    def handle(self, *args, **options):
+        purged = trash.purge(options['chunk_size'], options['pause'])
+
+        if not purged:
+            self.stdout.write('Nothing to purge.')
+        for name, count in sorted(purged.items()):
+            self.stdout.write('Purged {count} {name}.'.format(count=count, name=name))
+
+        removed = uploads.remove_abandoned()
+
+        if removed:
+            self.stdout.write('Removed {count} abandoned uploads.'.format(count=removed))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from movie import storage
+
+
+class Command(BaseCommand):
+    help = 'Moves the movie files to the media roots owning them, after roots were added.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Threads moving files.')
+        parser.add_argument('--batch-size', type=int, help='Movies checked at a time.')
+
+    def handle(self, *args, **options):
+        movies, moved = storage.rebalance_media(options['workers'], options['batch_size'])
+        self.stdout.write('Checked {movies} movies, moved {moved} files.'.format(movies=movies, moved=moved))
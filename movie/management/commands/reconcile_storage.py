@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from movie import quotas
+
+
+class Command(BaseCommand):
+    help = 'Measures the stored movie files and recounts the storage used by each user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Threads measuring files.')
+        parser.add_argument('--batch-size', type=int, help='Movies measured and users recounted at a time.')
+
+    def handle(self, *args, **options):
+        movies, fixed, missing = quotas.reconcile(options['workers'], options['batch_size'])
+        self.stdout.write(
+            'Checked {movies} movies, fixed {fixed} file sizes, {missing} files are missing.'.format(
+                movies=movies,
+                fixed=fixed,
+                missing=missing
+            )
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from movie import timelines
+
+
+class Command(BaseCommand):
+    help = 'Recounts the follows of uploaders merged into the feeds when read, after FAN_OUT_LIMIT changed.'
+
+    def handle(self, *args, **options):
+        users = timelines.recount_pulled_follows()
+        self.stdout.write('Recounted the follows of {users} users.'.format(users=users))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from movie import accounts
+
+
+class Command(BaseCommand):
+    help = 'Queues again the purge of deleted accounts whose purge failed.'
+
+    def handle(self, *args, **options):
+        resumed = accounts.resume_deletions()
+        self.stdout.write('Resumed {resumed} account deletions.'.format(resumed=resumed))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movie.models import APIKey
+
+
+class Command(BaseCommand):
+    help = 'Revokes the API keys starting with the given prefix.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('prefix')
+
+    def handle(self, *args, **options):
+        api_keys = APIKey.objects.filter(prefix=options['prefix'], revoked=False)
+
+        if not api_keys:
+            raise CommandError('No active key starts with "{prefix}".'.format(prefix=options['prefix']))
+
+        for api_key in api_keys:
+            api_key.revoke()
+            self.stdout.write('Revoked {api_key}.'.format(api_key=api_key))
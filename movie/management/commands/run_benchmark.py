@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from movie import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Drives the main URLs through the test client and reports latency, queries and throughput as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per scenario.')
+        parser.add_argument('--scenario', action='append', dest='scenarios', help='Run only this scenario.')
+        parser.add_argument('--seed', type=int, default=None, help='Seed of the random generator.')
+        parser.add_argument('--output', help='Write the report to this file.')
+        parser.add_argument('--compare', help='Report to compare the results with.')
+
+    def handle(self, *args, **options):
+        report = benchmark.run(
+                     requests=options['requests'],
+                     warmup=options['warmup'],
+                     scenario_names=options['scenarios'],
+                     seed=options['seed']
+                 )
+
+        if options['compare']:
+            report['changes'] = benchmark.compare(benchmark.read_report(options['compare']), report)
+
+        if options['output']:
+            benchmark.write_report(report, options['output'])
+        self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
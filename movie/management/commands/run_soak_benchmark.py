@@ -0,0 +1,48 @@
+import json
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from movie import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Keeps many slow video streams open against the ASGI application and reports how it copes, as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000, help='Concurrent viewers.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds each viewer stays.')
+        parser.add_argument('--delay', type=float, default=0.05, help='Seconds a viewer takes per chunk.')
+        parser.add_argument('--ramp-up', type=float, default=1.0, help='Seconds over which viewers arrive.')
+        parser.add_argument('--size', type=int, default=64, help='Megabytes of the generated video file.')
+        parser.add_argument('--path', help='Media URL path to stream instead of a generated file.')
+        parser.add_argument('--url', help='Base URL of a running ASGI server; in process when omitted.')
+        parser.add_argument('--output', help='Write the report to this file.')
+
+    def handle(self, *args, **options):
+        name = None
+        path = options['path']
+
+        if path is None:
+            name = default_storage.save(
+                       'files/benchmark/soak.mp4',
+                       ContentFile(benchmark.MP4_STUB + b'\0' * (options['size'] * 2 ** 20))
+                   )
+            path = default_storage.url(name)
+        try:
+            report = benchmark.soak(
+                         clients=options['clients'],
+                         duration=options['duration'],
+                         delay=options['delay'],
+                         ramp_up=options['ramp_up'],
+                         path=path,
+                         url=options['url'].rstrip('/') + path if options['url'] else None
+                     )
+        finally:
+            if name is not None:
+                default_storage.delete(name)
+
+        if options['output']:
+            benchmark.write_report(report, options['output'])
+        self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
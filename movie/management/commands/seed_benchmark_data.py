@@ -0,0 +1,26 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from movie import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generates users, movies and comments with a skewed distribution for benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--movies', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=None, help='Seed of the random generator.')
+
+    def handle(self, *args, **options):
+        created = benchmark.seed(
+                      options['users'],
+                      options['movies'],
+                      options['comments'],
+                      rng=random.Random(options['seed'])
+                  )
+        self.stdout.write(
+            'Created {users} users, {movies} movies and {comments} comments.'.format(**created)
+        )
@@ -0,0 +1,53 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movie import slow_queries
+
+
+class Command(BaseCommand):
+    help = 'Groups the slow query log by normalized SQL and highlights full table scans.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Slow query log to read. Defaults to SLOW_QUERY_LOG["PATH"].')
+        parser.add_argument('--limit', type=int, default=20, help='Number of query groups to show.')
+        parser.add_argument('--full-scans', action='store_true', help='Only show queries scanning a whole table.')
+
+    def handle(self, *args, **options):
+        path = options['path'] or slow_queries.get_slow_query_settings().get('PATH')
+
+        if not path or not os.path.exists(path):
+            raise CommandError('Slow query log "{path}" does not exist.'.format(path=path))
+
+        groups = slow_queries.group_by_fingerprint(slow_queries.read_log(path))
+
+        if options['full_scans']:
+            groups = [group for group in groups if group['full_scan']]
+
+        for group in groups[:options['limit']]:
+            flags = []
+
+            if group['full_scan']:
+                flags.append(self.style.ERROR('FULL SCAN'))
+
+            if group['temp_sort']:
+                flags.append(self.style.WARNING('TEMP SORT'))
+
+            self.stdout.write('{fingerprint}  count={count} total={total:.1f}ms max={max:.1f}ms {flags}'.format(
+                                  fingerprint=group['fingerprint'],
+                                  count=group['count'],
+                                  total=group['total_ms'],
+                                  max=group['max_ms'],
+                                  flags=' '.join(flags)
+                              ))
+            self.stdout.write('  ' + group['normalized_sql'])
+
+            for line in group['plan']:
+                self.stdout.write('    plan: ' + line)
+
+            for view, count in sorted(group['views'].items(), key=lambda item: -item[1]):
+                self.stdout.write('    view: {view} ({count})'.format(view=view, count=count))
+
+            for location, count in sorted(group['locations'].items(), key=lambda item: -item[1]):
+                self.stdout.write('    from: {location} ({count})'.format(location=location, count=count))
+            self.stdout.write('')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from movie import rankings
+
+
+class Command(BaseCommand):
+    help = 'Adds the movies, comments and views since the last run to the movie rankings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recompute every ranking.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            changed = rankings.rebuild()
+        else:
+            changed = rankings.update()
+        self.stdout.write('Updated {changed} rankings.'.format(changed=changed))
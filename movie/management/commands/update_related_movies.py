@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import (
+                                            BaseCommand,
+                                            CommandError,
+                                        )
+
+from movie import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the related movies shown on the movie pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--block-size', type=int, help='Movies compared with the catalogue at a time.')
+
+    def handle(self, *args, **options):
+        if recommendations.numpy is None:
+            raise CommandError('update_related_movies needs numpy and scipy.')
+
+        started = time.monotonic()
+        movies, stored = recommendations.update(options['block_size'])
+        self.stdout.write('Stored {stored} related movies of {movies} movies in {seconds:.1f}s.'.format(
+            stored=stored,
+            movies=movies,
+            seconds=time.monotonic() - started
+        ))
@@ -0,0 +1,390 @@
+import bisect
+import glob
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+def get_metrics_settings():
+    return getattr(settings, 'METRICS', {})
+
+
+def can_scrape(request):
+    """
+    Whether ``request`` may read the metrics: staff users always, others
+    from ALLOWED_IPS with the bearer TOKEN, when one is set. Behind a proxy
+    every request comes from its address, so set TOKEN there.
+    """
+    user = getattr(request, 'user', None)
+
+    if user is not None and user.is_active and user.is_staff:
+        return True
+
+    options = get_metrics_settings()
+
+    if request.META.get('REMOTE_ADDR') not in options.get('ALLOWED_IPS', ('127.0.0.1', '::1', )):
+        return False
+
+    token = options.get('TOKEN')
+    return not token or constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token)
+
+
+class Registry(object):
+    """
+    Holds the metrics of this process. With ``MULTIPROCESS_DIR`` configured,
+    every process periodically writes a snapshot there and exposition merges
+    the snapshots of all processes, which is what prefork servers such as
+    mod_wsgi need.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError('Duplicated metric name: {name}'.format(name=metric.name))
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics[name]
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def flush(self, directory):
+        path = os.path.join(directory, '{pid}.json'.format(pid=os.getpid()))
+        tmp_path = path + '.tmp'
+
+        with open(tmp_path, 'w') as fp:
+            json.dump({'pid': os.getpid(), 'metrics': self.snapshot()}, fp)
+        os.replace(tmp_path, path)
+        self._flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        options = get_metrics_settings()
+        directory = options.get('MULTIPROCESS_DIR')
+
+        if directory and time.monotonic() - self._flushed_at >= options.get('FLUSH_INTERVAL', 5):
+            self.flush(directory)
+
+    def collect(self):
+        directory = get_metrics_settings().get('MULTIPROCESS_DIR')
+
+        if not directory:
+            return self.snapshot()
+
+        self.flush(directory)
+        snapshots = []
+
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            try:
+                with open(path) as fp:
+                    snapshots.append(json.load(fp))
+            except (OSError, ValueError):
+                continue
+        return merge_snapshots(snapshots)
+
+
+def pid_is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge_snapshots(snapshots):
+    merged = {}
+
+    for snapshot in snapshots:
+        alive = None
+
+        for name, metric in snapshot['metrics'].items():
+            if metric['type'] == 'gauge':
+                if alive is None:
+                    alive = pid_is_alive(snapshot['pid'])
+
+                if not alive:
+                    continue
+
+            target = merged.setdefault(name, dict(metric, samples=[]))
+            values = {tuple(labels): value for labels, value in target['samples']}
+
+            for labels, value in metric['samples']:
+                key = tuple(labels)
+
+                if key not in values:
+                    values[key] = value
+                elif metric['type'] == 'histogram':
+                    values[key] = [
+                        [a + b for a, b in zip(values[key][0], value[0])],
+                        values[key][1] + value[1],
+                        values[key][2] + value[2],
+                    ]
+                elif metric['type'] == 'gauge' and metric.get('mode') == 'max':
+                    values[key] = max(values[key], value)
+                else:
+                    values[key] = values[key] + value
+            target['samples'] = [[list(key), value] for key, value in values.items()]
+    return merged
+
+
+REGISTRY = Registry()
+
+
+class LabeledMetric(object):
+
+    def __init__(self, metric, key):
+        self._metric = metric
+        self._key = key
+
+    def __getattr__(self, attr):
+        method = getattr(self._metric, attr)
+
+        def bound(*args, **kwargs):
+            return method(*args, key=self._key, **kwargs)
+        return bound
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError('{name} expects labels {labelnames}'.format(
+                                 name=self.name,
+                                 labelnames=self.labelnames
+                             ))
+        return LabeledMetric(self, tuple(str(value) for value in values))
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[list(key), self._copy(value)] for key, value in self._values.items()]
+        return {
+            'type': self.type,
+            'help': self.documentation,
+            'labelnames': list(self.labelnames),
+            'samples': samples,
+        }
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, key=()):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, *args, mode='sum', **kwargs):
+        super(Gauge, self).__init__(*args, **kwargs)
+        self.mode = mode
+
+    def set(self, value, key=()):
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, key=()):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, key=()):
+        self.inc(-amount, key=key)
+
+    def snapshot(self):
+        snapshot = super(Gauge, self).snapshot()
+        snapshot['mode'] = self.mode
+        return snapshot
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super(Histogram, self).__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, key=()):
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            entry = self._values.get(key)
+
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, key=()):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, key=key)
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def snapshot(self):
+        snapshot = super(Histogram, self).snapshot()
+        snapshot['buckets'] = list(self.buckets)
+        return snapshot
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+               '{name}="{value}"'.format(
+                   name=name,
+                   value=str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               )
+               for name, value in pairs
+           ) + '}'
+
+
+def generate_latest(registry=REGISTRY):
+    """
+    Renders the metrics in the Prometheus text exposition format.
+    """
+    lines = []
+
+    for name, metric in sorted(registry.collect().items()):
+        lines.append('# HELP {name} {help}'.format(name=name, help=metric['help']))
+        lines.append('# TYPE {name} {type}'.format(name=name, type=metric['type']))
+        names = metric['labelnames']
+
+        for labels, value in sorted(metric['samples']):
+            if metric['type'] != 'histogram':
+                lines.append('{name}{labels} {value}'.format(
+                                 name=name,
+                                 labels=format_labels(names, labels),
+                                 value=format_value(value)
+                             ))
+                continue
+
+            counts, total, count = value
+            cumulative = 0
+
+            for bound, bucket_count in zip(metric['buckets'] + [math.inf], counts):
+                cumulative += bucket_count
+                lines.append('{name}_bucket{labels} {value}'.format(
+                                 name=name,
+                                 labels=format_labels(names, labels, [('le', format_value(bound))]),
+                                 value=format_value(cumulative)
+                             ))
+            lines.append('{name}_sum{labels} {value}'.format(
+                             name=name,
+                             labels=format_labels(names, labels),
+                             value=format_value(total)
+                         ))
+            lines.append('{name}_count{labels} {value}'.format(
+                             name=name,
+                             labels=format_labels(names, labels),
+                             value=format_value(count)
+                         ))
+    return '\n'.join(lines) + '\n'
+
+
+HTTP_REQUESTS = Counter(
+                    'movie_http_requests_total',
+                    'HTTP requests by URL name, method and status.',
+                    ['view', 'method', 'status']
+                )
+HTTP_REQUEST_DURATION = Histogram(
+                            'movie_http_request_duration_seconds',
+                            'HTTP request latency by URL name.',
+                            ['view']
+                        )
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+                                'movie_http_requests_in_progress',
+                                'HTTP requests being processed.'
+                            )
+UPLOAD_BYTES = Counter(
+                   'movie_upload_bytes_total',
+                   'Bytes of uploaded files written to storage.'
+               )
+STORAGE_OPERATION_DURATION = Histogram(
+                                 'movie_storage_operation_duration_seconds',
+                                 'File storage operation latency.',
+                                 ['operation']
+                             )
+EMAIL_SEND_DURATION = Histogram(
+                          'movie_email_send_duration_seconds',
+                          'Time spent sending an email.'
+                      )
+EMAILS_SENT = Counter(
+                  'movie_emails_sent_total',
+                  'Emails handed to the email backend.'
+              )
+DB_QUERIES = Counter(
+                 'movie_db_queries_total',
+                 'Database queries by connection alias.',
+                 ['alias']
+             )
+DB_QUERY_DURATION = Histogram(
+                        'movie_db_query_duration_seconds',
+                        'Database query latency by connection alias.',
+                        ['alias'],
+                        buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)
+                    )
+COMPRESSION_INPUT_BYTES = Counter(
+                              'movie_http_compression_input_bytes_total',
+                              'Response bytes before compression by encoding.',
+                              ['encoding']
+                          )
+COMPRESSION_OUTPUT_BYTES = Counter(
+                               'movie_http_compression_output_bytes_total',
+                               'Response bytes after compression by encoding.',
+                               ['encoding']
+                           )
+COMPRESSION_SECONDS = Counter(
+                          'movie_http_compression_seconds_total',
+                          'Time spent compressing responses by encoding.',
+                          ['encoding']
+                      )
+
+
+def observe_query(db, sql, params, many, duration):
+    DB_QUERIES.inc(key=(db.alias, ))
+    DB_QUERY_DURATION.observe(duration, key=(db.alias, ))
@@ -0,0 +1,278 @@
+import json
+import logging
+import time
+import zlib
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+
+from . import (
+                auth,
+                instrumentation,
+                metrics,
+                staticfiles,
+              )
+
+
+logger = logging.getLogger('movie.request')
+
+
+class RequestTimingMiddleware(object):
+    """
+    Records query count, SQL time, view time and template render time of
+    each request. They are sent back in a Server-Timing header and logged
+    as one JSON line, at WARNING level when the request is over budget.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = getattr(settings, 'REQUEST_TIMING', {})
+        self.query_count_budget = options.get('QUERY_COUNT_BUDGET', 50)
+        self.latency_budget = options.get('LATENCY_BUDGET', 0.5)
+
+    def __call__(self, request):
+        stats = instrumentation.start_request()
+        request.timing = stats
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.finish_request()
+
+        response['Server-Timing'] = self.server_timing(stats)
+        self.log(request, response, stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.timing.view_name = request.resolver_match.view_name
+        request.timing.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        stats = request.timing
+        stats.view_finished = time.perf_counter()
+
+        def render_finished(response):
+            stats.render_finished = time.perf_counter()
+
+        response.add_post_render_callback(render_finished)
+        return response
+
+    def server_timing(self, stats):
+        return ', '.join([
+                   'db;dur={dur:.1f};desc="{count} queries"'.format(
+                       dur=stats.sql_time * 1000,
+                       count=stats.query_count
+                   ),
+                   'view;dur={dur:.1f}'.format(dur=stats.view_time * 1000),
+                   'tpl;dur={dur:.1f}'.format(dur=stats.render_time * 1000),
+                   'total;dur={dur:.1f}'.format(dur=stats.total_time * 1000),
+               ])
+
+    def over_budget(self, stats):
+        exceeded = []
+
+        if stats.query_count > self.query_count_budget:
+            exceeded.append('query_count')
+
+        if stats.total_time > self.latency_budget:
+            exceeded.append('latency')
+        return exceeded
+
+    def log(self, request, response, stats):
+        exceeded = self.over_budget(stats)
+        level = logging.WARNING if exceeded else logging.INFO
+
+        if not logger.isEnabledFor(level):
+            return
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': resolver_match.view_name if resolver_match else None,
+            'status': response.status_code,
+            'queries': stats.query_count,
+            'sql_ms': round(stats.sql_time * 1000, 1),
+            'view_ms': round(stats.view_time * 1000, 1),
+            'template_ms': round(stats.render_time * 1000, 1),
+            'total_ms': round(stats.total_time * 1000, 1),
+            'over_budget': exceeded,
+        }
+        logger.log(level, json.dumps(record), extra={'timing': record})
+
+
+class MetricsMiddleware(object):
+    """
+    Counts requests and observes their latency per URL name.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.HTTP_REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.HTTP_REQUESTS_IN_PROGRESS.dec()
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = resolver_match.view_name if resolver_match else '<unresolved>'
+        metrics.HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, key=(view_name, ))
+        metrics.HTTP_REQUESTS.inc(key=(view_name, request.method, str(response.status_code)))
+        metrics.REGISTRY.maybe_flush()
+        return response
+
+
+def get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = auth.get_user(request)
+    return request._cached_user
+
+
+class SessionMiddleware(BaseSessionMiddleware):
+    """
+    SessionMiddleware skipping the save, and the cookie, of sessions whose
+    data and key are the same as when they were loaded.
+    """
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+
+        if hasattr(session, 'has_changed') and not session.has_changed():
+            session.modified = False
+        return super(SessionMiddleware, self).process_response(request, response)
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware loading the user lazily through the user cache
+    (see CACHED_AUTH).
+    """
+
+    def process_request(self, request):
+        super(CachedAuthenticationMiddleware, self).process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+
+
+class StreamCompressor(object):
+    """
+    Incremental gzip or brotli compressor recording bytes in and out and the
+    time spent compressing.
+    """
+
+    def __init__(self, encoding, options):
+        self.encoding = encoding
+
+        if encoding == 'br':
+            self._compressor = staticfiles.brotli.Compressor(quality=options.get('BROTLI_QUALITY', 5))
+        else:
+            self._compressor = zlib.compressobj(options.get('GZIP_LEVEL', 6), zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data, flush=False):
+        start = time.perf_counter()
+
+        if self.encoding == 'br':
+            output = self._compressor.process(data)
+            if flush:
+                output += self._compressor.flush()
+        else:
+            output = self._compressor.compress(data)
+            if flush:
+                output += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self._record(len(data), len(output), start)
+        return output
+
+    def finish(self):
+        start = time.perf_counter()
+
+        if self.encoding == 'br':
+            output = self._compressor.finish()
+        else:
+            output = self._compressor.flush()
+        self._record(0, len(output), start)
+        return output
+
+    def _record(self, size_in, size_out, start):
+        metrics.COMPRESSION_SECONDS.inc(time.perf_counter() - start, key=(self.encoding, ))
+        metrics.COMPRESSION_INPUT_BYTES.inc(size_in, key=(self.encoding, ))
+        metrics.COMPRESSION_OUTPUT_BYTES.inc(size_out, key=(self.encoding, ))
+
+
+def compress_stream(compressor, content):
+    for chunk in content:
+        output = compressor.compress(chunk, flush=True)
+
+        if output:
+            yield output
+    yield compressor.finish()
+
+
+class CompressionMiddleware(object):
+    """
+    Compresses responses of compressible content types with the preferred
+    encoding the client accepts. Streaming responses are compressed chunk by
+    chunk as they are sent, other responses only from MIN_SIZE bytes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.options = getattr(settings, 'COMPRESSION', {})
+        self.content_types = tuple(self.options.get('CONTENT_TYPES', ()))
+        self.min_size = self.options.get('MIN_SIZE', 1024)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if not self.options.get('ENABLED', True) or not self.is_compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding', ))
+        encoding = self.choose_encoding(request)
+
+        if encoding is None:
+            return response
+
+        compressor = StreamCompressor(encoding, self.options)
+
+        if response.streaming:
+            response.streaming_content = compress_stream(compressor, response.streaming_content)
+
+            if response.has_header('Content-Length'):
+                del response['Content-Length']
+        else:
+            if len(response.content) < self.min_size:
+                return response
+
+            compressed = compressor.compress(response.content) + compressor.finish()
+
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def is_compressible(self, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        return response.status_code == 200 \
+            and not response.has_header('Content-Encoding') \
+            and content_type.startswith(self.content_types)
+
+    def choose_encoding(self, request):
+        encodings = staticfiles.accepted_encodings(request)
+
+        if 'br' in encodings and staticfiles.brotli is not None:
+            return 'br'
+
+        if 'gzip' in encodings:
+            return 'gzip'
+        return None
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-19 17:34
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Enter a name to identify this key.', max_length=100)),
+                ('prefix', models.CharField(editable=False, max_length=8)),
+                ('hashed_key', models.CharField(editable=False, max_length=64, unique=True)),
+                ('scopes', models.CharField(blank=True, help_text="Space separated scopes such as 'movie:read movie:write'.", max_length=500)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('revoked', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Comment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.TextField(help_text='Enter your comment to movie.', max_length=250)),
+                ('post_date', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Movie',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movie_name', models.CharField(help_text='Enter your movie name.', max_length=100)),
+                ('description', models.TextField(help_text='Enter your movie description.', max_length=1000)),
+                ('uploaded_file', models.FileField(upload_to='files/%Y/%m/%d')),
+                ('post_date', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['post_date', 'movie_name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SiteUser',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bio', models.TextField(help_text='Enter your bio details here.', max_length=1000)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='uploader',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='movie.SiteUser'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='commenter',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='movie.SiteUser'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='movie',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movie.Movie'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-19 17:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ['post_date']},
+        ),
+        migrations.AlterModelOptions(
+            name='movie',
+            options={'ordering': ['post_date', 'movie_name', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['movie', 'post_date'], name='comment_movie_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['post_date', 'movie_name', 'id'], name='movie_post_date_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['uploader', 'post_date', 'movie_name', 'id'], name='movie_uploader_date_idx'),
+        ),
+    ]
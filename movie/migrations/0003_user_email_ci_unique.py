@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Must stay in sync with movie.models.email_key(), which lookups filter on.
+INDEX_SQL = "CREATE UNIQUE INDEX auth_user_email_ci_uniq ON auth_user (LOWER(NULLIF(email, '')))"
+DROP_SQL = "DROP INDEX auth_user_email_ci_uniq"
+
+# Backends supporting unique indexes on expressions.
+VENDORS = ('sqlite', 'postgresql', )
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor in VENDORS:
+        schema_editor.execute(INDEX_SQL)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in VENDORS:
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0008_alter_user_username_max_length'),
+        ('movie', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-19 17:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0004_movie_view_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieDailyViews',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('ranked_views', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MovieRanking',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='movie.Movie')),
+                ('trending_score', models.FloatField(default=0)),
+                ('weekly_views', models.PositiveIntegerField(default=0)),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RankingState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_movie_id', models.PositiveIntegerField(default=0)),
+                ('last_comment_id', models.PositiveIntegerField(default=0)),
+                ('updated', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='movieranking',
+            index=models.Index(fields=['trending_score', 'movie'], name='ranking_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movieranking',
+            index=models.Index(fields=['weekly_views', 'movie'], name='ranking_weekly_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movieranking',
+            index=models.Index(fields=['comment_count', 'movie'], name='ranking_comments_idx'),
+        ),
+        migrations.AddField(
+            model_name='moviedailyviews',
+            name='movie',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movie.Movie'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='moviedailyviews',
+            unique_together=set([('movie', 'day')]),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-19 18:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0006_related_movies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WatchProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.FloatField(help_text='Seconds watched.')),
+                ('duration', models.FloatField(null=True)),
+                ('finished', models.BooleanField(default=False)),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movie.Movie')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movie.SiteUser')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='watchprogress',
+            index=models.Index(fields=['user', 'updated'], name='progress_user_updated_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='watchprogress',
+            unique_together=set([('user', 'movie')]),
+        ),
+    ]
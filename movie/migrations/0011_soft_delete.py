@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-19 18:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+# Partial indexes of the deleted rows only, for the purge. Queries of
+# visible rows (deleted_at IS NULL) cannot use them, so they keep the
+# indexes serving their order; a full index on deleted_at would win over
+# those on SQLite.
+TABLES = ('movie_movie', 'movie_comment', )
+INDEX_SQL = 'CREATE INDEX {table}_deleted_idx ON {table} (deleted_at)'
+PARTIAL_SQL = ' WHERE deleted_at IS NOT NULL'
+DROP_SQL = 'DROP INDEX {table}_deleted_idx'
+
+# Backends supporting partial indexes.
+VENDORS = ('sqlite', 'postgresql', )
+
+
+def create_indexes(apps, schema_editor):
+    for table in TABLES:
+        sql = INDEX_SQL.format(table=table)
+
+        if schema_editor.connection.vendor in VENDORS:
+            sql += PARTIAL_SQL
+        schema_editor.execute(sql)
+
+
+def drop_indexes(apps, schema_editor):
+    for table in TABLES:
+        sql = DROP_SQL.format(table=table)
+
+        if schema_editor.connection.vendor == 'mysql':
+            sql += ' ON {table}'.format(table=table)
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0010_account_deletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_movie_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='movie',
+            name='movie_post_date_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='movie',
+            name='movie_uploader_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['movie', 'post_date', 'deleted_at'], name='comment_movie_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['post_date', 'movie_name', 'id', 'deleted_at'], name='movie_post_date_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['uploader', 'post_date', 'movie_name', 'id', 'deleted_at'], name='movie_uploader_date_idx'),
+        ),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-19 18:21
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+# SQLite adds columns by rebuilding the table, which drops the partial
+# index created by 0011_soft_delete.
+INDEX_SQL = 'CREATE INDEX IF NOT EXISTS movie_movie_deleted_idx ON movie_movie (deleted_at) WHERE deleted_at IS NOT NULL'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0011_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, create_index),
+        migrations.AddField(
+            model_name='movie',
+            name='file_size',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='siteuser',
+            name='movie_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='siteuser',
+            name='storage_bytes',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='siteuser',
+            name='storage_quota',
+            field=models.BigIntegerField(blank=True, help_text="Bytes of movies this user may store, STORAGE_QUOTA['QUOTA'] if empty.", null=True),
+        ),
+        migrations.RunPython(create_index, migrations.RunPython.noop),
+    ]
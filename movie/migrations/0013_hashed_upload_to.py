@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-19 18:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import movie.storage
+
+
+# SQLite alters the field by rebuilding the table, which drops the partial
+# index created by 0011_soft_delete.
+INDEX_SQL = 'CREATE INDEX IF NOT EXISTS movie_movie_deleted_idx ON movie_movie (deleted_at) WHERE deleted_at IS NOT NULL'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0012_storage_quota'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, create_index),
+        migrations.AlterField(
+            model_name='movie',
+            name='uploaded_file',
+            field=models.FileField(upload_to=movie.storage.hashed_upload_to),
+        ),
+        migrations.RunPython(create_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-19 19:00
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_pulled_follows(apps, schema_editor):
+    Follow = apps.get_model('movie', 'Follow')
+    SiteUser = apps.get_model('movie', 'SiteUser')
+    pulled = Follow.objects.filter(
+                               follower=models.OuterRef('pk'),
+                               uploader__follower_count__gte=getattr(settings, 'TIMELINES', {}).get('FAN_OUT_LIMIT', 10000)
+                           ).order_by().values('follower')
+    SiteUser.objects.update(
+        pulled_follow_count=Coalesce(
+                                models.Subquery(
+                                    pulled.annotate(count=models.Count('*')).values('count'),
+                                    output_field=models.IntegerField()
+                                ),
+                                0
+                            )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0013_hashed_upload_to'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='siteuser',
+            name='pulled_follow_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_pulled_follows, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,85 @@
+import hashlib
+import secrets
+
 from django.contrib.auth.models import User
 from django.db import models
-from django.db.models.signals import post_delete
+from django.db.models import (
+                                F,
+                                Func,
+                             )
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+from django.db.models.signals import (
+                                        post_delete,
+                                        post_init,
+                                        post_save,
+                                        pre_save,
+                                     )
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .storage import hashed_upload_to
+
+
+def email_key(field='email'):
+    """
+    ``LOWER(NULLIF(email, ''))``, the expression of the case-insensitive unique
+    index on auth_user.email. Filter on it to have the index used; blank
+    emails map to NULL, so they never collide.
+    """
+    return Lower(Func(F(field), RawSQL("''", ()), function='NULLIF'))
+
+
+class VisibleManager(models.Manager):
+    """
+    Excludes soft deleted rows.
+    """
+
+    def get_queryset(self):
+        return super(VisibleManager, self).get_queryset().filter(deleted_at=None)
+
+
+class SoftDeleteModel(models.Model):
+    """
+    Rows deleted by the site are only marked deleted, which hides them from
+    ``objects``, and purged after a retention period by movie.trash.
+    ``all_objects`` includes them. Deleted rows are indexed by partial
+    indexes (migration 0011), which visible row queries never pick over the
+    indexes serving their order.
+    """
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = VisibleManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        abstract = True
+
+    def soft_delete(self):
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at', ])
+
+    def restore(self):
+        self.deleted_at = None
+        self.save(update_fields=['deleted_at', ])
 
 
 class SiteUser(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     bio = models.TextField(max_length=1000, help_text="Enter your bio details here.")
+    follower_count = models.PositiveIntegerField(default=0, editable=False)
+    # Follows of uploaders whose movies are merged into the feed when read
+    # (see movie.timelines), so other feeds skip looking them up.
+    pulled_follow_count = models.PositiveIntegerField(default=0, editable=False)
+    storage_bytes = models.BigIntegerField(default=0, editable=False)
+    movie_count = models.PositiveIntegerField(default=0, editable=False)
+    storage_quota = models.BigIntegerField(
+                        null=True,
+                        blank=True,
+                        help_text="Bytes of movies this user may store, STORAGE_QUOTA['QUOTA'] if empty."
+                    )
 
     def get_absolute_url(self):
         return reverse('user-detail', kwargs={'pk': str(self.id), })
@@ -20,7 +91,7 @@ class SiteUser(models.Model):
                )
 
 
-class Movie(models.Model):
+class Movie(SoftDeleteModel):
     uploader = models.ForeignKey(
                  SiteUser,
                  on_delete=models.CASCADE,
@@ -28,11 +99,20 @@ class Movie(models.Model):
                )
     movie_name = models.CharField(max_length=100, help_text="Enter your movie name.")
     description = models.TextField(max_length=1000, help_text="Enter your movie description.")
-    uploaded_file = models.FileField(upload_to='files/%Y/%m/%d')
+    uploaded_file = models.FileField(upload_to=hashed_upload_to)
     post_date = models.DateTimeField(default=timezone.now)
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    file_size = models.BigIntegerField(default=0, editable=False)
 
     class Meta:
-        ordering = ['post_date', 'movie_name', ]
+        ordering = ['post_date', 'movie_name', 'id', ]
+        indexes = [
+            # deleted_at last, so visible movies are filtered (and counted)
+            # in the index, which still serves the order.
+            models.Index(fields=['post_date', 'movie_name', 'id', 'deleted_at'], name='movie_post_date_name_idx'),
+            models.Index(fields=['uploader', 'post_date', 'movie_name', 'id', 'deleted_at'], name='movie_uploader_date_idx'),
+            models.Index(fields=['movie_name'], name='movie_name_idx'),
+        ]
 
     def get_absolute_url(self):
         return reverse('movie-detail', kwargs={'pk': str(self.id), })
@@ -41,12 +121,72 @@ class Movie(models.Model):
         return self.movie_name
 
 
+@receiver(post_init, sender=Movie)
+def remember_file(sender, instance, **kwargs):
+    uploaded_file = instance.__dict__.get('uploaded_file')
+    instance._measured_file = getattr(uploaded_file, 'name', uploaded_file)
+
+
+@receiver(pre_save, sender=Movie)
+def measure_file(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'uploaded_file' not in update_fields:
+        return
+
+    uploaded_file = instance.uploaded_file
+
+    if uploaded_file and (
+        instance._state.adding or not uploaded_file._committed or uploaded_file.name != instance._measured_file
+    ):
+        try:
+            size = int(uploaded_file.size)
+        except OSError:
+            # Files missing from the storage count as empty until
+            # reconcile_storage measures them again.
+            size = 0
+        instance._file_size_change = size - instance.file_size
+        instance.file_size = size
+        instance._measured_file = uploaded_file.name
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def count_storage(sender, instance, **kwargs):
+    change = instance.__dict__.pop('_file_size_change', 0)
+
+    if kwargs.get('signal') is post_delete:
+        count, size = -1, -instance.file_size
+    elif kwargs.get('created'):
+        count, size = 1, instance.file_size
+    else:
+        count, size = 0, change
+
+    if instance.uploader_id is not None and (count or size):
+        SiteUser.objects.filter(pk=instance.uploader_id).update(
+            storage_bytes=F('storage_bytes') + size,
+            movie_count=F('movie_count') + count
+        )
+
+
 @receiver(post_delete, sender=Movie)
 def remove_file(sender, instance, **kwargs):
-    instance.uploaded_file.storage.delete(instance.uploaded_file.path)
+    instance.uploaded_file.storage.delete(instance.uploaded_file.name)
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def update_autocomplete_index(sender, instance, **kwargs):
+    from .autocomplete import update_index
+    update_index(sender, instance, **kwargs)
+
 
+@receiver(post_save, sender=Movie)
+def fan_out_movie(sender, instance, created, **kwargs):
+    if created:
+        from .timelines import movie_created
+        movie_created(instance)
 
-class Comment(models.Model):
+
+class Comment(SoftDeleteModel):
     movie = models.ForeignKey(
                 Movie,
                 on_delete=models.CASCADE,
@@ -59,9 +199,288 @@ class Comment(models.Model):
     description = models.TextField(max_length=250, help_text="Enter your comment to movie.")
     post_date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        ordering = ['post_date', ]
+        indexes = [
+            models.Index(fields=['movie', 'post_date', 'deleted_at'], name='comment_movie_date_idx'),
+            models.Index(fields=['post_date', 'id'], name='comment_post_date_idx'),
+        ]
+
     def __str__(self):
         limit_size = 75
         if len(self.description) > limit_size:
             return self.description[:limit_size]
         else:
             return self.description
+
+
+class MovieRanking(models.Model):
+    """
+    Precomputed ranking of a movie, maintained by movie.rankings.
+    """
+    movie = models.OneToOneField(
+                Movie,
+                on_delete=models.CASCADE,
+                primary_key=True,
+                related_name='ranking'
+            )
+    trending_score = models.FloatField(default=0)
+    weekly_views = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trending_score', 'movie'], name='ranking_trending_idx'),
+            models.Index(fields=['weekly_views', 'movie'], name='ranking_weekly_idx'),
+            models.Index(fields=['comment_count', 'movie'], name='ranking_comments_idx'),
+        ]
+
+
+class MovieDailyViews(models.Model):
+    """
+    Views of a movie per day. ``ranked_views`` of them are already in the
+    trending score.
+    """
+    movie = models.ForeignKey(
+                Movie,
+                on_delete=models.CASCADE,
+            )
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    ranked_views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('movie', 'day'), )
+
+
+class RankingState(models.Model):
+    """
+    Single row holding how far movie.rankings.update() got.
+    """
+    last_movie_id = models.PositiveIntegerField(default=0)
+    last_comment_id = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(null=True)
+
+
+class RelatedMovie(models.Model):
+    """
+    The ``rank``-th most similar movie to ``movie``, precomputed by
+    movie.recommendations.
+    """
+    movie = models.ForeignKey(
+                Movie,
+                on_delete=models.CASCADE,
+                related_name='+'
+            )
+    related = models.ForeignKey(
+                  Movie,
+                  on_delete=models.CASCADE,
+                  related_name='related_to'
+              )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = (('movie', 'rank'), )
+
+
+class WatchProgress(models.Model):
+    """
+    How far a user watched a movie, written in batches by
+    movie.watch_progress.
+    """
+    user = models.ForeignKey(
+               SiteUser,
+               on_delete=models.CASCADE,
+           )
+    movie = models.ForeignKey(
+                Movie,
+                on_delete=models.CASCADE,
+            )
+    position = models.FloatField(help_text="Seconds watched.")
+    duration = models.FloatField(null=True)
+    finished = models.BooleanField(default=False)
+    updated = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = (('user', 'movie'), )
+        indexes = [
+            models.Index(fields=['user', 'updated'], name='progress_user_updated_idx'),
+        ]
+
+
+class Follow(models.Model):
+    follower = models.ForeignKey(
+                   SiteUser,
+                   on_delete=models.CASCADE,
+                   related_name='following'
+               )
+    uploader = models.ForeignKey(
+                   SiteUser,
+                   on_delete=models.CASCADE,
+                   related_name='followers'
+               )
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = (('follower', 'uploader'), )
+        indexes = [
+            models.Index(fields=['uploader', 'follower'], name='follow_uploader_idx'),
+        ]
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def count_followers(sender, instance, **kwargs):
+    if kwargs.get('signal') is post_delete:
+        delta = -1
+    elif kwargs.get('created'):
+        delta = 1
+    else:
+        return
+    SiteUser.objects.filter(pk=instance.uploader_id).update(follower_count=F('follower_count') + delta)
+
+    from .timelines import count_pulled_follows
+    count_pulled_follows(instance, delta)
+
+
+class TimelineEntry(models.Model):
+    """
+    A movie in the home feed of ``owner``, copied there by movie.timelines
+    when it was uploaded.
+    """
+    owner = models.ForeignKey(
+                SiteUser,
+                on_delete=models.CASCADE,
+            )
+    movie = models.ForeignKey(
+                Movie,
+                on_delete=models.CASCADE,
+                related_name='timeline_entries'
+            )
+    post_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = (('owner', 'movie'), )
+        indexes = [
+            models.Index(fields=['owner', 'post_date', 'movie'], name='timeline_owner_date_idx'),
+        ]
+
+
+class BackgroundJob(models.Model):
+    """
+    A call of ``task`` with the JSON ``payload`` as keyword arguments, run
+    by "manage.py process_jobs".
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    )
+
+    task = models.CharField(max_length=200)
+    payload = models.TextField(default='{}')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    owner = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return '{task} #{pk}'.format(task=self.task, pk=self.pk)
+
+
+class AccountDeletion(models.Model):
+    """
+    A deleted account, disabled at once and purged in batches by
+    movie.accounts. ``siteuser`` is cleared once the purge finished.
+    """
+    siteuser = models.OneToOneField(
+                   SiteUser,
+                   on_delete=models.SET_NULL,
+                   null=True,
+                   related_name='deletion'
+               )
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    username = models.CharField(max_length=150, blank=True)
+    requested = models.DateTimeField(default=timezone.now)
+    updated = models.DateTimeField(default=timezone.now)
+    finished = models.DateTimeField(null=True)
+    movies_deleted = models.PositiveIntegerField(default=0)
+    comments_deleted = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return '{username} ({status})'.format(
+                   username=self.username,
+                   status='finished' if self.finished else 'pending'
+               )
+
+
+class APIKeyManager(models.Manager):
+
+    def create_key(self, user, name, scopes=()):
+        raw_key = secrets.token_urlsafe(32)
+        api_key = self.create(
+                      user=user,
+                      name=name,
+                      prefix=raw_key[:8],
+                      hashed_key=APIKey.hash_key(raw_key),
+                      scopes=' '.join(scopes),
+                  )
+        return api_key, raw_key
+
+
+class APIKey(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    name = models.CharField(max_length=100, help_text="Enter a name to identify this key.")
+    prefix = models.CharField(max_length=8, editable=False)
+    hashed_key = models.CharField(max_length=64, unique=True, editable=False)
+    scopes = models.CharField(
+                 max_length=500,
+                 blank=True,
+                 help_text="Space separated scopes such as 'movie:read movie:write'."
+             )
+    created = models.DateTimeField(default=timezone.now)
+    revoked = models.BooleanField(default=False)
+
+    objects = APIKeyManager()
+
+    @staticmethod
+    def hash_key(raw_key):
+        return hashlib.sha256(raw_key.encode()).hexdigest()
+
+    @cached_property
+    def scope_set(self):
+        return frozenset(self.scopes.split())
+
+    def revoke(self):
+        self.revoked = True
+        self.save(update_fields=['revoked', ])
+
+    def __str__(self):
+        return '{name} ({prefix}...)'.format(name=self.name, prefix=self.prefix)
+
+
+@receiver(post_save, sender=APIKey)
+@receiver(post_delete, sender=APIKey)
+def invalidate_api_key_cache(sender, instance, **kwargs):
+    from .api.authentication import api_key_cache
+    api_key_cache.invalidate()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    from .auth import invalidate_user
+    invalidate_user(sender, instance, **kwargs)
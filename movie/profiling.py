@@ -0,0 +1,138 @@
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+
+TOKEN_SALT = 'movie.profiling'
+
+
+def get_profiling_settings():
+    return getattr(settings, 'PROFILING', {})
+
+
+def make_token(user):
+    """
+    Returns the value of the profiling header for a staff user.
+    """
+    if not user.is_staff:
+        raise ValueError('Only staff users can profile requests.')
+    return signing.dumps({'user': user.pk}, salt=TOKEN_SALT)
+
+
+def check_token(token, max_age):
+    try:
+        signing.loads(token, salt=TOKEN_SALT, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def view_directory_name(view_name):
+    return view_name.replace(':', '.').replace(os.sep, '_')
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of one thread at a fixed interval and counts the
+    collapsed stacks ('module:function;module:function').
+    """
+
+    def __init__(self, thread_id, interval):
+        super(StackSampler, self).__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+
+            while frame is not None:
+                code = frame.f_code
+                names.append('{module}:{function}'.format(
+                                 module=frame.f_globals.get('__name__', '?'),
+                                 function=code.co_name
+                             ))
+                frame = frame.f_back
+
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles a fraction of the requests, plus requests carrying a profiling
+    token issued to a staff user (see the profile_token command). Results are
+    written per URL name as pstats and collapsed stack files. When disabled
+    the middleware removes itself from the stack.
+    """
+
+    def __init__(self, get_response):
+        options = get_profiling_settings()
+
+        if not options.get('ENABLED', False):
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        self.sample_rate = options.get('SAMPLE_RATE', 0.0)
+        self.directory = options['DIRECTORY']
+        self.header = 'HTTP_' + options.get('HEADER', 'X-Profile').upper().replace('-', '_')
+        self.token_max_age = options.get('TOKEN_MAX_AGE', 3600)
+        self.sampling_interval = options.get('SAMPLING_INTERVAL', 0.001)
+
+    def should_profile(self, request):
+        token = request.META.get(self.header)
+
+        if token is not None:
+            return check_token(token, self.token_max_age)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), self.sampling_interval)
+        sampler.start()
+        profile.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.disable()
+            sampler.stop()
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = resolver_match.view_name if resolver_match else '<unresolved>'
+        self.save(view_name, profile, sampler.stacks)
+        return response
+
+    def save(self, view_name, profile, stacks):
+        directory = os.path.join(self.directory, view_directory_name(view_name))
+        os.makedirs(directory, exist_ok=True)
+        basename = os.path.join(
+                       directory,
+                       '{timestamp}-{pid}-{thread}'.format(
+                           timestamp=int(time.time() * 1000),
+                           pid=os.getpid(),
+                           thread=threading.get_ident()
+                       )
+                   )
+        profile.dump_stats(basename + '.prof')
+
+        with open(basename + '.collapsed', 'w') as fp:
+            for stack, count in stacks.items():
+                fp.write('{stack} {count}\n'.format(stack=stack, count=count))
@@ -0,0 +1,215 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import models
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse
+
+from .models import (
+                        Movie,
+                        SiteUser,
+                    )
+
+
+def get_quota_settings():
+    return getattr(settings, 'STORAGE_QUOTA', {})
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def get_quota(siteuser):
+    if siteuser.storage_quota is not None:
+        return siteuser.storage_quota
+    return get_quota_settings().get('QUOTA', 10 * 1024 ** 3)
+
+
+def remaining_bytes(user):
+    """
+    The bytes ``user`` may still upload, from the counters of their
+    SiteUser, or None for users without one.
+    """
+    siteuser = SiteUser.objects.filter(user_id=user.pk) \
+                               .only('storage_bytes', 'storage_quota') \
+                               .first()
+
+    if siteuser is None:
+        return None
+    return max(get_quota(siteuser) - siteuser.storage_bytes, 0)
+
+
+def exceeded_message(remaining):
+    return 'Storage quota exceeded: {remaining} more bytes can be uploaded.'.format(remaining=remaining)
+
+
+def mark_upload(request):
+    """
+    Marks ``request`` as a movie upload, whose whole Content-Length is
+    checked against the quota before its body is read.
+    """
+    request.is_movie_upload = True
+
+
+def is_upload_view(view_func, method):
+    """
+    Whether ``view_func`` receives movie uploads by ``method``: class-based
+    views with ``is_movie_upload`` set, and the create action of viewsets
+    with it set.
+    """
+    view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+
+    if not getattr(view_class, 'is_movie_upload', False):
+        return False
+
+    actions = getattr(view_func, 'actions', None)
+    return actions is None or actions.get(method.lower()) == 'create'
+
+
+class QuotaUploadHandler(FileUploadHandler):
+    """
+    Stops multipart requests of authenticated users with QuotaExceeded when
+    the file bytes received so far exceed the remaining quota, or, for
+    uploads marked by mark_upload(), their Content-Length does before any
+    of the body is read. Other fields are not counted, and the quota is
+    only read once a file arrives, so forms without files, such as the
+    watch progress heartbeats, cost no query. Must come first in
+    FILE_UPLOAD_HANDLERS, as it passes the chunks on.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        user = getattr(self.request, 'user', None)
+        self.user = user if user is not None and user.is_authenticated else None
+        self.remaining = None
+        self.received = 0
+
+        if self.user is None or not getattr(self.request, 'is_movie_upload', False):
+            return
+
+        self.remaining = remaining_bytes(self.user)
+
+        if self.remaining is not None and content_length > self.remaining:
+            raise QuotaExceeded(exceeded_message(self.remaining))
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.user is not None and self.remaining is None:
+            self.remaining = remaining_bytes(self.user)
+
+            if self.remaining is None:
+                self.user = None
+        self.received += len(raw_data)
+
+        if self.remaining is not None and self.received > self.remaining:
+            raise QuotaExceeded(exceeded_message(self.remaining))
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class UploadQuotaMiddleware(object):
+    """
+    Answers 413 to the uploads of logged in users over their quota (see
+    QuotaUploadHandler and is_upload_view()). It parses their body itself,
+    so it must come before CsrfViewMiddleware, which would otherwise parse
+    it first. Other requests are left to parse their body when they need.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method != 'POST' or not request.content_type.startswith('multipart/'):
+            return None
+
+        # Users authenticated by the view, as with API keys, are checked
+        # when the view parses the body.
+        if not request.user.is_authenticated or not is_upload_view(view_func, request.method):
+            return None
+
+        mark_upload(request)
+        try:
+            request.POST
+        except QuotaExceeded as e:
+            return HttpResponse(str(e), status=413, content_type='text/plain')
+        return None
+
+
+def measure(storage, name):
+    try:
+        return storage.size(name)
+    except OSError:
+        return None
+
+
+def reconcile(workers=None, batch_size=None):
+    """
+    Measures the files of all movies, BATCH_SIZE at a time on WORKERS
+    threads, fixes the file sizes that changed, and recounts the usage of
+    the users from them, BATCH_SIZE users per UPDATE. Returns the number of
+    movies, of fixed sizes and of missing files.
+    """
+    options = get_quota_settings()
+    workers = workers or options.get('WORKERS', 8)
+    batch_size = batch_size or options.get('BATCH_SIZE', 500)
+    storage = Movie._meta.get_field('uploaded_file').storage
+    movies = fixed = missing = 0
+    last = 0
+
+    with ThreadPoolExecutor(workers) as executor:
+        while True:
+            batch = list(
+                        Movie.all_objects.filter(pk__gt=last)
+                                         .order_by('pk')
+                                         .values_list('pk', 'uploaded_file', 'file_size')[:batch_size]
+                    )
+
+            if not batch:
+                break
+
+            last = batch[-1][0]
+            sizes = executor.map(lambda name: measure(storage, name), [name for pk, name, size in batch])
+
+            for (pk, name, old_size), size in zip(batch, sizes):
+                if size is None:
+                    missing += 1
+                    size = 0
+
+                if size != old_size:
+                    Movie.all_objects.filter(pk=pk).update(file_size=size)
+                    fixed += 1
+            movies += len(batch)
+
+    # Each UPDATE sums the sizes as of its own start, so uploads committed
+    # meanwhile are neither lost nor counted twice.
+    uploads = Movie.all_objects.filter(uploader=models.OuterRef('pk')).order_by().values('uploader')
+    last = 0
+
+    while True:
+        pks = list(SiteUser.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:batch_size])
+
+        if not pks:
+            break
+
+        last = pks[-1]
+        SiteUser.objects.filter(pk__in=pks).update(
+            storage_bytes=Coalesce(
+                              models.Subquery(
+                                  uploads.annotate(total=models.Sum('file_size')).values('total'),
+                                  output_field=models.BigIntegerField()
+                              ),
+                              0
+                          ),
+            movie_count=Coalesce(
+                            models.Subquery(
+                                uploads.annotate(count=models.Count('*')).values('count'),
+                                output_field=models.IntegerField()
+                            ),
+                            0
+                        )
+        )
+    return movies, fixed, missing
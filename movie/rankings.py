@@ -0,0 +1,254 @@
+import math
+from datetime import (
+                        datetime,
+                        timedelta,
+                     )
+
+from django.conf import settings
+from django.db import (
+                        IntegrityError,
+                        models,
+                        transaction,
+                      )
+from django.utils import timezone
+
+from .models import (
+                        Comment,
+                        Movie,
+                        MovieDailyViews,
+                        MovieRanking,
+                        RankingState,
+                    )
+
+
+# Scores are log2 of the decayed event weights as seen from EPOCH. Moving
+# on in time shifts every score alike, so stored scores never need to decay.
+EPOCH = datetime(2018, 1, 1, tzinfo=timezone.utc)
+
+BATCH_SIZE = 500
+
+# The tie-breaker is an expression: ordering by the name of a relation would
+# add the ordering of Movie and sort outside the ranking indexes.
+SORTS = {
+    'trending': ('-ranking__trending_score', models.F('ranking__movie').desc(), ),
+    'weekly': ('-ranking__weekly_views', models.F('ranking__movie').desc(), ),
+    'comments': ('-ranking__comment_count', models.F('ranking__movie').desc(), ),
+}
+
+
+def get_ranking_settings():
+    return getattr(settings, 'RANKING', {})
+
+
+def event_score(when, weight):
+    return math.log2(weight) + (when - EPOCH).total_seconds() / get_ranking_settings().get('HALF_LIFE', 86400)
+
+
+def add_scores(first, second):
+    """
+    log2(2 ** first + 2 ** second), without overflowing.
+    """
+    high, low = max(first, second), min(first, second)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def order_by_ranking(queryset, sort):
+    """
+    Orders movies by one of SORTS, leaving out movies not ranked yet. Other
+    values of ``sort`` leave the queryset as it is.
+    """
+    ordering = SORTS.get(sort)
+
+    if ordering is None:
+        return queryset
+    return queryset.filter(ranking__isnull=False).order_by(*ordering)
+
+
+def case_update(model, field, values):
+    """
+    Sets ``field`` to ``values[pk]``, one UPDATE per BATCH_SIZE rows.
+    """
+    pks = sorted(values)
+
+    for start in range(0, len(pks), BATCH_SIZE):
+        batch = pks[start:start + BATCH_SIZE]
+        model.objects.filter(pk__in=batch).update(**{
+            field: models.Case(
+                       *[models.When(pk=pk, then=models.Value(values[pk])) for pk in batch],
+                       output_field=model._meta.get_field(field)
+                   ),
+        })
+
+
+def current_scores(movie_ids):
+    movie_ids = sorted(movie_ids)
+    scores = {}
+
+    for start in range(0, len(movie_ids), BATCH_SIZE):
+        scores.update(
+            MovieRanking.objects.filter(pk__in=movie_ids[start:start + BATCH_SIZE])
+                                .values_list('pk', 'trending_score')
+        )
+    return scores
+
+
+def create_rankings(movie_ids, now):
+    """
+    Creates the rankings of movies ``movie_ids``, hidden ones included,
+    scored by their upload. Returns them by movie id.
+    """
+    movie_ids = sorted(movie_ids)
+    weight = get_ranking_settings().get('UPLOAD_WEIGHT', 10)
+    rankings = {}
+
+    for start in range(0, len(movie_ids), BATCH_SIZE):
+        rankings.update(
+            (pk, MovieRanking(movie_id=pk, trending_score=event_score(post_date, weight), updated=now))
+            for pk, post_date in Movie.all_objects.filter(pk__in=movie_ids[start:start + BATCH_SIZE])
+                                                  .values_list('pk', 'post_date')
+        )
+    MovieRanking.objects.bulk_create(rankings.values(), batch_size=BATCH_SIZE)
+    return rankings
+
+
+def record_views(counts, now=None):
+    """
+    Adds the views per movie id to the buckets of the day. Called by the view
+    counter flush, within its transaction.
+    """
+    day = timezone.localdate(now or timezone.now())
+    movie_ids = sorted(counts)
+
+    for start in range(0, len(movie_ids), BATCH_SIZE):
+        batch = movie_ids[start:start + BATCH_SIZE]
+
+        for attempt in range(2):
+            existing = set(
+                           MovieDailyViews.objects.filter(day=day, movie_id__in=batch)
+                                                  .values_list('movie_id', flat=True)
+                       )
+            try:
+                with transaction.atomic():
+                    MovieDailyViews.objects.bulk_create([
+                        MovieDailyViews(movie_id=movie_id, day=day, views=counts[movie_id])
+                        for movie_id in batch if movie_id not in existing
+                    ])
+            except IntegrityError:
+                # Another process created some of the buckets meanwhile.
+                continue
+
+            if existing:
+                MovieDailyViews.objects.filter(day=day, movie_id__in=existing).update(
+                    views=models.F('views') + models.Case(
+                                                  *[models.When(movie_id=movie_id, then=counts[movie_id])
+                                                    for movie_id in existing],
+                                                  output_field=models.PositiveIntegerField()
+                                              )
+                )
+            break
+
+
+def update(now=None):
+    """
+    Brings the rankings up to date with the movies, comments and views added
+    since the last run. Returns the number of rankings changed.
+    """
+    options = get_ranking_settings()
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    RankingState.objects.get_or_create(pk=1)
+
+    with transaction.atomic():
+        state = RankingState.objects.select_for_update().get(pk=1)
+
+        rankings = {
+            pk: MovieRanking(
+                    movie_id=pk,
+                    trending_score=event_score(post_date, options.get('UPLOAD_WEIGHT', 10)),
+                    updated=now
+                )
+            for pk, post_date in Movie.objects.filter(pk__gt=state.last_movie_id)
+                                              .values_list('pk', 'post_date')
+        }
+        MovieRanking.objects.bulk_create(rankings.values(), batch_size=BATCH_SIZE)
+        state.last_movie_id = max(rankings, default=state.last_movie_id)
+
+        comments = list(
+                       Comment.objects.filter(pk__gt=state.last_comment_id)
+                                      .order_by('pk')
+                                      .values_list('pk', 'movie_id', 'post_date')
+                   )
+        buckets = list(
+                      MovieDailyViews.objects.filter(views__gt=models.F('ranked_views'))
+                                             .values_list('pk', 'movie_id', 'views', 'ranked_views')
+                  )
+        event_movie_ids = {movie_id for pk, movie_id, post_date in comments} \
+                          | {movie_id for pk, movie_id, views, ranked_views in buckets}
+        scores = current_scores(event_movie_ids)
+
+        # Movies hidden when added, or committed after movies added later,
+        # have no ranking yet: it is created, so their events still count.
+        unranked = create_rankings(event_movie_ids - set(scores), now)
+        rankings.update(unranked)
+        scores.update((pk, ranking.trending_score) for pk, ranking in unranked.items())
+        comment_counts = {}
+
+        for pk, movie_id, post_date in comments:
+            if movie_id not in scores:
+                continue
+            scores[movie_id] = add_scores(scores[movie_id], event_score(post_date, options.get('COMMENT_WEIGHT', 5)))
+            comment_counts[movie_id] = comment_counts.get(movie_id, 0) + 1
+        state.last_comment_id = comments[-1][0] if comments else state.last_comment_id
+
+        for pk, movie_id, views, ranked_views in buckets:
+            if movie_id not in scores:
+                continue
+            weight = (views - ranked_views) * options.get('VIEW_WEIGHT', 1)
+            scores[movie_id] = add_scores(scores[movie_id], event_score(now, weight))
+        case_update(MovieDailyViews, 'ranked_views', {pk: views for pk, movie_id, views, ranked_views in buckets})
+        case_update(MovieRanking, 'trending_score', scores)
+
+        if comment_counts:
+            MovieRanking.objects.filter(pk__in=list(comment_counts)).update(
+                comment_count=models.F('comment_count') + models.Case(
+                                                              *[models.When(pk=pk, then=count)
+                                                                for pk, count in comment_counts.items()],
+                                                              output_field=models.PositiveIntegerField()
+                                                          )
+            )
+
+        weekly_views = dict(
+                           MovieDailyViews.objects.filter(day__gt=today - timedelta(days=7))
+                                                  .values('movie')
+                                                  .annotate(total=models.Sum('views'))
+                                                  .values_list('movie', 'total')
+                       )
+        stale = dict(
+                    MovieRanking.objects.filter(
+                                            models.Q(pk__in=list(weekly_views)) | models.Q(weekly_views__gt=0)
+                                        ).values_list('pk', 'weekly_views')
+                )
+        weekly_views = {
+            pk: weekly_views.get(pk, 0) for pk, current in stale.items() if weekly_views.get(pk, 0) != current
+        }
+        case_update(MovieRanking, 'weekly_views', weekly_views)
+
+        changed = set(rankings) | set(scores) | set(weekly_views)
+        MovieRanking.objects.filter(pk__in=list(changed)).update(updated=now)
+        MovieDailyViews.objects.filter(day__lte=today - timedelta(days=8), views=models.F('ranked_views')).delete()
+
+        state.updated = now
+        state.save()
+    return len(changed)
+
+
+def rebuild(now=None):
+    """
+    Recomputes every ranking, e.g. after comments were deleted or the weights
+    changed. Views older than the kept daily buckets are lost.
+    """
+    with transaction.atomic():
+        MovieRanking.objects.all().delete()
+        MovieDailyViews.objects.update(ranked_views=0)
+        RankingState.objects.update_or_create(pk=1, defaults={'last_movie_id': 0, 'last_comment_id': 0, })
+        return update(now)
@@ -0,0 +1,176 @@
+import math
+import re
+from array import array
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import (
+                        Comment,
+                        Movie,
+                        RelatedMovie,
+                    )
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:
+    numpy = None
+    sparse = None
+
+
+TOKEN_RE = re.compile(r'\w\w+')
+
+BATCH_SIZE = 1000
+
+
+def get_recommendation_settings():
+    return getattr(settings, 'RECOMMENDATIONS', {})
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def term_counts():
+    """
+    Returns the ids of all movies, ascending, and a CSR matrix of the counts
+    of the words of their names and descriptions.
+    """
+    name_weight = get_recommendation_settings().get('NAME_WEIGHT', 2)
+    vocabulary = {}
+    movie_ids = array('q')
+    indptr = array('q', [0])
+    indices = array('i')
+    data = array('f')
+    movies = Movie.objects.order_by('pk').values_list('pk', 'movie_name', 'description')
+
+    for pk, name, description in movies.iterator():
+        counts = {}
+        for weight, text in ((name_weight, name), (1, description)):
+            for token in tokenize(text):
+                term = vocabulary.setdefault(token, len(vocabulary))
+                counts[term] = counts.get(term, 0) + weight
+        movie_ids.append(pk)
+        indices.extend(counts.keys())
+        data.extend(counts.values())
+        indptr.append(len(indices))
+
+    return numpy.frombuffer(movie_ids, dtype=numpy.int64), sparse.csr_matrix(
+        (numpy.frombuffer(data, dtype=numpy.float32), numpy.frombuffer(indices, dtype=numpy.int32), indptr),
+        shape=(len(movie_ids), len(vocabulary))
+    )
+
+
+def commenter_counts(movie_ids):
+    """
+    A CSR matrix with a 1 for every movie (rows as in ``movie_ids``) and
+    every user commenting on it. Comments of deleted users are left out.
+    """
+    movies = array('q')
+    commenters = array('q')
+    comments = Comment.objects.filter(commenter__isnull=False).order_by()
+
+    for movie_id, commenter_id in comments.values_list('movie', 'commenter').distinct().iterator():
+        movies.append(movie_id)
+        commenters.append(commenter_id)
+
+    movies = numpy.frombuffer(movies, dtype=numpy.int64)
+    commenters = numpy.frombuffer(commenters, dtype=numpy.int64)
+    rows = numpy.minimum(numpy.searchsorted(movie_ids, movies), max(len(movie_ids) - 1, 0))
+    # Comments on movies added since term_counts() are left out.
+    known = movie_ids[rows] == movies if len(movie_ids) else numpy.zeros(0, dtype=bool)
+    commenter_ids, columns = numpy.unique(commenters[known], return_inverse=True)
+
+    return sparse.csr_matrix(
+        (numpy.ones(len(columns), dtype=numpy.float32), (rows[known], columns)),
+        shape=(len(movie_ids), len(commenter_ids))
+    )
+
+
+def tfidf(counts):
+    """
+    Sublinear tf-idf weights of a CSR matrix of counts, in rows of unit
+    length. Terms found in one row only, or in more than MAX_DF of them,
+    cannot tell rows apart and are dropped.
+    """
+    rows = counts.shape[0]
+    df = numpy.bincount(counts.indices, minlength=counts.shape[1])
+    keep = (df >= 2) & (df <= max(2, get_recommendation_settings().get('MAX_DF', 0.01) * rows))
+    idf = (numpy.log((1 + rows) / (1 + df)) + 1) * keep
+
+    weights = counts.copy()
+    weights.data = (1 + numpy.log(weights.data)) * idf[weights.indices]
+    weights.eliminate_zeros()
+
+    norms = numpy.sqrt(numpy.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    weights.data /= numpy.repeat(norms, numpy.diff(weights.indptr))
+    return weights.astype(numpy.float32)
+
+
+def movie_vectors():
+    """
+    Returns the ids of all movies and their vectors, whose dot products are
+    the similarities: a mix of the cosine similarities of their words and of
+    their commenters, weighted by COMMENTER_WEIGHT.
+    """
+    commenter_weight = get_recommendation_settings().get('COMMENTER_WEIGHT', 0.3)
+    movie_ids, counts = term_counts()
+
+    return movie_ids, sparse.hstack([
+        tfidf(counts) * math.sqrt(1 - commenter_weight),
+        tfidf(commenter_counts(movie_ids)) * math.sqrt(commenter_weight),
+    ], format='csr', dtype=numpy.float32)
+
+
+def nearest(similarities, first_row, count, min_score):
+    """
+    For every row of a CSR block of similarities, starting at row
+    ``first_row`` of the whole matrix, the columns and scores of the
+    ``count`` most similar other rows, most similar first.
+    """
+    for offset in range(similarities.shape[0]):
+        begin, end = similarities.indptr[offset], similarities.indptr[offset + 1]
+        columns = similarities.indices[begin:end]
+        scores = similarities.data[begin:end]
+        keep = (columns != first_row + offset) & (scores >= min_score)
+        columns, scores = columns[keep], scores[keep]
+
+        if len(scores) > count:
+            top = numpy.argpartition(-scores, count)[:count]
+            columns, scores = columns[top], scores[top]
+        order = numpy.lexsort((columns, -scores))
+        yield columns[order], scores[order]
+
+
+def update(block_size=None):
+    """
+    Recomputes the related movies of every movie, BLOCK_SIZE movies per
+    sparse matrix product and transaction. Returns the numbers of movies
+    and of related movies stored.
+    """
+    options = get_recommendation_settings()
+    block_size = block_size or options.get('BLOCK_SIZE', 2000)
+    count = options.get('COUNT', 6)
+    movie_ids, vectors = movie_vectors()
+    transposed = vectors.T.tocsr()
+    stored = 0
+
+    for start in range(0, len(movie_ids), block_size):
+        block_ids = movie_ids[start:start + block_size]
+        similarities = (vectors[start:start + block_size] @ transposed).tocsr()
+        related = [
+            RelatedMovie(movie_id=int(movie_id), related_id=int(movie_ids[column]), rank=rank, score=float(score))
+            for movie_id, (columns, scores) in zip(
+                                                   block_ids,
+                                                   nearest(similarities, start, count, options.get('MIN_SCORE', 0.05))
+                                               )
+            for rank, (column, score) in enumerate(zip(columns, scores))
+        ]
+
+        with transaction.atomic():
+            RelatedMovie.objects.filter(movie_id__gte=int(block_ids[0]), movie_id__lte=int(block_ids[-1])).delete()
+            RelatedMovie.objects.bulk_create(related, batch_size=BATCH_SIZE)
+        stored += len(related)
+    return len(movie_ids), stored
@@ -0,0 +1,20 @@
+from django.contrib.sessions.backends import cached_db
+
+
+class SessionStore(cached_db.SessionStore):
+    """
+    Cached database session remembering the serialized data it loaded, so a
+    request writing back the same values does not save the session again.
+    """
+
+    def load(self):
+        data = super(SessionStore, self).load()
+        self._loaded = (self.session_key, self.serializer().dumps(data))
+        return data
+
+    def has_changed(self):
+        if not self.modified:
+            return False
+        if not hasattr(self, '_session_cache'):
+            return True
+        return getattr(self, '_loaded', None) != (self.session_key, self.serializer().dumps(self._session_cache))
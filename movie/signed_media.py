@@ -0,0 +1,130 @@
+import base64
+import time
+from urllib.parse import (
+                            parse_qs,
+                            urlencode,
+                         )
+
+from django.conf import settings
+from django.http.cookie import parse_cookie
+from django.utils.crypto import (
+                                    constant_time_compare,
+                                    salted_hmac,
+                                )
+from django.utils.encoding import filepath_to_uri
+
+
+SALT = 'movie.signed_media'
+
+
+def get_signed_media_settings():
+    return getattr(settings, 'SIGNED_MEDIA', {})
+
+
+def is_enabled():
+    return get_signed_media_settings().get('ENABLED', False)
+
+
+def get_keys():
+    """
+    The signing keys by id, and the id of the one new signatures use. All of
+    them are accepted, so keys are rotated by adding a key, making it
+    CURRENT_KEY, and removing the old one MAX_AGE seconds later.
+    """
+    options = get_signed_media_settings()
+    keys = options.get('KEYS') or {'0': settings.SECRET_KEY, }
+    return keys, options.get('CURRENT_KEY') or sorted(keys)[-1]
+
+
+def signature(key, *values):
+    message = '\n'.join(str(value) for value in values)
+    digest = salted_hmac(SALT, message, secret=key).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def expiry(now=None):
+    """
+    MAX_AGE seconds from now, rounded up to GRANULARITY seconds, so the URL
+    of a file stays the same, and cacheable, for a while.
+    """
+    options = get_signed_media_settings()
+    granularity = options.get('GRANULARITY', 600)
+    expires = int(now or time.time()) + options.get('MAX_AGE', 6 * 3600)
+    return -(-expires // granularity) * granularity
+
+
+def sign_url(name, user_id=None, now=None):
+    """
+    The MEDIA_URL of file ``name`` signed until expiry(). URLs bound to
+    ``user_id`` are only served with the media cookie of that user.
+    """
+    keys, key_id = get_keys()
+    expires = expiry(now)
+    params = [('expires', expires), ('key', key_id), ]
+
+    if user_id is not None:
+        params.append(('user', 1))
+    params.append(('signature', signature(keys[key_id], name, expires, user_id or '')))
+    return settings.MEDIA_URL + filepath_to_uri(name) + '?' + urlencode(params)
+
+
+def cookie_value(user_id):
+    keys, key_id = get_keys()
+    return '{user_id}:{key_id}:{signature}'.format(
+               user_id=user_id,
+               key_id=key_id,
+               signature=signature(keys[key_id], 'user', user_id)
+           )
+
+
+def cookie_user(value):
+    """
+    The user id of a media cookie value, or None when it is not valid.
+    """
+    user_id, _, rest = (value or '').partition(':')
+    key_id, _, cookie_signature = rest.partition(':')
+    key = get_keys()[0].get(key_id)
+
+    if key is None or not constant_time_compare(cookie_signature, signature(key, 'user', user_id)):
+        return None
+    return user_id
+
+
+def set_cookie(response, user_id):
+    options = get_signed_media_settings()
+    response.set_cookie(
+        options.get('COOKIE_NAME', 'media_user'),
+        cookie_value(user_id),
+        max_age=options.get('MAX_AGE', 6 * 3600),
+        path=settings.MEDIA_URL,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True
+    )
+
+
+def verify(name, query_string, cookie_header=None, now=None):
+    """
+    Whether a request for file ``name`` with ``query_string`` is signed, not
+    expired and, if bound to a user, comes with the media cookie of that
+    user. Pure computation, without queries.
+    """
+    params = {key: values[0] for key, values in parse_qs(query_string).items()}
+
+    try:
+        expires = int(params['expires'])
+        key = get_keys()[0][params['key']]
+        url_signature = params['signature']
+    except (KeyError, ValueError):
+        return False
+
+    if expires < (now or time.time()):
+        return False
+
+    user_id = ''
+    if 'user' in params:
+        cookies = parse_cookie(cookie_header or '')
+        user_id = cookie_user(cookies.get(get_signed_media_settings().get('COOKIE_NAME', 'media_user')))
+
+        if user_id is None:
+            return False
+    return constant_time_compare(url_signature, signature(key, name, expires, user_id))
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import instrumentation
+
+
+logger = logging.getLogger('movie.slow_query')
+
+_write_lock = threading.Lock()
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+# Modules whose frames say nothing about where a query comes from.
+INFRASTRUCTURE_MODULES = (
+    'movie.instrumentation',
+    'movie.metrics',
+    'movie.middleware',
+    'movie.profiling',
+    'movie.slow_queries',
+    'movie.throttling',
+)
+
+PROJECT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+TABLE_SCAN = re.compile(r'^SCAN (?:TABLE )?\S+$|^Seq Scan', re.IGNORECASE)
+
+
+def get_slow_query_settings():
+    return getattr(settings, 'SLOW_QUERY_LOG', {})
+
+
+def normalize(sql):
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = PLACEHOLDER_LIST.sub('(...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+def is_full_scan(plan):
+    return any(TABLE_SCAN.search(line.strip()) for line in plan)
+
+
+def uses_temp_sort(plan):
+    return any('USE TEMP B-TREE' in line for line in plan)
+
+
+def explain(db, sql, params):
+    prefix = EXPLAIN_PREFIXES.get(db.vendor)
+
+    if prefix is None or not sql.lstrip().upper().startswith('SELECT'):
+        return []
+
+    cursor = db.create_cursor()
+    try:
+        cursor.execute(prefix + sql, params or ())
+        return [str(row[-1]) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def find_callers(frame, limit=5):
+    """
+    Returns the innermost frame of the project (outside Django and the
+    instrumentation), and a short stack of the innermost frames outside the
+    database layer.
+    """
+    location = None
+    stack = []
+
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        filename = frame.f_code.co_filename
+
+        if not module.startswith(INFRASTRUCTURE_MODULES) and not module.startswith('django.db'):
+            entry = '{filename}:{line} in {function}'.format(
+                        filename=os.path.relpath(filename, PROJECT_DIRECTORY)
+                                 if filename.startswith(PROJECT_DIRECTORY) else filename,
+                        line=frame.f_lineno,
+                        function=frame.f_code.co_name
+                    )
+
+            if len(stack) < limit:
+                stack.append(entry)
+
+            if location is None \
+               and filename.startswith(PROJECT_DIRECTORY) \
+               and 'site-packages' not in filename:
+                location = entry
+        frame = frame.f_back
+    return location, stack
+
+
+def observe_query(db, sql, params, many, duration):
+    options = get_slow_query_settings()
+
+    if not options.get('ENABLED', False) or duration < options.get('THRESHOLD', 0.1) or many:
+        return
+
+    location, stack = find_callers(sys._getframe(1))
+
+    try:
+        plan = explain(db, sql, params)
+    except Exception as e:
+        plan = ['EXPLAIN failed: {error}'.format(error=e)]
+
+    stats = instrumentation.current_stats()
+    record = {
+        'time': timezone.now().isoformat(),
+        'alias': db.alias,
+        'duration_ms': round(duration * 1000, 3),
+        'sql': sql,
+        'fingerprint': fingerprint(sql),
+        'normalized_sql': normalize(sql),
+        'plan': plan,
+        'full_scan': is_full_scan(plan),
+        'temp_sort': uses_temp_sort(plan),
+        'view': stats.view_name if stats is not None else None,
+        'location': location,
+        'stack': stack,
+    }
+    logger.warning(
+        'Slow query (%.1f ms) in %s: %s',
+        record['duration_ms'],
+        record['view'] or record['location'],
+        record['normalized_sql'],
+        extra={'slow_query': record}
+    )
+
+    path = options.get('PATH')
+
+    if path:
+        append(path, json.dumps(record) + '\n', options.get('MAX_BYTES', 10 * 1024 ** 2), options.get('BACKUP_COUNT', 3))
+
+
+def append(path, line, max_bytes, backup_count):
+    """
+    Appends ``line`` to ``path``, first moving it to ``path``.1 (and the
+    older files one number up, up to ``backup_count``) once it would grow
+    past ``max_bytes``.
+    """
+    with _write_lock:
+        try:
+            full = os.path.getsize(path) + len(line) > max_bytes
+        except FileNotFoundError:
+            full = False
+
+        if full:
+            for index in range(backup_count - 1, 0, -1):
+                older = '{path}.{index}'.format(path=path, index=index)
+
+                if os.path.exists(older):
+                    os.replace(older, '{path}.{index}'.format(path=path, index=index + 1))
+
+            if backup_count:
+                os.replace(path, path + '.1')
+            else:
+                os.remove(path)
+
+        with open(path, 'a') as fp:
+            fp.write(line)
+
+
+def read_log(path):
+    with open(path) as fp:
+        for line in fp:
+            if line.strip():
+                yield json.loads(line)
+
+
+def group_by_fingerprint(records):
+    groups = {}
+
+    for record in records:
+        group = groups.get(record['fingerprint'])
+
+        if group is None:
+            group = groups[record['fingerprint']] = {
+                'fingerprint': record['fingerprint'],
+                'normalized_sql': record['normalized_sql'],
+                'example_sql': record['sql'],
+                'plan': record['plan'],
+                'full_scan': False,
+                'temp_sort': False,
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'views': {},
+                'locations': {},
+            }
+        group['count'] += 1
+        group['total_ms'] += record['duration_ms']
+        group['max_ms'] = max(group['max_ms'], record['duration_ms'])
+        group['full_scan'] = group['full_scan'] or record['full_scan']
+        group['temp_sort'] = group['temp_sort'] or record['temp_sort']
+
+        for key, value in (('views', record['view']), ('locations', record['location'])):
+            if value:
+                group[key][value] = group[key].get(value, 0) + 1
+    return sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
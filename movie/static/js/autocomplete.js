@@ -0,0 +1,30 @@
+// Fills the datalist of the search box with suggestions while typing.
+$(function () {
+  $('input[data-autocomplete-url]').each(function () {
+    var input = $(this);
+    var list = $('#' + input.attr('list'));
+    var timer = null;
+    var last = null;
+
+    input.on('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        var q = input.val();
+
+        if (q === last) {
+          return;
+        }
+        last = q;
+        $.getJSON(input.data('autocomplete-url'), {q: q}, function (data) {
+          if (input.val() !== q) {
+            return;
+          }
+          list.empty();
+          $.each(data.results, function (i, movie) {
+            list.append($('<option>').attr('value', movie.name));
+          });
+        });
+      }, 100);
+    });
+  });
+});
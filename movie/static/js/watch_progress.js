@@ -0,0 +1,47 @@
+// Resumes the movie where the user stopped and reports the position while
+// it plays.
+$(function () {
+  $('video[data-progress-url]').each(function () {
+    var video = this;
+    var url = $(video).data('progress-url');
+    var resume = parseFloat($(video).data('resume')) || 0;
+    var reported = null;
+
+    function report(beacon) {
+      var data = new FormData();
+
+      if (video.currentTime === reported) {
+        return;
+      }
+      reported = video.currentTime;
+      data.append('csrfmiddlewaretoken', $(video).data('csrf-token'));
+      data.append('position', video.currentTime);
+      if (isFinite(video.duration)) {
+        data.append('duration', video.duration);
+      }
+
+      if (beacon && navigator.sendBeacon) {
+        navigator.sendBeacon(url, data);
+      } else {
+        $.ajax({url: url, method: 'POST', data: data, processData: false, contentType: false});
+      }
+    }
+
+    $(video).on('loadedmetadata', function () {
+      if (resume > 0 && resume < video.duration) {
+        video.currentTime = resume;
+      }
+    });
+    $(video).on('pause ended', function () {
+      report(false);
+    });
+    setInterval(function () {
+      if (!video.paused) {
+        report(false);
+      }
+    }, $(video).data('heartbeat') * 1000);
+    $(window).on('pagehide', function () {
+      report(true);
+    });
+  });
+});
@@ -0,0 +1,152 @@
+import gzip
+import mimetypes
+import os
+import posixpath
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import (
+                            FileResponse,
+                            HttpResponseNotModified,
+                        )
+from django.utils.http import (
+                                http_date,
+                                quote_etag,
+                              )
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Preferred first.
+ENCODINGS = (
+    ('br', '.br'),
+    ('gzip', '.gz'),
+)
+
+
+def get_static_files_settings():
+    return getattr(settings, 'STATIC_FILES', {})
+
+
+def compress(path):
+    """
+    Writes the gzip and, when the brotli package is installed, brotli
+    variants of the file next to it. A variant is only kept when it is
+    smaller than the file.
+    """
+    options = get_static_files_settings()
+
+    with open(path, 'rb') as fp:
+        content = fp.read()
+
+    variants = [('.gz', gzip.compress(content, options.get('GZIP_LEVEL', 9)))]
+
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=options.get('BROTLI_QUALITY', 11))))
+
+    written = []
+    for suffix, compressed in variants:
+        if len(compressed) < len(content):
+            with open(path + suffix, 'wb') as fp:
+                fp.write(compressed)
+            written.append(path + suffix)
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return written
+
+
+def should_compress(path):
+    options = get_static_files_settings()
+    return path.endswith(tuple(options.get('COMPRESS_EXTENSIONS', ()))) \
+        and os.path.getsize(path) >= options.get('MIN_SIZE', 0)
+
+
+def accepted_encodings(request):
+    accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    encodings = set()
+
+    for item in accept.split(','):
+        coding, _, params = item.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        encodings.add(coding.strip().lower())
+    return encodings
+
+
+class StaticFilesMiddleware(object):
+    """
+    Serves the files collected into STATIC_ROOT, using the precompressed
+    variant accepted by the client. Names listed in the staticfiles manifest
+    carry a content hash and are cached as immutable; other files are
+    revalidated after MAX_AGE seconds.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = get_static_files_settings()
+        self.enabled = options.get('ENABLED', True) and bool(settings.STATIC_ROOT)
+        self.root = settings.STATIC_ROOT
+        self.prefix = settings.STATIC_URL
+        self.max_age = options.get('MAX_AGE', 60)
+        self.immutable_max_age = options.get('IMMUTABLE_MAX_AGE', 60 * 60 * 24 * 365)
+        self.immutable_names = frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if self.enabled and request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            response = self.serve(request, request.path_info[len(self.prefix):])
+
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def resolve(self, name):
+        name = posixpath.normpath(unquote(name)).lstrip('/')
+
+        if name.startswith('..') or name in ('', '.'):
+            return None, None
+        path = os.path.join(self.root, *name.split('/'))
+        return (name, path) if os.path.isfile(path) else (None, None)
+
+    def serve(self, request, name):
+        name, path = self.resolve(name)
+
+        if path is None:
+            return None
+
+        content_type, _ = mimetypes.guess_type(path)
+        encodings = accepted_encodings(request)
+        encoding = None
+
+        for coding, suffix in ENCODINGS:
+            if coding in encodings and os.path.isfile(path + suffix):
+                encoding, path = coding, path + suffix
+                break
+
+        stat = os.stat(path)
+        etag = quote_etag('{mtime:x}-{size:x}'.format(mtime=int(stat.st_mtime), size=stat.st_size))
+
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag \
+           or ('HTTP_IF_NONE_MATCH' not in request.META
+               and not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime, stat.st_size)):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type or 'application/octet-stream')
+            response['Content-Length'] = stat.st_size
+
+            if encoding is not None:
+                response['Content-Encoding'] = encoding
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Vary'] = 'Accept-Encoding'
+
+        if name in self.immutable_names:
+            response['Cache-Control'] = 'public, max-age={max_age}, immutable'.format(max_age=self.immutable_max_age)
+        else:
+            response['Cache-Control'] = 'public, max-age={max_age}'.format(max_age=self.max_age)
+        return response
@@ -0,0 +1,251 @@
+import bisect
+import hashlib
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+from django.utils._os import (
+                                abspathu,
+                                safe_join,
+                             )
+from django.utils.functional import cached_property
+
+from . import (
+                metrics,
+                signed_media,
+                staticfiles,
+              )
+
+
+class InstrumentedFileSystemStorage(FileSystemStorage):
+    """
+    File system storage reporting operation latency and written bytes, with
+    signed URLs when SIGNED_MEDIA is enabled.
+    """
+
+    def url(self, name):
+        if signed_media.is_enabled():
+            return signed_media.sign_url(name)
+        return super(InstrumentedFileSystemStorage, self).url(name)
+
+    def _open(self, name, mode='rb'):
+        with metrics.STORAGE_OPERATION_DURATION.time(key=('open', )):
+            return super(InstrumentedFileSystemStorage, self)._open(name, mode)
+
+    def _save(self, name, content):
+        with metrics.STORAGE_OPERATION_DURATION.time(key=('save', )):
+            name = super(InstrumentedFileSystemStorage, self)._save(name, content)
+        metrics.UPLOAD_BYTES.inc(self.size(name))
+        return name
+
+    def delete(self, name):
+        with metrics.STORAGE_OPERATION_DURATION.time(key=('delete', )):
+            return super(InstrumentedFileSystemStorage, self).delete(name)
+
+
+def get_media_shards_settings():
+    return getattr(settings, 'MEDIA_SHARDS', {})
+
+
+def name_hash(value):
+    return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+def hashed_upload_to(instance, filename):
+    """
+    ``files/ab/cd/<filename>``, where ``abcd`` starts the hash of
+    ``filename``, so uploads spread over many small directories and the
+    directory of a name can be recomputed. Files of the same name share one.
+    """
+    digest = hashlib.md5(filename.encode()).hexdigest()
+    return 'files/{first}/{second}/{filename}'.format(first=digest[:2], second=digest[2:4], filename=filename)
+
+
+class HashRing(object):
+    """
+    Consistent hashing of names over ``nodes``, each placed at ``vnodes``
+    points. Adding a node only moves the names it takes over, from the node
+    that follows it.
+    """
+
+    def __init__(self, nodes, vnodes=64):
+        self.nodes = list(nodes)
+        points = sorted(
+                     (name_hash('{node}#{index}'.format(node=node, index=index)), node)
+                     for node in self.nodes
+                     for index in range(vnodes)
+                 )
+        self.hashes = [point for point, node in points]
+        self.owners = [node for point, node in points]
+
+    def preference(self, name):
+        """
+        All the nodes, the one owning ``name`` first, then the ones that would
+        own it, in turn, if the ones before them were missing.
+        """
+        start = bisect.bisect(self.hashes, name_hash(name))
+        nodes = []
+
+        for index in range(len(self.owners)):
+            node = self.owners[(start + index) % len(self.owners)]
+
+            if node not in nodes:
+                nodes.append(node)
+
+                if len(nodes) == len(self.nodes):
+                    break
+        return nodes
+
+
+class ShardedFileSystemStorage(InstrumentedFileSystemStorage):
+    """
+    Stores each file on one of the MEDIA_SHARDS ROOTS, by consistent hashing
+    of its name. Files are read from the first root that has them, in ring
+    order, so files not yet moved by ``rebalance`` after a root was added
+    are still found on their old root.
+    """
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super(ShardedFileSystemStorage, self)._clear_cached_properties(setting, **kwargs)
+
+        if setting in ('MEDIA_ROOT', 'MEDIA_SHARDS'):
+            self.__dict__.pop('roots', None)
+            self.__dict__.pop('ring', None)
+
+    @cached_property
+    def roots(self):
+        return [abspathu(root) for root in get_media_shards_settings().get('ROOTS') or [self.base_location]]
+
+    @cached_property
+    def ring(self):
+        return HashRing(self.roots, get_media_shards_settings().get('VNODES', 64))
+
+    def paths(self, name):
+        return [safe_join(root, name) for root in self.ring.preference(name)]
+
+    def path(self, name):
+        paths = self.paths(name)
+
+        for path in paths:
+            if os.path.exists(path):
+                return path
+        return paths[0]
+
+    def delete(self, name):
+        super(ShardedFileSystemStorage, self).delete(name)
+
+        # A file may be on two roots while it is moved.
+        for root, path in zip(self.ring.preference(name), self.paths(name)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.prune(root, os.path.dirname(path))
+
+    def prune(self, root, directory):
+        """
+        Removes ``directory`` and its parents while they are empty, up to
+        the top directory below ``root``, so deleted files leave no empty
+        ``files/ab/cd`` directories behind.
+        """
+        while directory.startswith(root + os.sep) and os.path.dirname(directory) != root:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    def rebalance(self, name):
+        """
+        Moves file ``name`` to the root owning it when it is on another one.
+        The copy is renamed into place before the old file is removed, so
+        readers always find a whole file. Returns whether it moved.
+        """
+        paths = self.paths(name)
+        target = paths[0]
+
+        if os.path.exists(target):
+            return False
+
+        for root, source in zip(self.ring.preference(name)[1:], paths[1:]):
+            if os.path.exists(source):
+                break
+        else:
+            return False
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(target), suffix='.part', delete=False)
+        try:
+            with temp_file, open(source, 'rb') as source_file:
+                shutil.copyfileobj(source_file, temp_file)
+            os.replace(temp_file.name, target)
+        except BaseException:
+            os.unlink(temp_file.name)
+            raise
+        os.remove(source)
+        self.prune(root, os.path.dirname(source))
+        return True
+
+
+def rebalance_media(workers=None, batch_size=None):
+    """
+    Moves the files of all movies to the roots owning them, BATCH_SIZE at a
+    time on WORKERS threads. Returns the number of movies and of moved
+    files.
+    """
+    from .models import Movie
+
+    options = get_media_shards_settings()
+    workers = workers or options.get('WORKERS', 8)
+    batch_size = batch_size or options.get('BATCH_SIZE', 500)
+    storage = Movie._meta.get_field('uploaded_file').storage
+    movies = moved = 0
+    last = 0
+
+    with ThreadPoolExecutor(workers) as executor:
+        while True:
+            batch = list(
+                        Movie.all_objects.filter(pk__gt=last)
+                                         .order_by('pk')
+                                         .values_list('pk', 'uploaded_file')[:batch_size]
+                    )
+
+            if not batch:
+                break
+
+            last = batch[-1][0]
+            moved += sum(executor.map(storage.rebalance, [name for pk, name in batch if name]))
+            movies += len(batch)
+    return movies, moved
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage writing gzip and brotli variants of the collected files
+    (see movie.staticfiles.StaticFilesMiddleware). Until collectstatic has
+    written the manifest, as in development and tests, templates get the
+    unhashed names.
+    """
+
+    def post_process(self, *args, **kwargs):
+        for post_processed in super(CompressedManifestStaticFilesStorage, self).post_process(*args, **kwargs):
+            yield post_processed
+
+        if kwargs.get('dry_run'):
+            return
+
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            path = self.path(name)
+
+            if os.path.isfile(path) and staticfiles.should_compress(path):
+                staticfiles.compress(path)
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super(CompressedManifestStaticFilesStorage, self).stored_name(name)
@@ -0,0 +1,143 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+from rest_framework import exceptions
+
+from movie import accounts
+from movie.api.authentication import (
+                                        APIKeyAuthentication,
+                                        APIKeyCache,
+                                        api_key_cache,
+                                     )
+from movie.models import (
+                             APIKey,
+                             SiteUser,
+                         )
+
+
+class APIKeyAuthenticationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.url_path = '/api/v1/user/'
+
+        mail_address = 'admin@example.com'
+        cls.admin_user = User.objects.create_user(
+                             username=mail_address,
+                             password='password',
+                             email=mail_address,
+                             first_name='adm_first',
+                             last_name='adm_last',
+                             is_staff=True
+                         )
+        SiteUser.objects.create(user=cls.admin_user, bio='user bio')
+        cls.api_key, cls.raw_key = APIKey.objects.create_key(
+                                       cls.admin_user,
+                                       'ingest',
+                                       ['user:read', ]
+                                   )
+
+    def auth_header(self, raw_key=None):
+        return {'HTTP_AUTHORIZATION': 'Api-Key ' + (raw_key or self.raw_key), }
+
+    def test_key_with_read_scope_can_get_data(self):
+        resp = self.client.get(self.url_path, **self.auth_header())
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(json.loads(resp.content)), 1)
+
+    def test_key_without_write_scope_cannot_update_data(self):
+        resp = self.client.post(
+                   self.url_path,
+                   content_type='application/json',
+                   data=json.dumps({'bio': 'bio', }),
+                   **self.auth_header()
+               )
+        self.assertEqual(resp.status_code, 403)
+
+    def test_key_cannot_access_viewset_out_of_scope(self):
+        resp = self.client.get('/api/v1/movie/', **self.auth_header())
+        self.assertEqual(resp.status_code, 403)
+
+    def test_invalid_key_is_rejected(self):
+        resp = self.client.get(self.url_path, **self.auth_header('invalid'))
+        self.assertEqual(resp.status_code, 403)
+
+    def test_revoked_key_is_rejected(self):
+        self.client.get(self.url_path, **self.auth_header())
+        self.api_key.revoke()
+        resp = self.client.get(self.url_path, **self.auth_header())
+        self.assertEqual(resp.status_code, 403)
+
+    def test_key_of_non_staff_user_is_limited_to_its_scopes(self):
+        user = User.objects.create_user(username='ingest@example.com', email='ingest@example.com', password='password')
+        SiteUser.objects.create(user=user, bio='bio')
+        api_key, raw_key = APIKey.objects.create_key(user, 'ingest', ['movie:read', ])
+
+        self.assertEqual(self.client.get('/api/v1/movie/', **self.auth_header(raw_key)).status_code, 200)
+        self.assertEqual(self.client.get(self.url_path, **self.auth_header(raw_key)).status_code, 403)
+
+        self.client.login(username='ingest@example.com', password='password')
+        self.assertEqual(self.client.get('/api/v1/movie/').status_code, 403)
+
+    def test_keys_are_revoked_with_the_account(self):
+        authentication = APIKeyAuthentication()
+        self.assertEqual(authentication.authenticate_credentials(self.raw_key)[0], self.admin_user)
+
+        accounts.delete_account(SiteUser.objects.get(user=self.admin_user))
+        self.assertTrue(APIKey.objects.get(pk=self.api_key.pk).revoked)
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            authentication.authenticate_credentials(self.raw_key)
+
+    def test_cached_key_does_not_query_database(self):
+        self.client.get(self.url_path, **self.auth_header())
+        with self.assertNumQueries(2):
+            self.client.get(self.url_path, **self.auth_header())
+
+    def test_raw_key_is_not_stored(self):
+        self.assertNotEqual(self.api_key.hashed_key, self.raw_key)
+        self.assertEqual(self.api_key.prefix, self.raw_key[:8])
+
+    def test_create_api_key_command(self):
+        out = StringIO()
+        call_command(
+            'create_api_key',
+            self.admin_user.email,
+            'command',
+            '--scope=movie:read',
+            stdout=out,
+            stderr=StringIO()
+        )
+        raw_key = out.getvalue().strip()
+        api_key = APIKey.objects.get(hashed_key=APIKey.hash_key(raw_key))
+        self.assertEqual(api_key.scope_set, frozenset(['movie:read', ]))
+
+
+class APIKeyCacheTest(TestCase):
+
+    def setUp(self):
+        self.cache = APIKeyCache(max_size=2, ttl=60, revalidate_interval=60)
+        self.cache.invalidate()
+
+    def test_cache_evicts_least_recently_used_entry(self):
+        self.cache.set('a', 'credentials a', self.cache.epoch)
+        self.cache.set('b', 'credentials b', self.cache.epoch)
+        self.cache.get('a')
+        self.cache.set('c', 'credentials c', self.cache.epoch)
+        self.assertEqual(self.cache.get('a'), 'credentials a')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(len(self.cache), 2)
+
+    def test_cache_drops_entry_set_before_invalidation(self):
+        epoch = self.cache.epoch
+        self.cache.invalidate()
+        self.cache.set('a', 'credentials a', epoch)
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_invalidation_propagates_through_generation(self):
+        self.cache.revalidate_interval = 0
+        self.cache.set('a', 'credentials a', self.cache.epoch)
+        api_key_cache.invalidate()
+        self.assertIsNone(self.cache.get('a'))
@@ -8,6 +8,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from django.urls import reverse
 
+from movie import jobs
 from movie.models import (
                              Comment,
                              Movie,
@@ -163,7 +164,11 @@ class RestApiSiteUserTest(TestCase):
                     pk=self.site_user.pk
                 )
                )
-        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(resp.status_code, 202)
+        self.assertFalse(User.objects.get(pk=self.test_user.pk).is_active)
+
+        while jobs.work():
+            pass
         user_obj = User.objects.filter(pk=self.test_user.pk)
         self.assertFalse(user_obj.exists())
 
@@ -379,6 +384,14 @@ class RestApiCommentTest(TestCase):
         self.assertEqual(resp.status_code, 204)
         comment_obj = Comment.objects.filter(pk=comment_pk)
         self.assertFalse(comment_obj.exists())
+
+    def test_comments_of_deleted_movies_are_hidden(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.movie.soft_delete()
+        resp = self.client.get(self.url_path)
+        self.assertEqual(json.loads(resp.content), [])
+        resp = self.client.get('{path}{pk}/'.format(path=self.url_path, pk=self.comment.pk))
+        self.assertEqual(resp.status_code, 404)
         
 
 class RestApiSiteUserTest(TestCase):
@@ -0,0 +1,125 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.utils.six import StringIO
+
+from movie import (
+                    accounts,
+                    jobs,
+                    timelines,
+                  )
+from movie.models import (
+                            AccountDeletion,
+                            BackgroundJob,
+                            Comment,
+                            Follow,
+                            Movie,
+                            SiteUser,
+                         )
+
+
+@override_settings(
+    ACCOUNT_DELETION={'BATCH_SIZE': 2},
+    JOBS={'BATCH_SIZE': 10, 'LEASE': 300, 'POLL_INTERVAL': 0, 'RETRY_DELAY': 0, 'MAX_ATTEMPTS': 1, }
+)
+class AccountDeletionTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.users = [
+            User.objects.create_user(username=name, email=name, password='password')
+            for name in ('a@example.com', 'b@example.com')
+        ]
+        self.siteuser, self.other = [SiteUser.objects.create(user=user, bio='bio') for user in self.users]
+        self.movies = [self.upload(self.siteuser, 'movie {num}'.format(num=num)) for num in range(3)]
+        self.other_movie = self.upload(self.other, 'other')
+
+        for movie in self.movies:
+            Comment.objects.create(movie=movie, commenter=self.other, description='comment')
+        Comment.objects.create(movie=self.other_movie, commenter=self.siteuser, description='comment')
+        timelines.follow(self.siteuser, self.other)
+        timelines.follow(self.other, self.siteuser)
+        self.process_jobs()
+
+    def upload(self, uploader, name):
+        movie = Movie(uploader=uploader, movie_name=name, description='description')
+        movie.uploaded_file.save('movie.mp4', ContentFile(b'movie'), save=False)
+        movie.save()
+        return movie
+
+    def process_jobs(self):
+        processed = 0
+        while True:
+            count = jobs.work()
+            if not count:
+                return processed
+            processed += count
+
+    def test_account_is_disabled_at_once(self):
+        self.client.login(username='a@example.com', password='password')
+        deletion = accounts.delete_account(self.siteuser)
+        self.assertEqual(accounts.delete_account(self.siteuser), deletion)
+
+        self.assertFalse(User.objects.get(pk=self.users[0].pk).is_active)
+        self.assertFalse(self.client.login(username='a@example.com', password='password'))
+        self.assertEqual(BackgroundJob.objects.filter(task=accounts.PURGE_TASK).count(), 1)
+        self.assertEqual(Movie.objects.filter(uploader=self.siteuser).count(), 3)
+
+    def test_account_is_purged_in_batches(self):
+        paths = [movie.uploaded_file.path for movie in self.movies]
+        deletion = accounts.delete_account(self.siteuser)
+
+        self.assertGreater(self.process_jobs(), 5)
+        deletion.refresh_from_db()
+        self.assertIsNotNone(deletion.finished)
+        self.assertEqual((deletion.movies_deleted, deletion.comments_deleted), (3, 4))
+        self.assertEqual(deletion.username, 'a@example.com')
+
+        self.assertFalse(SiteUser.objects.filter(pk=self.siteuser.pk).exists())
+        self.assertFalse(User.objects.filter(pk=self.users[0].pk).exists())
+        self.assertEqual(list(Movie.objects.all()), [self.other_movie])
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(SiteUser.objects.get(pk=self.other.pk).follower_count, 0)
+        for path in paths:
+            self.assertFalse(self.other_movie.uploaded_file.storage.exists(path))
+
+    def test_failed_purge_is_resumed(self):
+        deletion = accounts.delete_account(self.siteuser)
+
+        with mock.patch('django.core.files.storage.FileSystemStorage.delete', side_effect=OSError):
+            self.process_jobs()
+        deletion.refresh_from_db()
+        self.assertIsNone(deletion.finished)
+        self.assertEqual((deletion.movies_deleted, deletion.comments_deleted), (0, 4))
+        self.assertEqual(Movie.objects.filter(uploader=self.siteuser).count(), 3)
+
+        out = StringIO()
+        call_command('resume_account_deletions', stdout=out)
+        self.assertIn('Resumed 1 account deletions.', out.getvalue())
+        call_command('resume_account_deletions', stdout=out)
+        self.assertIn('Resumed 0 account deletions.', out.getvalue())
+
+        self.process_jobs()
+        deletion.refresh_from_db()
+        self.assertIsNotNone(deletion.finished)
+        self.assertEqual(deletion.movies_deleted, 3)
+        self.assertFalse(BackgroundJob.objects.exists())
+
+    def test_views(self):
+        self.client.login(username='a@example.com', password='password')
+        self.client.post('/movie/user/delete')
+        self.assertEqual(AccountDeletion.objects.get().siteuser, self.siteuser)
+        self.assertNotIn('_auth_user_id', self.client.session)
@@ -0,0 +1,156 @@
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.test.utils import CaptureQueriesContext
+
+from movie import (
+                    autocomplete,
+                    slow_queries,
+                  )
+from movie.admin import (
+                            MovieAdmin,
+                            estimate_count,
+                         )
+from movie.api.authentication import api_key_cache
+from movie.models import (
+                            APIKey,
+                            Comment,
+                            Follow,
+                            Movie,
+                            SiteUser,
+                         )
+
+
+class AdminTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.siteusers = [
+            SiteUser.objects.create(
+                user=User.objects.create_user(username=name, email=name + '@example.com', password='password'),
+                bio='bio'
+            )
+            for name in ('alice', 'bob', 'carol')
+        ]
+        cls.movies = [
+            Movie.objects.create(
+                uploader=cls.siteusers[0],
+                movie_name=name,
+                description='description',
+                uploaded_file='files/movie.mp4',
+                view_count=10
+            )
+            for name in ('Matrix', 'Matrix Reloaded', 'Alien')
+        ]
+        cls.comments = [
+            Comment.objects.create(movie=cls.movies[0], commenter=siteuser, description='comment')
+            for siteuser in cls.siteusers
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        return self.client.get('/admin/movie/{model}/'.format(model=model), params)
+
+    def results(self, model, **params):
+        return [str(obj) for obj in self.changelist(model, **params).context['cl'].result_list]
+
+    def test_changelists(self):
+        for model in ('siteuser', 'movie', 'comment', 'apikey'):
+            self.assertEqual(self.changelist(model).status_code, 200)
+        self.assertEqual(self.changelist('movie', post_date__year=self.movies[0].post_date.year).status_code, 200)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as few:
+            self.changelist('siteuser')
+
+        for name in ('dave', 'erin', 'frank'):
+            SiteUser.objects.create(user=User.objects.create_user(username=name), bio='bio')
+        with CaptureQueriesContext(connection) as more:
+            self.changelist('siteuser')
+        self.assertEqual(len(few), len(more))
+
+    @override_settings(ADMIN={'COUNT_LIMIT': 2})
+    def test_counts_are_bounded(self):
+        self.assertEqual(estimate_count(Movie.all_objects.all()), Movie.objects.latest('id').id)
+        self.assertEqual(estimate_count(Movie.all_objects.filter(view_count=10)), 2)
+        self.assertEqual(estimate_count(Movie.all_objects.filter(pk=self.movies[0].pk)), 1)
+
+        with CaptureQueriesContext(connection) as context:
+            self.changelist('comment')
+        counts = [query['sql'] for query in context.captured_queries if 'COUNT(' in query['sql']]
+        self.assertTrue(counts)
+        for sql in counts:
+            self.assertIn('LIMIT', sql)
+
+    def test_search(self):
+        self.assertEqual(self.results('movie', q='Matrix'), ['Matrix Reloaded', 'Matrix'])
+        self.assertEqual(self.results('movie', q=str(self.movies[2].pk)), ['Alien'])
+        self.assertEqual(self.results('movie', q='matrix'), [])
+        self.assertEqual(self.results('siteuser', q='BOB@example.com'), [str(self.siteusers[1])])
+        self.assertEqual(self.results('siteuser', q='car'), [str(self.siteusers[2])])
+        self.assertEqual(self.results('comment', q='carol@example.com'), ['comment'])
+
+    def test_name_search_uses_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plans are checked on SQLite.')
+
+        queryset, distinct = MovieAdmin(Movie, admin.site).get_search_results(None, Movie.all_objects.all(), 'Matrix')
+        with CaptureQueriesContext(connection) as context:
+            list(queryset)
+        plan = slow_queries.explain(connection, context.captured_queries[0]['sql'], None)
+        self.assertTrue(any('movie_name_idx' in line for line in plan), plan)
+
+    def run_action(self, model, action, objects):
+        with CaptureQueriesContext(connection) as context:
+            resp = self.client.post(
+                       '/admin/movie/{model}/'.format(model=model),
+                       {'action': action, '_selected_action': [obj.pk for obj in objects], }
+                   )
+        self.assertEqual(resp.status_code, 302)
+        return [query['sql'] for query in context.captured_queries if not query['sql'].startswith('SELECT')]
+
+    def test_reset_view_counts(self):
+        writes = self.run_action('movie', 'reset_view_counts', self.movies[:2])
+        self.assertEqual(len([sql for sql in writes if sql.startswith('UPDATE')]), 1)
+        self.assertEqual(list(Movie.objects.order_by('id').values_list('view_count', flat=True)), [0, 0, 10])
+
+    def test_soft_deleted_movies_leave_the_autocomplete_index(self):
+        autocomplete.reset_index('AUTOCOMPLETE')
+        index = autocomplete.get_index()
+        self.assertIn(self.movies[0].pk, index.movies)
+
+        self.run_action('movie', 'soft_delete_selected', self.movies[:1])
+        self.assertNotIn(self.movies[0].pk, index.movies)
+        self.run_action('movie', 'restore_selected', self.movies[:1])
+        self.assertIn(self.movies[0].pk, index.movies)
+
+    def test_delete_comments(self):
+        writes = self.run_action('comment', 'delete_comments', self.comments[:2])
+        self.assertEqual(len([sql for sql in writes if sql.startswith('DELETE')]), 1)
+        self.assertEqual(list(Comment.objects.all()), [self.comments[2]])
+
+    def test_recount_followers(self):
+        Follow.objects.create(follower=self.siteusers[1], uploader=self.siteusers[0])
+        SiteUser.objects.update(follower_count=5)
+
+        self.run_action('siteuser', 'recount_followers', self.siteusers)
+        self.assertEqual(
+            list(SiteUser.objects.order_by('id').values_list('follower_count', flat=True)),
+            [1, 0, 0]
+        )
+
+    def test_revoke_keys(self):
+        api_key, raw_key = APIKey.objects.create_key(self.admin, 'key')
+        epoch = api_key_cache.epoch
+
+        self.run_action('apikey', 'revoke_keys', [api_key])
+        api_key.refresh_from_db()
+        self.assertTrue(api_key.revoked)
+        self.assertNotEqual(api_key_cache.epoch, epoch)
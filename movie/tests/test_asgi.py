@@ -0,0 +1,186 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.wsgi import get_wsgi_application
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+
+from movie import (
+                    autocomplete,
+                    benchmark,
+                    signed_media,
+                  )
+from movie.asgi import (
+                            ASGIHandler,
+                            parse_range,
+                       )
+
+
+def call(application, path, method='GET', headers=(), body=b'', query_string=b''):
+    scope = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'query_string': query_string,
+        'root_path': '',
+        'headers': [[name.encode(), value.encode()] for name, value in headers],
+        'client': ('127.0.0.1', 1234),
+        'server': ('testserver', 80),
+    }
+    messages = []
+    received = []
+
+    async def receive():
+        if not received:
+            received.append(True)
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        messages.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(application(scope, receive, send))
+    finally:
+        loop.close()
+
+    start = messages[0]
+    headers = {name.decode().lower(): value.decode() for name, value in start['headers']}
+    return start['status'], headers, b''.join(message.get('body', b'') for message in messages[1:]), messages
+
+
+class ParseRangeTest(TestCase):
+
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=0-5000', 1000), (0, 999))
+        self.assertIsNone(parse_range(None, 1000))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1000))
+
+    def test_unsatisfiable_range(self):
+        with self.assertRaises(ValueError):
+            parse_range('bytes=1000-', 1000)
+
+
+class ASGIHandlerTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        os.makedirs(os.path.join(self.media_root, 'files'))
+        self.content = bytes(range(256)) * 1024
+
+        with open(os.path.join(self.media_root, 'files', 'movie.mp4'), 'wb') as fp:
+            fp.write(self.content)
+
+        settings_override = override_settings(
+                                MEDIA_ROOT=self.media_root,
+                                ASGI={'MEDIA_CHUNK_SIZE': 1000, 'FILE_THREADS': 2, 'WSGI_THREADS': 2, }
+                            )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.application = ASGIHandler(get_wsgi_application())
+        self.path, self.query_string = signed_media.sign_url('files/movie.mp4').split('?')
+
+    def test_media_is_streamed_in_chunks(self):
+        status, headers, body, messages = call(self.application, self.path, query_string=self.query_string.encode())
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['content-type'], 'video/mp4')
+        self.assertEqual(headers['accept-ranges'], 'bytes')
+        self.assertEqual(int(headers['content-length']), len(self.content))
+        self.assertEqual(body, self.content)
+        self.assertEqual(len(messages) - 1, -(-len(self.content) // 1000))
+        self.assertFalse(messages[-1]['more_body'])
+
+    def test_media_range(self):
+        status, headers, body, messages = call(self.application, self.path, query_string=self.query_string.encode(), headers=[('Range', 'bytes=100-2599')])
+        self.assertEqual(status, 206)
+        self.assertEqual(headers['content-range'], 'bytes 100-2599/{size}'.format(size=len(self.content)))
+        self.assertEqual(body, self.content[100:2600])
+
+    def test_unsatisfiable_range(self):
+        status, headers, body, messages = call(self.application, self.path, query_string=self.query_string.encode(), headers=[('Range', 'bytes=999999-')])
+        self.assertEqual(status, 416)
+
+    def test_head_has_no_body(self):
+        status, headers, body, messages = call(self.application, self.path, method='HEAD', query_string=self.query_string.encode())
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'')
+
+    def test_unsigned_media_is_forbidden(self):
+        status, headers, body, messages = call(self.application, self.path)
+        self.assertEqual(status, 403)
+
+        status, headers, body, messages = call(self.application, self.path, query_string=self.query_string.replace('expires=', 'expires=1').encode())
+        self.assertEqual(status, 403)
+
+    def test_unsigned_media_is_forbidden_before_looking_for_the_file(self):
+        with mock.patch('movie.asgi.media_path') as media_path:
+            status, headers, body, messages = call(self.application, '/media/files/missing.mp4')
+        self.assertEqual(status, 403)
+        self.assertFalse(media_path.called)
+
+    def test_wsgi_write_callable(self):
+        def wsgi_application(environ, start_response):
+            write = start_response('200 OK', [('Content-Type', 'text/plain')])
+            write(b'written ')
+            return [b'returned']
+
+        status, headers, body, messages = call(ASGIHandler(wsgi_application), '/other')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'written returned')
+
+    def test_paths_outside_media_root_are_not_served(self):
+        path, query_string = signed_media.sign_url('../manage.py').split('?')
+        status, headers, body, messages = call(self.application, path, query_string=query_string.encode())
+        self.assertEqual(status, 404)
+
+    def test_autocomplete_index_is_loaded_at_startup(self):
+        autocomplete.reset_index('AUTOCOMPLETE')
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+            if message['type'] == 'lifespan.startup.complete':
+                self.assertIsNotNone(autocomplete._index)
+
+        loop = asyncio.new_event_loop()
+        try:
+            with self.settings(AUTOCOMPLETE={}):
+                loop.run_until_complete(self.application({'type': 'lifespan'}, receive, send))
+        finally:
+            loop.close()
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+    def test_other_requests_are_handled_by_django(self):
+        status, headers, body, messages = call(self.application, '/movie/movies')
+        self.assertEqual(status, 200)
+        self.assertIn('text/html', headers['content-type'])
+        self.assertIn(b'</html>', body)
+
+    def test_soak_keeps_streams_concurrent_with_few_threads(self):
+        report = benchmark.soak(
+                     clients=200,
+                     duration=0.5,
+                     delay=0.01,
+                     ramp_up=0,
+                     path=self.path + '?' + self.query_string,
+                     application=self.application
+                 )
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(report['peak_streams'], 200)
+        self.assertLess(report['peak_threads'], 50)
@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+from django.contrib import auth
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from movie.models import SiteUser
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'auth-tests', }, },
+    SESSION_ENGINE='movie.sessions',
+    CACHED_AUTH={'ENABLED': True, 'CACHE_ALIAS': 'default', 'USER_TIMEOUT': 300, }
+)
+class CachedAuthTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='a@example.com', email='a@example.com', password='password')
+        SiteUser.objects.create(user=cls.user, bio='bio')
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.login(username='a@example.com', password='password')
+
+    def auth_queries(self, path):
+        with CaptureQueriesContext(connection) as context:
+            resp = self.client.get(path)
+        return resp, [
+            query['sql'] for query in context.captured_queries
+            if '"django_session"' in query['sql'] or 'FROM "auth_user"' in query['sql']
+        ]
+
+    def test_cache_hit_skips_session_and_user_queries(self):
+        self.auth_queries('/movie/user/edit')
+        resp, queries = self.auth_queries('/movie/user/edit')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['user'], self.user)
+        self.assertEqual(queries, [])
+
+    def test_password_change_logs_out(self):
+        self.auth_queries('/movie/user/edit')
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('changed')
+        user.save()
+        resp, queries = self.auth_queries('/movie/user/edit')
+        self.assertEqual(resp.status_code, 302)
+
+    def test_unchanged_session_is_not_saved(self):
+        self.auth_queries('/movie/user/edit')
+        resp, queries = self.auth_queries('/movie/movies')
+        self.assertNotIn('sessionid', resp.cookies)
+        self.assertFalse([sql for sql in queries if sql.startswith(('UPDATE', 'INSERT'))])
+
+    def test_session_written_with_same_values_is_not_saved(self):
+        self.auth_queries('/movie/user/edit')
+        session = self.client.session
+        session[auth.SESSION_KEY] = session[auth.SESSION_KEY]
+        self.assertTrue(session.modified)
+        self.assertFalse(session.has_changed())
+        session['theme'] = 'dark'
+        self.assertTrue(session.has_changed())
+
+    def test_bulk_deactivated_user_is_logged_out_after_invalidation(self):
+        self.auth_queries('/movie/user/edit')
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        call_command('invalidate_cached_users', stdout=StringIO())
+        resp, queries = self.auth_queries('/movie/user/edit')
+        self.assertEqual(resp.status_code, 302)
+
+    def test_anonymous_page_does_not_create_session(self):
+        self.client.logout()
+        count = Session.objects.count()
+        resp = self.client.get('/movie/movies')
+        self.assertNotIn('sessionid', resp.cookies)
+        self.assertEqual(Session.objects.count(), count)
+
+
+class ClearExpiredSessionsTest(TestCase):
+
+    def test_expired_sessions_are_deleted_in_batches(self):
+        now = timezone.now()
+        for num in range(5):
+            Session.objects.create(session_key='expired{num}'.format(num=num), session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='active', session_data='', expire_date=now + timedelta(days=1))
+
+        out = StringIO()
+        with CaptureQueriesContext(connection) as context:
+            call_command('clear_expired_sessions', '--batch-size=2', stdout=out)
+        self.assertIn('Deleted 5 expired sessions.', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['active', ])
+        self.assertEqual(len([query for query in context.captured_queries if query['sql'].startswith('DELETE')]), 3)
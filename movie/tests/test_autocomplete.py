@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.utils.six import StringIO
+
+from movie import autocomplete
+from movie.autocomplete import PrefixIndex
+from movie.models import (
+                            Movie,
+                            SiteUser,
+                         )
+
+
+AUTOCOMPLETE = {
+    'SNAPSHOT': None,
+    'CHECK_INTERVAL': 0,
+    'RESULTS': 10,
+    'MIN_LENGTH': 2,
+    'SCAN_LIMIT': 500,
+    'CACHE_SIZE': 1000,
+}
+
+
+@override_settings(AUTOCOMPLETE=AUTOCOMPLETE)
+class PrefixIndexTest(TestCase):
+
+    def setUp(self):
+        self.index = PrefixIndex.build([
+            (1, 'Cat video', 10),
+            (2, 'Another cat video', 30),
+            (3, 'Catalogue of cars', 20),
+            (4, 'Café Déjà-vu', 0),
+        ])
+
+    def names(self, query, limit=10):
+        return [name for pk, name in self.index.search(query, limit)]
+
+    def test_normalize(self):
+        self.assertEqual(autocomplete.normalize('Café  Déjà-VU!'), ['cafe', 'deja', 'vu'])
+
+    def test_prefix_matches_by_popularity(self):
+        self.assertEqual(self.names('cat'), ['Another cat video', 'Catalogue of cars', 'Cat video'])
+        self.assertEqual(self.names('CAT', limit=1), ['Another cat video'])
+        self.assertEqual(self.names('deja'), ['Café Déjà-vu'])
+        self.assertEqual(self.names('dog'), [])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.names('vid ca'), ['Another cat video', 'Cat video'])
+        self.assertEqual(self.names('car catal'), ['Catalogue of cars'])
+
+    def test_short_queries_have_no_results(self):
+        self.assertEqual(self.names('c'), [])
+        self.assertEqual(self.names('c v'), [])
+        self.assertEqual(self.names(' - '), [])
+
+    def test_add_and_remove_keep_the_arrays_sorted(self):
+        self.index.add(5, 'Cats and dogs', 100)
+        self.index.add(1, 'Dog video', 10)
+        self.index.remove(3)
+
+        self.assertEqual(self.index._words, sorted(self.index._words))
+        self.assertEqual(len(self.index._words), len(self.index._ids))
+        self.assertEqual(self.names('cat'), ['Cats and dogs', 'Another cat video'])
+        self.assertEqual(self.names('dog'), ['Cats and dogs', 'Dog video'])
+
+    @override_settings(AUTOCOMPLETE=dict(AUTOCOMPLETE, SCAN_LIMIT=0))
+    def test_results_of_wide_prefixes_are_cached_until_a_match_changes(self):
+        self.assertEqual(self.names('cat'), ['Another cat video', 'Catalogue of cars', 'Cat video'])
+        self.assertEqual(self.names('vid'), ['Another cat video', 'Cat video'])
+        self.assertIn((('cat', ), 10), self.index._results)
+
+        self.index.add(5, 'Cats', 100)
+        self.assertNotIn((('cat', ), 10), self.index._results)
+        self.assertIn((('vid', ), 10), self.index._results)
+        self.assertEqual(self.names('cat')[0], 'Cats')
+
+        self.index.remove(1)
+        self.assertEqual(self.names('vid'), ['Another cat video'])
+
+    def test_snapshot_round_trip(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'autocomplete.json')
+        self.index.save(path)
+
+        loaded = PrefixIndex.load(path)
+        self.assertEqual(loaded._words, self.index._words)
+        self.assertEqual(loaded.search('vid', 10), self.index.search('vid', 10))
+        loaded.add(5, 'Video', 0)
+        self.assertEqual(len(loaded.search('vid', 10)), 3)
+
+
+@override_settings(AUTOCOMPLETE=AUTOCOMPLETE)
+class AutocompleteViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='a@example.com', email='a@example.com', password='password')
+        cls.siteuser = SiteUser.objects.create(user=user, bio='bio')
+        cls.movie = Movie.objects.create(
+                        uploader=cls.siteuser,
+                        movie_name='Cat video',
+                        description='description',
+                        uploaded_file='files/movie.mp4'
+                    )
+
+    def setUp(self):
+        autocomplete.reset_index('AUTOCOMPLETE')
+
+    def suggest(self, q):
+        resp = self.client.get('/movie/movies/autocomplete', {'q': q, })
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()['results']
+
+    def test_suggestions_are_served_without_queries(self):
+        self.suggest('ca')
+
+        with self.assertNumQueries(0):
+            results = self.suggest('cat vi')
+        self.assertEqual(results, [{'id': self.movie.pk, 'name': 'Cat video', 'url': self.movie.get_absolute_url(), }])
+
+    def test_saved_and_deleted_movies_are_indexed(self):
+        self.suggest('ca')
+        movie = Movie.objects.create(
+                    uploader=self.siteuser,
+                    movie_name='Caterpillar',
+                    description='description',
+                    uploaded_file='files/movie.mp4'
+                )
+        self.assertEqual([result['name'] for result in self.suggest('cat')], ['Caterpillar', 'Cat video'])
+
+        movie.movie_name = 'Butterfly'
+        movie.save()
+        self.assertEqual([result['name'] for result in self.suggest('cat')], ['Cat video'])
+        self.assertEqual([result['name'] for result in self.suggest('butt')], ['Butterfly'])
+
+        Movie.objects.get(pk=self.movie.pk).delete()
+        self.assertEqual(self.suggest('cat'), [])
+
+    def test_index_is_loaded_from_snapshot(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'autocomplete.json')
+
+        out = StringIO()
+        call_command('build_autocomplete_index', '--path', path, stdout=out)
+        self.assertIn('Indexed 1 movies', out.getvalue())
+
+        with self.settings(AUTOCOMPLETE=dict(AUTOCOMPLETE, SNAPSHOT=path)):
+            with self.assertNumQueries(0):
+                self.assertEqual(len(self.suggest('cat')), 1)
+
+            PrefixIndex.build([(self.movie.pk, 'Dog video', 0)]).save(path)
+            os.utime(path, (0, 0))
+            self.assertEqual(self.suggest('cat'), [])
+            self.assertEqual(len(self.suggest('dog')), 1)
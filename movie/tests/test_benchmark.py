@@ -0,0 +1,81 @@
+import random
+import shutil
+import tempfile
+
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+
+from movie import benchmark
+from movie.models import (
+                             Comment,
+                             Movie,
+                             SiteUser,
+                         )
+
+
+class SeedTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+    def test_seed_creates_skewed_data(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            created = benchmark.seed(20, 50, 400, rng=random.Random(1))
+        self.assertEqual(created, {'users': 20, 'movies': 50, 'comments': 400})
+        self.assertEqual(SiteUser.objects.count(), 20)
+        self.assertEqual(Movie.objects.count(), 50)
+        self.assertEqual(Comment.objects.count(), 400)
+
+        comment_counts = sorted(
+                             (Comment.objects.filter(movie=movie).count() for movie in Movie.objects.all()),
+                             reverse=True
+                         )
+        self.assertGreater(comment_counts[0], 400 / 50 * 3)
+
+    def test_seeded_movie_files_are_valid_mp4(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            benchmark.seed(1, 1, 0)
+            movie = Movie.objects.get()
+            with movie.uploaded_file.storage.open(movie.uploaded_file.name) as fp:
+                self.assertEqual(fp.read(), benchmark.MP4_STUB)
+
+
+class ReportTest(TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, .50), 50)
+        self.assertEqual(benchmark.percentile(values, .99), 99)
+        self.assertEqual(benchmark.percentile([5], .95), 5)
+
+    def test_compare_reports_relative_change(self):
+        baseline = {'scenarios': {'movie-list': {'p50_ms': 10, 'queries_per_request': 4, }, }, }
+        current = {'scenarios': {'movie-list': {'p50_ms': 5, 'queries_per_request': 4, }, }, }
+        self.assertEqual(
+            benchmark.compare(baseline, current),
+            {'movie-list': {'p50_ms': -0.5, 'queries_per_request': 0.0, }, }
+        )
+
+    def test_run_reports_every_scenario(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        with override_settings(MEDIA_ROOT=media_root):
+            benchmark.seed(3, 5, 10, rng=random.Random(1))
+            report = benchmark.run(requests=3, warmup=1, seed=1)
+
+        self.assertEqual(
+            set(report['scenarios']),
+            {
+                'movie-list', 'movie-list-search', 'movie-detail', 'user-detail',
+                'api:movie-list', 'api:comment-list', 'api:siteuser-list', 'upload-movie',
+            }
+        )
+        for name, result in report['scenarios'].items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertEqual(result['requests'], 3)
+            self.assertGreater(result['queries_per_request'], 0)
+        self.assertEqual(Movie.objects.count(), 5)
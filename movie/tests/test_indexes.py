@@ -0,0 +1,104 @@
+from django.contrib.auth.models import User
+from django.db import (
+                        IntegrityError,
+                        connection,
+                        transaction,
+                      )
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from movie import slow_queries
+from movie.forms import SiteUserCreateForm
+from movie.models import (
+                            Comment,
+                            Movie,
+                            SiteUser,
+                         )
+
+
+class QueryPlanTest(TestCase):
+    """
+    The main views must read movies and comments through the indexes, in
+    index order, instead of scanning and sorting the tables.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='a@example.com', email='a@example.com', password='password')
+        cls.siteuser = SiteUser.objects.create(user=cls.user, bio='bio')
+        cls.movies = [
+            Movie.objects.create(
+                uploader=cls.siteuser,
+                movie_name='movie {num}'.format(num=num),
+                description='description',
+                uploaded_file='files/movie{num}.mp4'.format(num=num)
+            )
+            for num in range(3)
+        ]
+        for movie in cls.movies:
+            Comment.objects.create(movie=movie, commenter=cls.siteuser, description='comment')
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plans are checked on SQLite.')
+
+    def plans(self, path, tables, data=None):
+        with CaptureQueriesContext(connection) as context:
+            resp = self.client.get(path, data)
+        self.assertEqual(resp.status_code, 200)
+        plans = [
+            (query['sql'], slow_queries.explain(connection, query['sql'], None))
+            for query in context.captured_queries
+            if any('FROM "{table}"'.format(table=table) in query['sql'] for table in tables)
+        ]
+        self.assertTrue(plans)
+        return plans
+
+    def assertIndexed(self, plans):
+        for sql, plan in plans:
+            self.assertFalse(slow_queries.is_full_scan(plan), '{sql}: {plan}'.format(sql=sql, plan=plan))
+            self.assertFalse(slow_queries.uses_temp_sort(plan), '{sql}: {plan}'.format(sql=sql, plan=plan))
+
+    def test_movie_list(self):
+        self.assertIndexed(self.plans('/movie/movies', ['movie_movie']))
+
+    def test_movie_search_is_not_sorted(self):
+        for sql, plan in self.plans('/movie/movies', ['movie_movie'], {'q': 'movie'}):
+            self.assertFalse(slow_queries.uses_temp_sort(plan), '{sql}: {plan}'.format(sql=sql, plan=plan))
+
+    def test_movie_detail(self):
+        self.assertIndexed(self.plans(self.movies[0].get_absolute_url(), ['movie_movie', 'movie_comment']))
+
+    def test_user_detail(self):
+        self.assertIndexed(self.plans(self.siteuser.get_absolute_url(), ['movie_movie']))
+
+    def test_email_lookup_uses_case_insensitive_index(self):
+        form = SiteUserCreateForm(data={
+                   'first_name': 'first',
+                   'last_name': 'last',
+                   'email': 'A@Example.com',
+                   'password': 'password',
+                   'confirm_password': 'password',
+               })
+        with CaptureQueriesContext(connection) as context:
+            self.assertFalse(form.is_valid())
+        self.assertIn('email', form.errors)
+        plan = slow_queries.explain(connection, context.captured_queries[0]['sql'], None)
+        self.assertTrue(any('auth_user_email_ci_uniq' in line for line in plan), plan)
+
+
+class EmailIndexTest(TestCase):
+
+    def setUp(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('The email index needs expression indexes.')
+
+    def test_email_is_unique_regardless_of_case(self):
+        User.objects.create_user(username='a@example.com', email='a@example.com')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user(username='A@Example.com', email='A@Example.com')
+
+    def test_blank_emails_do_not_collide(self):
+        User.objects.create_user(username='first', email='')
+        User.objects.create_user(username='second', email='')
+        self.assertEqual(User.objects.filter(email='').count(), 2)
@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from movie import jobs
+from movie.models import BackgroundJob
+
+
+calls = []
+
+
+def record(**kwargs):
+    calls.append(kwargs)
+
+
+def fail(**kwargs):
+    raise ValueError('failed')
+
+
+def record_and_fail(**kwargs):
+    BackgroundJob.objects.create(task='recorded')
+    raise ValueError('failed')
+
+
+@override_settings(JOBS={'BATCH_SIZE': 10, 'LEASE': 300, 'POLL_INTERVAL': 0, 'RETRY_DELAY': 10, 'MAX_ATTEMPTS': 2, })
+class JobTest(TestCase):
+
+    def setUp(self):
+        del calls[:]
+
+    def test_jobs_run_in_order_and_are_deleted(self):
+        jobs.enqueue('movie.tests.test_jobs.record', num=1)
+        jobs.enqueue('movie.tests.test_jobs.record', num=2)
+        jobs.enqueue('movie.tests.test_jobs.record', run_after=timezone.now() + timedelta(hours=1), num=3)
+
+        self.assertEqual(jobs.work(), 2)
+        self.assertEqual(calls, [{'num': 1}, {'num': 2}])
+        self.assertEqual(BackgroundJob.objects.count(), 1)
+        self.assertEqual(jobs.work(), 0)
+
+    def test_claimed_jobs_are_not_claimed_again(self):
+        jobs.enqueue('movie.tests.test_jobs.record')
+        self.assertEqual(len(jobs.claim(10, 'worker-1')), 1)
+        self.assertEqual(jobs.claim(10, 'worker-2'), [])
+
+    def test_jobs_of_dead_workers_are_claimed_after_lease(self):
+        jobs.enqueue('movie.tests.test_jobs.record')
+        jobs.claim(10, 'worker-1')
+        BackgroundJob.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        claimed = jobs.claim(10, 'worker-2')
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual((claimed[0].owner, claimed[0].attempts), ('worker-2', 2))
+
+    def test_failed_jobs_are_retried_with_backoff(self):
+        job = jobs.enqueue('movie.tests.test_jobs.record_and_fail')
+
+        self.assertEqual(jobs.work(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (BackgroundJob.PENDING, 1))
+        self.assertIn('ValueError: failed', job.last_error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=9))
+        # The work of the failed attempt was rolled back.
+        self.assertFalse(BackgroundJob.objects.filter(task='recorded').exists())
+
+        BackgroundJob.objects.update(run_after=timezone.now())
+        jobs.work()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (BackgroundJob.FAILED, 2))
+        self.assertEqual(jobs.work(), 0)
+
+    def test_command(self):
+        jobs.enqueue('movie.tests.test_jobs.record')
+        jobs.enqueue('movie.tests.test_jobs.fail')
+
+        out = StringIO()
+        call_command('process_jobs', '--once', stdout=out)
+        self.assertIn('Processed 2 jobs.', out.getvalue())
+        self.assertEqual(len(calls), 1)
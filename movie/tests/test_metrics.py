@@ -0,0 +1,135 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+
+from movie import metrics
+from movie.storage import InstrumentedFileSystemStorage
+
+
+class MetricTypesTest(TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter_exposition(self):
+        counter = metrics.Counter('test_total', 'Test counter.', ['view'], registry=self.registry)
+        counter.labels('movie-detail').inc()
+        counter.labels('movie-detail').inc(2)
+        output = metrics.generate_latest(self.registry)
+        self.assertIn('# TYPE test_total counter', output)
+        self.assertIn('test_total{view="movie-detail"} 3.0', output)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('test_seconds', 'Test.', buckets=(.1, 1), registry=self.registry)
+        for value in (.05, .5, .5, 5):
+            histogram.observe(value)
+        output = metrics.generate_latest(self.registry)
+        self.assertIn('test_seconds_bucket{le="0.1"} 1.0', output)
+        self.assertIn('test_seconds_bucket{le="1.0"} 3.0', output)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 4.0', output)
+        self.assertIn('test_seconds_count 4.0', output)
+
+    def test_labels_must_match_label_names(self):
+        counter = metrics.Counter('test_total', 'Test counter.', ['view'], registry=self.registry)
+        with self.assertRaises(ValueError):
+            counter.labels('a', 'b')
+
+    def test_duplicated_name_is_rejected(self):
+        metrics.Counter('test_total', 'Test counter.', registry=self.registry)
+        with self.assertRaises(ValueError):
+            metrics.Counter('test_total', 'Test counter.', registry=self.registry)
+
+
+class MultiProcessTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.registry = metrics.Registry()
+        self.counter = metrics.Counter('test_total', 'Test counter.', registry=self.registry)
+        self.gauge = metrics.Gauge('test_gauge', 'Test gauge.', registry=self.registry)
+        self.histogram = metrics.Histogram('test_seconds', 'Test.', buckets=(1, ), registry=self.registry)
+
+    def write_snapshot(self, pid, counter, gauge, histogram):
+        with open(os.path.join(self.directory, '{pid}.json'.format(pid=pid)), 'w') as fp:
+            json.dump(
+                {
+                    'pid': pid,
+                    'metrics': {
+                        'test_total': dict(self.counter.snapshot(), samples=[[[], counter]]),
+                        'test_gauge': dict(self.gauge.snapshot(), samples=[[[], gauge]]),
+                        'test_seconds': dict(self.histogram.snapshot(), samples=[[[], histogram]]),
+                    },
+                },
+                fp
+            )
+
+    def test_snapshots_of_processes_are_merged(self):
+        self.counter.inc(1)
+        self.gauge.set(1)
+        self.histogram.observe(.5)
+        self.write_snapshot(os.getppid(), 2, 3, [[1, 1], 3.5, 2])
+
+        with self.settings(METRICS={'MULTIPROCESS_DIR': self.directory, }):
+            output = metrics.generate_latest(self.registry)
+        self.assertIn('test_total 3.0', output)
+        self.assertIn('test_gauge 4.0', output)
+        self.assertIn('test_seconds_bucket{le="1.0"} 2.0', output)
+        self.assertIn('test_seconds_count 3.0', output)
+
+    def test_gauges_of_dead_processes_are_dropped(self):
+        dead_pid = 2 ** 22 + 1
+        self.write_snapshot(dead_pid, 2, 3, [[0, 0], 0, 0])
+
+        with self.settings(METRICS={'MULTIPROCESS_DIR': self.directory, }):
+            output = metrics.generate_latest(self.registry)
+        self.assertIn('test_total 2.0', output)
+        self.assertNotIn('test_gauge 3.0', output)
+
+
+class MetricsEndpointTest(TestCase):
+
+    def test_endpoint_exposes_request_latency_per_url_name(self):
+        self.client.get('/movie/movies')
+        resp = self.client.get('/metrics')
+        self.assertEqual(resp.status_code, 200)
+        content = resp.content.decode()
+        self.assertIn('movie_http_request_duration_seconds_count{view="movie-list"}', content)
+        self.assertIn('movie_http_requests_total{view="movie-list",method="GET",status="200"}', content)
+        self.assertIn('movie_db_queries_total{alias="default"}', content)
+
+    @override_settings(METRICS={'ALLOWED_IPS': ('10.0.0.1', ), })
+    def test_endpoint_is_restricted_by_address(self):
+        resp = self.client.get('/metrics')
+        self.assertEqual(resp.status_code, 403)
+
+        staff = User.objects.create_user(username='admin@example.com', email='admin@example.com', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS={'ALLOWED_IPS': ('127.0.0.1', ), 'TOKEN': 'secret', })
+    def test_endpoint_requires_token_when_set(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class InstrumentedStorageTest(TestCase):
+
+    def test_save_is_measured(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        storage = InstrumentedFileSystemStorage(location=directory)
+        before = metrics.UPLOAD_BYTES.snapshot()['samples']
+        storage.save('movie.mp4', ContentFile(b'0123456789'))
+        after = metrics.UPLOAD_BYTES.snapshot()['samples']
+        written = after[0][1] - (before[0][1] if before else 0)
+        self.assertEqual(written, 10)
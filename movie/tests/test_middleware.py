@@ -0,0 +1,170 @@
+import gzip
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.db import connection
+from django.http import (
+                            HttpResponse,
+                            StreamingHttpResponse,
+                        )
+from django.test import (
+                            RequestFactory,
+                            TestCase,
+                            override_settings,
+                        )
+from django.test.utils import CaptureQueriesContext
+
+from movie import (
+                    instrumentation,
+                    metrics,
+                  )
+from movie.middleware import CompressionMiddleware
+from movie.models import (
+                             Comment,
+                             Movie,
+                             SiteUser,
+                         )
+
+
+class RequestTimingMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings_override.enable()
+        super(RequestTimingMiddlewareTest, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super(RequestTimingMiddlewareTest, cls).tearDownClass()
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.url_path = '/movie/{movie_id}'
+
+        mail_address = 'test@example.com'
+        test_user = User.objects.create_user(
+                        username=mail_address,
+                        password='12345',
+                        email=mail_address,
+                        first_name='Super',
+                        last_name='John',
+                    )
+        site_user = SiteUser.objects.create(user=test_user, bio='user bio')
+        upload_file = mock.MagicMock(spec=File, name='FileMock')
+        upload_file.name = 'file_name.mp4'
+        cls.movie = Movie.objects.create(
+                        uploader=site_user,
+                        description='movie description',
+                        movie_name='movie title',
+                        uploaded_file=upload_file,
+                    )
+        for num in range(3):
+            Comment.objects.create(movie=cls.movie, commenter=site_user, description='comment')
+
+    def get_timings(self, resp):
+        timings = {}
+        for metric in resp['Server-Timing'].split(', '):
+            name, duration = metric.split(';')[:2]
+            timings[name] = float(duration[len('dur='):])
+        return timings
+
+    def test_response_has_server_timing_header(self):
+        resp = self.client.get(self.url_path.format(movie_id=self.movie.pk))
+        timings = self.get_timings(resp)
+        self.assertEqual(set(timings), {'db', 'view', 'tpl', 'total'})
+        self.assertGreater(timings['tpl'], 0)
+        self.assertGreaterEqual(timings['total'], timings['view'])
+
+    def test_server_timing_header_has_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(self.url_path.format(movie_id=self.movie.pk))
+        self.assertIn(
+            'desc="{count} queries"'.format(count=len(queries)),
+            resp['Server-Timing']
+        )
+
+    @override_settings(REQUEST_TIMING={'QUERY_COUNT_BUDGET': 1, })
+    def test_request_over_budget_is_logged(self):
+        with self.assertLogs('movie.request', 'WARNING') as logs:
+            self.client.get(self.url_path.format(movie_id=self.movie.pk))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'movie-detail')
+        self.assertEqual(record['over_budget'], ['query_count', ])
+
+
+class QueryObserverTest(TestCase):
+
+    def test_observer_is_called_for_each_query(self):
+        observer = mock.Mock()
+        instrumentation.add_query_observer(observer)
+        try:
+            list(Movie.objects.all())
+        finally:
+            instrumentation.remove_query_observer(observer)
+        self.assertEqual(observer.call_count, 1)
+        self.assertIn('movie_movie', observer.call_args[0][1])
+
+
+class CompressionMiddlewareTest(TestCase):
+
+    def setUp(self):
+        self.request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+    def test_page_is_compressed(self):
+        resp = self.client.get('/movie/movies', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', resp['Vary'])
+        self.assertEqual(int(resp['Content-Length']), len(resp.content))
+        self.assertIn(b'</html>', gzip.decompress(resp.content))
+
+    def test_page_is_not_compressed_without_accept_encoding(self):
+        resp = self.client.get('/movie/movies')
+        self.assertFalse(resp.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', resp['Vary'])
+
+    def test_small_response_is_not_compressed(self):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(b'{}', content_type='application/json'))
+        self.assertFalse(middleware(self.request).has_header('Content-Encoding'))
+
+    def test_compressed_media_is_skipped(self):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(b'\x00' * 4096, content_type='video/mp4'))
+        resp = middleware(self.request)
+        self.assertFalse(resp.has_header('Content-Encoding'))
+        self.assertFalse(resp.has_header('Vary'))
+
+    def test_streaming_response_is_compressed_incrementally(self):
+        consumed = []
+
+        def content():
+            for num in range(3):
+                consumed.append(num)
+                yield 'line {num}\n'.format(num=num).encode() * 100
+
+        middleware = CompressionMiddleware(lambda request: StreamingHttpResponse(content(), content_type='text/plain'))
+        resp = middleware(self.request)
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertEqual(consumed, [])
+
+        chunks = iter(resp.streaming_content)
+        first = next(chunks)
+        self.assertEqual(consumed, [0])
+        self.assertTrue(first)
+
+        body = gzip.decompress(first + b''.join(chunks))
+        self.assertEqual(body, b''.join('line {num}\n'.format(num=num).encode() * 100 for num in range(3)))
+
+    def test_compression_is_measured(self):
+        before_in = dict((tuple(key), value) for key, value in metrics.COMPRESSION_INPUT_BYTES.snapshot()['samples'])
+        middleware = CompressionMiddleware(lambda request: HttpResponse(b'a' * 4096, content_type='text/html'))
+        middleware(self.request)
+        after_in = dict((tuple(key), value) for key, value in metrics.COMPRESSION_INPUT_BYTES.snapshot()['samples'])
+        self.assertEqual(after_in[('gzip', )] - before_in.get(('gzip', ), 0), 4096)
+        self.assertIn(('gzip', ), [tuple(key) for key, value in metrics.COMPRESSION_SECONDS.snapshot()['samples']])
@@ -0,0 +1,80 @@
+import glob
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.utils.six import StringIO
+
+from movie import profiling
+
+
+class ProfilingMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff_user = User.objects.create_user(
+                             username='admin@example.com',
+                             password='password',
+                             email='admin@example.com',
+                             is_staff=True
+                         )
+        cls.normal_user = User.objects.create_user(
+                              username='test@example.com',
+                              password='password',
+                              email='test@example.com'
+                          )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def profiling_settings(self, **options):
+        return dict({'ENABLED': True, 'SAMPLE_RATE': 0.0, 'DIRECTORY': self.directory, }, **options)
+
+    def profile_files(self, view_name, extension):
+        return glob.glob(os.path.join(self.directory, view_name, '*.' + extension))
+
+    def test_middleware_is_not_used_when_disabled(self):
+        with override_settings(PROFILING={'ENABLED': False, }):
+            with self.assertRaises(MiddlewareNotUsed):
+                profiling.ProfilingMiddleware(lambda request: None)
+
+    def test_sampled_requests_are_profiled_per_url_name(self):
+        with override_settings(PROFILING=self.profiling_settings(SAMPLE_RATE=1.0)):
+            self.client.get('/movie/movies')
+            self.client.get('/movie/movies')
+        self.assertEqual(len(self.profile_files('movie-list', 'prof')), 2)
+        self.assertEqual(len(self.profile_files('movie-list', 'collapsed')), 2)
+
+    def test_request_with_staff_token_is_profiled(self):
+        with override_settings(PROFILING=self.profiling_settings()):
+            self.client.get('/movie/movies')
+            self.client.get('/movie/movies', HTTP_X_PROFILE=profiling.make_token(self.staff_user))
+        self.assertEqual(len(self.profile_files('movie-list', 'prof')), 1)
+
+    def test_request_with_forged_token_is_not_profiled(self):
+        with override_settings(PROFILING=self.profiling_settings()):
+            self.client.get('/movie/movies', HTTP_X_PROFILE='forged')
+        self.assertEqual(self.profile_files('movie-list', 'prof'), [])
+
+    def test_token_is_not_issued_to_normal_user(self):
+        with self.assertRaises(ValueError):
+            profiling.make_token(self.normal_user)
+
+    def test_report_shows_hot_functions(self):
+        collapsed_path = os.path.join(self.directory, 'stacks.txt')
+
+        with override_settings(PROFILING=self.profiling_settings(SAMPLE_RATE=1.0)):
+            self.client.get('/movie/movies')
+            out = StringIO()
+            call_command('profile_report', '--view=movie-list', '--collapsed=' + collapsed_path, stdout=out)
+        self.assertIn('=== movie-list (1 requests)', out.getvalue())
+        self.assertIn('get_response', out.getvalue())
+        self.assertTrue(os.path.exists(collapsed_path))
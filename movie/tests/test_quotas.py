@@ -0,0 +1,174 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import (
+                            RequestFactory,
+                            TestCase,
+                            override_settings,
+                        )
+from django.utils.six import StringIO
+
+from movie import quotas
+from movie.models import (
+                            APIKey,
+                            Movie,
+                            SiteUser,
+                         )
+
+MP4 = b'\x00\x00\x00 ftypisom\x00\x00\x02\x00'
+
+
+@override_settings(STORAGE_QUOTA={'QUOTA': 10000, 'WORKERS': 2, 'BATCH_SIZE': 1, })
+class StorageQuotaTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username='a@example.com', email='a@example.com', password='password')
+        self.siteuser = SiteUser.objects.create(user=self.user, bio='bio')
+
+    def upload(self, content=MP4):
+        movie = Movie(uploader=self.siteuser, movie_name='movie', description='description')
+        movie.uploaded_file.save('movie.mp4', ContentFile(content), save=False)
+        movie.save()
+        return movie
+
+    def usage(self):
+        siteuser = SiteUser.objects.get(pk=self.siteuser.pk)
+        return siteuser.movie_count, siteuser.storage_bytes
+
+    def test_usage_is_counted(self):
+        movie = self.upload()
+        self.assertEqual(movie.file_size, len(MP4))
+        self.assertEqual(self.usage(), (1, len(MP4)))
+
+        movie.movie_name = 'renamed'
+        movie.save()
+        self.assertEqual(self.usage(), (1, len(MP4)))
+
+        movie.uploaded_file.save('longer.mp4', ContentFile(MP4 * 2))
+        self.assertEqual(self.usage(), (1, 2 * len(MP4)))
+
+        movie.soft_delete()
+        self.assertEqual(self.usage(), (1, 2 * len(MP4)))
+
+        movie.delete()
+        self.assertEqual(self.usage(), (0, 0))
+
+    def test_upload_view(self):
+        self.client.login(username='a@example.com', password='password')
+        data = {
+            'movie_name': 'movie',
+            'description': 'description',
+            'uploaded_file': SimpleUploadedFile('movie.mp4', MP4),
+        }
+        resp = self.client.post('/movie/create', data)
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(self.usage(), (1, len(MP4)))
+        self.assertContains(self.client.get('/movie/user/edit'), '1 movies')
+
+        SiteUser.objects.filter(pk=self.siteuser.pk).update(storage_quota=len(MP4) + 100)
+        data['uploaded_file'] = SimpleUploadedFile('movie.mp4', MP4)
+        resp = self.client.post('/movie/create', data)
+        self.assertEqual(resp.status_code, 413)
+        self.assertEqual(Movie.objects.count(), 1)
+
+    def test_edits_succeed_at_quota(self):
+        movie = self.upload()
+        SiteUser.objects.filter(pk=self.siteuser.pk).update(storage_quota=len(MP4))
+        self.client.login(username='a@example.com', password='password')
+
+        # The test client always posts multipart forms.
+        resp = self.client.post('/movie/{pk}/edit'.format(pk=movie.pk), {'movie_name': 'renamed', 'description': 'description', })
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(Movie.objects.get(pk=movie.pk).movie_name, 'renamed')
+
+    def test_forms_without_files_do_not_read_the_quota(self):
+        movie = self.upload()
+        self.client.login(username='a@example.com', password='password')
+
+        with mock.patch('movie.quotas.remaining_bytes') as remaining_bytes:
+            resp = self.client.post('/movie/{pk}/progress'.format(pk=movie.pk), {'position': 10, 'duration': 100, })
+        self.assertEqual(resp.status_code, 204)
+        self.assertFalse(remaining_bytes.called)
+
+    def test_api_upload_with_session_is_checked_before_the_body(self):
+        self.user.is_staff = True
+        self.user.save()
+        SiteUser.objects.filter(pk=self.siteuser.pk).update(storage_quota=100)
+        self.client.login(username='a@example.com', password='password')
+
+        with mock.patch.object(quotas.QuotaUploadHandler, 'receive_data_chunk', side_effect=AssertionError):
+            resp = self.client.post(
+                       '/api/v1/movie/',
+                       {
+                           'uploader': self.siteuser.pk,
+                           'movie_name': 'movie',
+                           'description': 'description',
+                           'uploaded_file': SimpleUploadedFile('movie.mp4', MP4),
+                       }
+                   )
+        self.assertEqual(resp.status_code, 413)
+        self.assertFalse(Movie.objects.exists())
+
+    def test_handler_counts_received_bytes(self):
+        SiteUser.objects.filter(pk=self.siteuser.pk).update(storage_quota=10)
+        request = RequestFactory().post('/movie/create')
+        request.user = self.user
+        quotas.mark_upload(request)
+        handler = quotas.QuotaUploadHandler(request)
+
+        # Chunked uploads have no Content-Length.
+        handler.handle_raw_input(None, {}, 0, b'boundary')
+        self.assertEqual(handler.receive_data_chunk(b'x' * 8, 0), b'x' * 8)
+        with self.assertRaises(quotas.QuotaExceeded):
+            handler.receive_data_chunk(b'x' * 8, 8)
+
+        with self.assertRaises(quotas.QuotaExceeded):
+            handler.handle_raw_input(None, {}, 11, b'boundary')
+
+        # Other requests only count their file bytes.
+        handler = quotas.QuotaUploadHandler(RequestFactory().post('/movie/1/edit'))
+        handler.request.user = self.user
+        handler.handle_raw_input(None, {}, 11, b'boundary')
+        with self.assertRaises(quotas.QuotaExceeded):
+            handler.receive_data_chunk(b'x' * 11, 0)
+
+    def test_api_upload_with_api_key(self):
+        self.user.is_staff = True
+        self.user.save()
+        api_key, raw_key = APIKey.objects.create_key(self.user, 'ingest', ['movie:write', ])
+        SiteUser.objects.filter(pk=self.siteuser.pk).update(storage_quota=100)
+        resp = self.client.post(
+                   '/api/v1/movie/',
+                   {
+                       'uploader': self.siteuser.pk,
+                       'movie_name': 'movie',
+                       'description': 'description',
+                       'uploaded_file': SimpleUploadedFile('movie.mp4', MP4),
+                   },
+                   HTTP_AUTHORIZATION='Api-Key ' + raw_key
+               )
+        self.assertEqual(resp.status_code, 413)
+        self.assertFalse(Movie.objects.exists())
+
+    def test_reconcile(self):
+        movies = [self.upload(), self.upload(MP4 * 3)]
+        movies[1].soft_delete()
+        movies[0].uploaded_file.storage.delete(movies[0].uploaded_file.name)
+        SiteUser.objects.filter(pk=self.siteuser.pk).update(storage_bytes=1, movie_count=7)
+        Movie.all_objects.filter(pk=movies[1].pk).update(file_size=5)
+
+        out = StringIO()
+        call_command('reconcile_storage', '--workers', '2', stdout=out)
+        self.assertIn('Checked 2 movies, fixed 2 file sizes, 1 files are missing.', out.getvalue())
+        self.assertEqual(self.usage(), (2, 3 * len(MP4)))
+        self.assertEqual(quotas.remaining_bytes(self.user), 10000 - 3 * len(MP4))
@@ -0,0 +1,162 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from movie import (
+                    rankings,
+                    slow_queries,
+                    view_counts,
+                  )
+from movie.models import (
+                            Comment,
+                            Movie,
+                            MovieDailyViews,
+                            MovieRanking,
+                            SiteUser,
+                         )
+
+
+class ScoreTest(TestCase):
+
+    def test_equal_events_add_one(self):
+        now = timezone.now()
+        score = rankings.event_score(now, 1)
+        self.assertAlmostEqual(rankings.add_scores(score, score), score + 1)
+
+    def test_score_halves_every_half_life(self):
+        now = timezone.now()
+        with self.settings(RANKING={'HALF_LIFE': 3600, }):
+            self.assertAlmostEqual(
+                rankings.event_score(now, 1) - rankings.event_score(now - timedelta(hours=1), 1),
+                1
+            )
+
+
+@override_settings(
+    RANKING={'HALF_LIFE': 86400, 'UPLOAD_WEIGHT': 10, 'COMMENT_WEIGHT': 5, 'VIEW_WEIGHT': 1, },
+    VIEW_COUNTS={'ENABLED': True, 'MAX_PENDING': 1000, 'FLUSH_INTERVAL': 3600, 'DEDUPE_WINDOW': 0, }
+)
+class RankingUpdateTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin@example.com', email='admin@example.com', is_staff=True)
+        cls.siteuser = SiteUser.objects.create(user=cls.admin, bio='bio')
+        now = timezone.now()
+        cls.old, cls.new, cls.newest = [
+            Movie.objects.create(
+                uploader=cls.siteuser,
+                movie_name=name,
+                description='description',
+                uploaded_file='files/{name}.mp4'.format(name=name),
+                post_date=now - timedelta(days=days)
+            )
+            for name, days in (('old', 30), ('new', 2), ('newest', 1))
+        ]
+
+    def setUp(self):
+        view_counts.get_buffer().drain()
+        self.addCleanup(view_counts.get_buffer().drain)
+
+    def ranked(self, sort):
+        return list(rankings.order_by_ranking(Movie.objects.all(), sort).values_list('movie_name', flat=True))
+
+    def comment(self, movie, count=1):
+        for num in range(count):
+            Comment.objects.create(movie=movie, commenter=self.siteuser, description='comment')
+
+    def test_new_movies_are_ranked_by_recency(self):
+        self.assertEqual(rankings.update(), 3)
+        self.assertEqual(self.ranked('trending'), ['newest', 'new', 'old'])
+
+    def test_update_is_incremental(self):
+        rankings.update()
+        old_score = MovieRanking.objects.get(movie=self.old).trending_score
+        self.comment(self.new, 2)
+        self.comment(self.old)
+
+        self.assertEqual(rankings.update(), 2)
+        self.assertEqual(self.ranked('trending')[0], 'new')
+        self.assertGreater(MovieRanking.objects.get(movie=self.old).trending_score, old_score + 20)
+        self.assertEqual(self.ranked('comments'), ['new', 'old', 'newest'])
+        self.assertEqual(rankings.update(), 0)
+        self.assertEqual(MovieRanking.objects.get(movie=self.new).comment_count, 2)
+
+    def test_events_of_unranked_movies_are_counted(self):
+        rankings.update()
+        MovieRanking.objects.filter(movie=self.old).delete()
+        self.comment(self.old, 2)
+        view_counts.get_buffer().add(self.old.pk)
+        view_counts.flush()
+
+        self.assertEqual(rankings.update(), 1)
+        ranking = MovieRanking.objects.get(movie=self.old)
+        self.assertEqual((ranking.comment_count, ranking.weekly_views), (2, 1))
+        self.assertEqual(self.ranked('comments')[0], 'old')
+        self.assertEqual(rankings.update(), 0)
+
+    def test_views_of_the_week(self):
+        rankings.update()
+        for num in range(3):
+            view_counts.get_buffer().add(self.old.pk)
+        view_counts.get_buffer().add(self.new.pk)
+        view_counts.flush()
+        MovieDailyViews.objects.create(
+            movie=self.newest,
+            day=timezone.localdate() - timedelta(days=10),
+            views=100,
+            ranked_views=100
+        )
+
+        rankings.update()
+        self.assertEqual(self.ranked('weekly'), ['old', 'new', 'newest'])
+        self.assertEqual(MovieRanking.objects.get(movie=self.old).weekly_views, 3)
+        self.assertFalse(MovieDailyViews.objects.filter(movie=self.newest).exists())
+
+    def test_rebuild(self):
+        rankings.update()
+        self.comment(self.old, 3)
+        self.comment(self.new)
+        Comment.objects.filter(movie=self.new).delete()
+
+        out = StringIO()
+        call_command('update_rankings', '--rebuild', stdout=out)
+        self.assertIn('Updated 3 rankings.', out.getvalue())
+        self.assertEqual(MovieRanking.objects.get(movie=self.new).comment_count, 0)
+        self.assertEqual(MovieRanking.objects.get(movie=self.old).comment_count, 3)
+
+    def test_list_view_sort(self):
+        rankings.update()
+        resp = self.client.get('/movie/movies', {'sort': 'trending', })
+        self.assertEqual([movie.movie_name for movie in resp.context['movie_list']], ['newest', 'new', 'old'])
+
+    def test_api_sort(self):
+        rankings.update()
+        self.comment(self.old)
+        rankings.update()
+        self.client.force_login(self.admin)
+        resp = self.client.get('/api/v1/movie/', {'sort': 'comments', })
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()[0]['movie_name'], 'old')
+
+    def test_ranked_page_is_read_through_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plans are checked on SQLite.')
+
+        rankings.update()
+        for sort in rankings.SORTS:
+            with CaptureQueriesContext(connection) as context:
+                list(rankings.order_by_ranking(Movie.objects.all(), sort)[:10])
+            plan = slow_queries.explain(connection, context.captured_queries[0]['sql'], None)
+            self.assertFalse(slow_queries.is_full_scan(plan), plan)
+            self.assertFalse(slow_queries.uses_temp_sort(plan), plan)
+            self.assertTrue(any('ranking_' in line for line in plan), plan)
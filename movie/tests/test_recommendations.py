@@ -0,0 +1,114 @@
+import unittest
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.utils.six import StringIO
+
+from movie import recommendations
+from movie.models import (
+                            Comment,
+                            Movie,
+                            RelatedMovie,
+                            SiteUser,
+                         )
+
+
+RECOMMENDATIONS = {
+    'COUNT': 2,
+    'NAME_WEIGHT': 2,
+    'COMMENTER_WEIGHT': 0.3,
+    'MAX_DF': 0.5,
+    'MIN_SCORE': 0.05,
+    'BLOCK_SIZE': 2,
+}
+
+
+@unittest.skipIf(recommendations.numpy is None, 'numpy and scipy are not installed')
+@override_settings(RECOMMENDATIONS=RECOMMENDATIONS)
+class RecommendationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [
+            SiteUser.objects.create(
+                user=User.objects.create_user(username=name, email=name, password='password'),
+                bio='bio'
+            )
+            for name in ('a@example.com', 'b@example.com')
+        ]
+        cls.users = users
+        cls.movies = {
+            name: Movie.objects.create(
+                      uploader=users[0],
+                      movie_name=name,
+                      description=description,
+                      uploaded_file='files/movie.mp4'
+                  )
+            for name, description in (
+                ('Cat video', 'Kitten chasing a wool ball.'),
+                ('Another cat video', 'Sleepy cat, ball nearby.'),
+                ('Cooking pasta', 'Cook pasta using tomato sauce.'),
+                ('Cooking rice', 'Cook rice quickly.'),
+                ('Holiday', 'Seaside trip.'),
+            )
+        }
+
+    def related(self, name):
+        return list(
+                   RelatedMovie.objects.filter(movie=self.movies[name])
+                                       .order_by('rank')
+                                       .values_list('related__movie_name', flat=True)
+               )
+
+    def test_movies_with_common_words_are_related(self):
+        self.assertEqual(recommendations.update(), (5, 4))
+        self.assertEqual(self.related('Cat video'), ['Another cat video'])
+        self.assertEqual(self.related('Cooking rice'), ['Cooking pasta'])
+        self.assertEqual(self.related('Holiday'), [])
+
+    def test_common_commenters_relate_movies(self):
+        for name in ('Holiday', 'Cooking rice'):
+            Comment.objects.create(movie=self.movies[name], commenter=self.users[1], description='Nice')
+
+        recommendations.update()
+        self.assertEqual(self.related('Holiday'), ['Cooking rice'])
+        self.assertEqual(self.related('Cooking rice'), ['Cooking pasta', 'Holiday'])
+
+    def test_orphaned_comments_are_ignored(self):
+        Comment.objects.create(movie=self.movies['Holiday'], commenter=None, description='Nice')
+        Comment.objects.create(movie=self.movies['Cooking rice'], commenter=None, description='Nice')
+
+        self.assertEqual(recommendations.update(), (5, 4))
+        self.assertEqual(self.related('Holiday'), [])
+
+    def test_update_replaces_related_movies(self):
+        recommendations.update()
+        self.movies['Cooking rice'].delete()
+        self.movies['Cooking pasta'].description = 'Kitten with a wool ball.'
+        self.movies['Cooking pasta'].save()
+
+        out = StringIO()
+        call_command('update_related_movies', stdout=out)
+        self.assertIn('of 4 movies', out.getvalue())
+        self.assertEqual(self.related('Cooking pasta'), ['Cat video'])
+
+    def test_detail_page_reads_related_movies_in_one_query(self):
+        recommendations.update()
+        resp = self.client.get(self.movies['Cat video'].get_absolute_url())
+        self.assertContains(resp, 'Related movies')
+
+        with self.assertNumQueries(1):
+            related = list(resp.context['related_movies'].all())
+        self.assertEqual(related, [self.movies['Another cat video']])
+
+    def test_block_products_match_whole_product(self):
+        movie_ids, vectors = recommendations.movie_vectors()
+        whole = (vectors @ vectors.T).toarray()
+
+        for start in range(0, len(movie_ids), 2):
+            block = (vectors[start:start + 2] @ vectors.T.tocsr()).toarray()
+            self.assertTrue(recommendations.numpy.allclose(block, whole[start:start + 2]))
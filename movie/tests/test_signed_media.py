@@ -0,0 +1,124 @@
+import base64
+import hashlib
+import hmac
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.conf.urls import url
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+
+from movie import (
+                    signed_media,
+                    views,
+                  )
+from movie.models import (
+                            Movie,
+                            SiteUser,
+                         )
+
+NOW = 1500000001
+
+# The DEBUG media route of movie_hosting/urls.py.
+urlpatterns = [
+    url(r'^media/(?P<path>.*)$', views.serve_media),
+]
+
+
+def signed_media_settings(**options):
+    settings = {
+        'ENABLED': True,
+        'KEYS': {'old': 'old secret', 'new': 'new secret', },
+        'CURRENT_KEY': 'new',
+        'MAX_AGE': 3600,
+        'GRANULARITY': 600,
+        'BIND_TO_USER': False,
+        'COOKIE_NAME': 'media_user',
+    }
+    settings.update(options)
+    return settings
+
+
+@override_settings(SIGNED_MEDIA=signed_media_settings())
+class SignedMediaTest(TestCase):
+
+    def verify(self, url, name='files/movie.mp4', cookie=None, now=NOW):
+        return signed_media.verify(name, urlsplit(url).query, cookie, now=now)
+
+    def test_signed_url_is_verified(self):
+        url = signed_media.sign_url('files/movie.mp4', now=NOW)
+        self.assertTrue(url.startswith('/media/files/movie.mp4?'))
+        self.assertEqual(url, signed_media.sign_url('files/movie.mp4', now=NOW + 60))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(self.verify(url))
+        self.assertFalse(self.verify(url, name='files/other.mp4'))
+        self.assertFalse(self.verify(url.replace('expires=', 'expires=9')))
+        self.assertFalse(self.verify(url, now=NOW + 3600 + 600))
+        self.assertFalse(self.verify('/media/files/movie.mp4'))
+
+    def test_keys_are_rotated(self):
+        with self.settings(SIGNED_MEDIA=signed_media_settings(CURRENT_KEY='old')):
+            url = signed_media.sign_url('files/movie.mp4', now=NOW)
+        self.assertIn('key=old', url)
+        self.assertTrue(self.verify(url))
+
+        with self.settings(SIGNED_MEDIA=signed_media_settings(KEYS={'new': 'new secret', })):
+            self.assertFalse(self.verify(url))
+
+    def test_default_key_is_derived_from_secret_key(self):
+        with self.settings(SIGNED_MEDIA=signed_media_settings(KEYS={}, CURRENT_KEY=None)):
+            keys, key_id = signed_media.get_keys()
+            url = signed_media.sign_url('files/movie.mp4', now=NOW)
+            self.assertTrue(self.verify(url))
+        self.assertEqual(keys[key_id], settings.SECRET_KEY)
+        unsalted = hmac.new(settings.SECRET_KEY.encode(), b'user\n1', hashlib.sha1).digest()
+        self.assertNotEqual(signed_media.signature(keys[key_id], 'user', 1), base64.urlsafe_b64encode(unsalted).rstrip(b'=').decode())
+
+    def test_url_bound_to_user_needs_their_cookie(self):
+        url = signed_media.sign_url('files/movie.mp4', user_id=1, now=NOW)
+        cookie = 'media_user=' + signed_media.cookie_value(1)
+
+        self.assertTrue(self.verify(url, cookie=cookie))
+        self.assertFalse(self.verify(url))
+        self.assertFalse(self.verify(url, cookie='media_user=' + signed_media.cookie_value(2)))
+        self.assertFalse(self.verify(url, cookie='media_user=1:new:forged'))
+
+    def test_movie_page_binds_its_media_url(self):
+        user = User.objects.create_user(username='a@example.com', email='a@example.com', password='password')
+        movie = Movie(uploader=SiteUser.objects.create(user=user, bio='bio'), movie_name='movie', description='description')
+        movie.uploaded_file.save('movie.mp4', ContentFile(b'movie'), save=False)
+        movie.save()
+        self.addCleanup(movie.uploaded_file.storage.delete, movie.uploaded_file.name)
+
+        resp = self.client.get(movie.get_absolute_url())
+        self.assertContains(resp, signed_media.sign_url(movie.uploaded_file.name).replace('&', '&amp;'))
+        self.assertNotIn('media_user', resp.cookies)
+
+        self.client.login(username='a@example.com', password='password')
+        with self.settings(SIGNED_MEDIA=signed_media_settings(BIND_TO_USER=True)):
+            resp = self.client.get(movie.get_absolute_url())
+        self.assertEqual(resp.cookies['media_user'].value, signed_media.cookie_value(user.pk))
+        self.assertContains(resp, signed_media.sign_url(movie.uploaded_file.name, user.pk).replace('&', '&amp;'))
+
+    @override_settings(ROOT_URLCONF='movie.tests.test_signed_media')
+    def test_django_checks_media_signatures(self):
+        name = default_storage.save('files/movie.mp4', ContentFile(b'movie'))
+        self.addCleanup(default_storage.delete, name)
+        url = signed_media.sign_url(name)
+
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b''.join(resp.streaming_content), b'movie')
+        self.assertEqual(self.client.get(url.split('?')[0]).status_code, 403)
+        self.assertEqual(self.client.get(url.replace('expires=', 'expires=9')).status_code, 403)
+
+        with self.settings(SIGNED_MEDIA=signed_media_settings(ENABLED=False)):
+            self.assertEqual(self.client.get('/media/' + name).status_code, 200)
+            self.assertEqual(self.client.get('/media/files/missing.mp4').status_code, 404)
+            self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
@@ -0,0 +1,117 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.utils.six import StringIO
+
+from movie import slow_queries
+from movie.forms import SiteUserCreateForm
+from movie.models import SiteUser
+
+
+class NormalizeTest(TestCase):
+
+    def test_literals_and_placeholder_lists_are_normalized(self):
+        self.assertEqual(
+            slow_queries.normalize("SELECT * FROM t WHERE a = 'x'  AND b IN (%s, %s, %s) LIMIT 21"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?'
+        )
+
+    def test_same_query_shape_has_same_fingerprint(self):
+        self.assertEqual(
+            slow_queries.fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+            slow_queries.fingerprint('SELECT * FROM t WHERE id IN (%s)')
+        )
+
+    def test_full_scan_detection(self):
+        self.assertTrue(slow_queries.is_full_scan(['SCAN movie_movie', ]))
+        self.assertTrue(slow_queries.is_full_scan(['SCAN TABLE auth_user', ]))
+        self.assertTrue(slow_queries.is_full_scan(['Seq Scan on auth_user  (cost=0.00..1.01 rows=1 width=4)', ]))
+        self.assertFalse(slow_queries.is_full_scan(['SEARCH auth_user USING INDEX auth_user_email (email=?)', ]))
+        self.assertFalse(slow_queries.is_full_scan(['SCAN movie_movie USING INDEX movie_post_date', ]))
+
+
+class SlowQueryLogTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'slow.jsonl')
+        self.settings_override = override_settings(
+                                     SLOW_QUERY_LOG={'ENABLED': True, 'THRESHOLD': 0, 'PATH': self.path, }
+                                 )
+
+    def records(self):
+        return list(slow_queries.read_log(self.path))
+
+    def test_queries_of_view_are_logged_with_plan(self):
+        with self.settings_override, self.assertLogs('movie.slow_query', 'WARNING'):
+            self.client.get('/movie/movies?q=title')
+        movie_queries = [record for record in self.records() if 'movie_movie' in record['sql']]
+        self.assertTrue(movie_queries)
+        self.assertEqual(movie_queries[0]['view'], 'movie-list')
+        self.assertTrue(movie_queries[0]['plan'])
+
+    def test_full_scan_is_flagged(self):
+        with self.settings_override, self.assertLogs('movie.slow_query', 'WARNING'):
+            list(SiteUser.objects.filter(bio__icontains='title'))
+        self.assertTrue(self.records()[0]['full_scan'])
+
+    def test_originating_code_line_is_logged(self):
+        form = SiteUserCreateForm({
+                   'first_name': 'Super',
+                   'last_name': 'John',
+                   'email': 'test@example.com',
+                   'password': 'password',
+                   'confirm_password': 'password',
+               })
+        with self.settings_override, self.assertLogs('movie.slow_query', 'WARNING'):
+            form.is_valid()
+        record = self.records()[0]
+        self.assertIn('auth_user', record['sql'])
+        self.assertRegex(record['location'], r'^movie/forms.py:\d+ in clean_email$')
+        # The email looked up is not logged.
+        self.assertNotIn('test@example.com', json.dumps(record))
+
+    def test_disabled_log_does_not_record(self):
+        with override_settings(SLOW_QUERY_LOG={'ENABLED': False, 'THRESHOLD': 0, 'PATH': self.path, }):
+            self.client.get('/movie/movies')
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_log_is_rotated(self):
+        for num in range(5):
+            slow_queries.append(self.path, '{num:9}\n'.format(num=num), 20, 2)
+
+        self.assertEqual(self.records(), [4])
+        self.assertEqual(list(slow_queries.read_log(self.path + '.1')), [2, 3])
+        self.assertEqual(list(slow_queries.read_log(self.path + '.2')), [0, 1])
+        self.assertFalse(os.path.exists(self.path + '.3'))
+
+    def test_report_groups_by_fingerprint(self):
+        with self.settings_override, self.assertLogs('movie.slow_query', 'WARNING'):
+            self.client.get('/movie/movies?q=a')
+            self.client.get('/movie/movies?q=b')
+        groups = slow_queries.group_by_fingerprint(self.records())
+        self.assertEqual(len(groups), len({record['fingerprint'] for record in self.records()}))
+        self.assertEqual(groups[0]['count'], 2)
+
+        out = StringIO()
+        call_command('slow_query_report', '--path=' + self.path, stdout=out)
+        self.assertIn('view: movie-list (2)', out.getvalue())
+
+    def test_report_lists_full_scans(self):
+        with self.settings_override, self.assertLogs('movie.slow_query', 'WARNING'):
+            list(SiteUser.objects.filter(bio__icontains='a'))
+            self.client.get('/movie/movies')
+
+        out = StringIO()
+        call_command('slow_query_report', '--path=' + self.path, '--full-scans', stdout=out)
+        self.assertIn('FULL SCAN', out.getvalue())
+        self.assertIn('movie_siteuser', out.getvalue())
+        self.assertNotIn('movie_movie', out.getvalue())
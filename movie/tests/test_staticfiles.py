@@ -0,0 +1,82 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+
+from movie import staticfiles
+
+
+class StaticPipelineTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(StaticPipelineTest, cls).setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(STATIC_ROOT=cls.static_root)
+        cls.settings_override.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.hashed_name = staticfiles_storage.stored_name('css/styles.css')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.static_root)
+        super(StaticPipelineTest, cls).tearDownClass()
+
+    def get(self, name, **extra):
+        resp = self.client.get('/static/' + name, **extra)
+        if resp.streaming:
+            resp.body = b''.join(resp.streaming_content)
+        return resp
+
+    def test_names_are_hashed_and_compressed(self):
+        self.assertRegex(self.hashed_name, r'^css/styles\.[0-9a-f]{12}\.css$')
+        path = os.path.join(self.static_root, self.hashed_name)
+        with open(path, 'rb') as fp, gzip.open(path + '.gz') as compressed:
+            self.assertEqual(compressed.read(), fp.read())
+
+    def test_templates_use_hashed_names(self):
+        resp = self.client.get('/movie/movies')
+        self.assertContains(resp, '/static/' + self.hashed_name)
+
+    def test_precompressed_variant_is_served_as_immutable(self):
+        resp = self.get(self.hashed_name, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertEqual(resp['Content-Type'], 'text/css')
+        self.assertEqual(resp['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', resp['Cache-Control'])
+        self.assertIn(b'.sidebar-nav', gzip.decompress(resp.body))
+
+    def test_identity_is_served_without_accept_encoding(self):
+        resp = self.get(self.hashed_name)
+        self.assertFalse(resp.has_header('Content-Encoding'))
+        self.assertIn(b'.sidebar-nav', resp.body)
+
+    def test_refused_encoding_is_not_used(self):
+        resp = self.get(self.hashed_name, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(resp.has_header('Content-Encoding'))
+
+    @unittest.skipIf(staticfiles.brotli is None, 'brotli is not installed')
+    def test_brotli_is_preferred(self):
+        resp = self.get(self.hashed_name, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(resp['Content-Encoding'], 'br')
+
+    def test_unhashed_name_is_revalidated(self):
+        resp = self.get('css/styles.css')
+        self.assertNotIn('immutable', resp['Cache-Control'])
+
+        resp = self.get('css/styles.css', HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+    def test_paths_outside_static_root_are_not_served(self):
+        resp = self.client.get('/static/../manage.py')
+        self.assertEqual(resp.status_code, 404)
@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.utils.six import StringIO
+
+from movie.models import (
+                            Movie,
+                            SiteUser,
+                         )
+from movie.storage import (
+                            HashRing,
+                            hashed_upload_to,
+                         )
+
+NAMES = ['files/{num}.mp4'.format(num=num) for num in range(1000)]
+
+
+class HashRingTest(TestCase):
+
+    def test_names_are_spread(self):
+        ring = HashRing(['a', 'b', 'c', 'd'])
+        owners = [ring.preference(name)[0] for name in NAMES]
+
+        for node in ring.nodes:
+            self.assertGreater(owners.count(node), 150)
+        self.assertEqual(sorted(ring.preference(NAMES[0])), ['a', 'b', 'c', 'd'])
+
+    def test_added_node_takes_names_from_the_others_only(self):
+        before = HashRing(['a', 'b', 'c'])
+        after = HashRing(['a', 'b', 'c', 'd'])
+
+        for name in NAMES:
+            old, new = before.preference(name)[0], after.preference(name)[0]
+
+            if new != old:
+                self.assertEqual(new, 'd')
+                # The old location is where reads fall back to.
+                self.assertEqual(after.preference(name)[1], old)
+
+    def test_hashed_upload_to(self):
+        names = {hashed_upload_to(None, 'movie{num}.mp4'.format(num=num)) for num in range(20)}
+
+        for name in names:
+            self.assertRegex(name, r'^files/[0-9a-f]{2}/[0-9a-f]{2}/movie\d+\.mp4$')
+        self.assertGreater(len({os.path.dirname(name) for name in names}), 1)
+        # The directory of a name is always the same.
+        self.assertEqual(hashed_upload_to(None, 'movie.mp4'), hashed_upload_to(None, 'movie.mp4'))
+
+
+class ShardedStorageTest(TestCase):
+
+    def setUp(self):
+        self.roots = [tempfile.mkdtemp() for num in range(3)]
+
+        for root in self.roots:
+            self.addCleanup(shutil.rmtree, root)
+        self.shards(self.roots[:2])
+
+        user = User.objects.create_user(username='a@example.com', email='a@example.com', password='password')
+        self.siteuser = SiteUser.objects.create(user=user, bio='bio')
+        self.movies = []
+
+        for num in range(20):
+            movie = Movie(uploader=self.siteuser, movie_name='movie', description='description')
+            movie.uploaded_file.save('movie{num}.mp4'.format(num=num), ContentFile(b'movie'), save=False)
+            movie.save()
+            self.movies.append(movie)
+        self.storage = Movie._meta.get_field('uploaded_file').storage
+
+    def shards(self, roots):
+        settings = override_settings(MEDIA_SHARDS={'ROOTS': roots, 'VNODES': 64, 'WORKERS': 4, 'BATCH_SIZE': 3, })
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def root_of(self, movie):
+        for root in self.roots:
+            if os.path.exists(os.path.join(root, movie.uploaded_file.name)):
+                return root
+        return None
+
+    def test_files_are_spread_over_roots(self):
+        roots = [self.root_of(movie) for movie in self.movies]
+        self.assertEqual(set(roots), set(self.roots[:2]))
+
+        for movie in self.movies:
+            self.assertRegex(movie.uploaded_file.name, r'^files/[0-9a-f]{2}/[0-9a-f]{2}/')
+
+    def test_added_root_is_rebalanced_and_read_meanwhile(self):
+        self.shards(self.roots)
+        moving = [movie for movie in self.movies if self.storage.ring.preference(movie.uploaded_file.name)[0] == self.roots[2]]
+        self.assertTrue(moving)
+
+        for movie in self.movies:
+            self.assertTrue(self.storage.exists(movie.uploaded_file.name))
+            self.assertEqual(self.storage.open(movie.uploaded_file.name).read(), b'movie')
+
+        out = StringIO()
+        call_command('rebalance_media', stdout=out)
+        self.assertIn('Checked 20 movies, moved {count} files.'.format(count=len(moving)), out.getvalue())
+
+        for movie in self.movies:
+            self.assertEqual(self.root_of(movie), self.storage.ring.preference(movie.uploaded_file.name)[0])
+        self.assertEqual(len(os.listdir(self.roots[2])), 1)
+
+        call_command('rebalance_media', stdout=out)
+        self.assertIn('Checked 20 movies, moved 0 files.', out.getvalue())
+
+    def test_delete_removes_every_copy(self):
+        self.shards(self.roots)
+        movie = next(
+                    movie for movie in self.movies
+                    if self.storage.ring.preference(movie.uploaded_file.name)[0] == self.roots[2]
+                )
+        old_path = self.storage.path(movie.uploaded_file.name)
+        shutil.copytree(os.path.dirname(os.path.dirname(os.path.dirname(old_path))), os.path.join(self.roots[2], 'files'))
+
+        movie.delete()
+        self.assertIsNone(self.root_of(movie))
+
+    def test_delete_prunes_empty_directories(self):
+        movie = self.movies[0]
+        root = self.root_of(movie)
+        directory = os.path.dirname(os.path.join(root, movie.uploaded_file.name))
+
+        movie.delete()
+        self.assertFalse(os.path.exists(directory))
+        self.assertFalse(os.path.exists(os.path.dirname(directory)) and not os.listdir(os.path.dirname(directory)))
+        self.assertTrue(os.path.isdir(os.path.join(root, 'files')))
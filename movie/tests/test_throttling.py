@@ -0,0 +1,158 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+
+from movie.models import (
+                             APIKey,
+                             SiteUser,
+                         )
+from movie.throttling import (
+                                CacheStore,
+                                LocalMemoryStore,
+                                parse_rate,
+                             )
+
+
+def throttle_settings(**rates):
+    return {
+        'STORE': 'movie.throttling.LocalMemoryStore',
+        'RATES': rates,
+    }
+
+
+class ParseRateTest(TestCase):
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('30/min'), (30, 0.5))
+        self.assertEqual(parse_rate('10/s'), (10, 10))
+
+
+class LocalMemoryStoreTest(TestCase):
+
+    def setUp(self):
+        self.store = LocalMemoryStore()
+
+    def test_bucket_allows_burst_up_to_capacity(self):
+        results = [self.store.consume('key', 1, 3, 1, now=100)[0] for num in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+
+    def test_bucket_refills_over_time(self):
+        for num in range(3):
+            self.store.consume('key', 1, 3, 1, now=100)
+        allowed, wait = self.store.consume('key', 1, 3, 1, now=100)
+        self.assertFalse(allowed)
+        self.assertEqual(wait, 1)
+        self.assertTrue(self.store.consume('key', 1, 3, 1, now=101)[0])
+
+    def test_request_larger_than_capacity_leaves_bucket_in_debt(self):
+        self.assertTrue(self.store.consume('key', 10, 5, 1, now=100)[0])
+        allowed, wait = self.store.consume('key', 1, 5, 1, now=100)
+        self.assertFalse(allowed)
+        self.assertEqual(wait, 6)
+
+    def test_buckets_are_bounded(self):
+        store = LocalMemoryStore(max_entries=2)
+        for key in ('a', 'b', 'c'):
+            store.consume(key, 1, 1, 1, now=100)
+        self.assertTrue(store.consume('a', 1, 1, 1, now=100)[0])
+
+
+class CacheStoreTest(TestCase):
+
+    def setUp(self):
+        self.store = CacheStore()
+        caches['default'].clear()
+
+    def test_window_allows_up_to_capacity(self):
+        results = [self.store.consume('key', 1, 3, 1, now=300)[0] for num in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+
+    def test_previous_window_is_weighted_by_overlap(self):
+        for num in range(3):
+            self.store.consume('key', 1, 3, 1, now=300)
+        self.assertFalse(self.store.consume('key', 1, 3, 1, now=303)[0])
+        self.assertTrue(self.store.consume('key', 1, 3, 1, now=304)[0])
+
+    def test_window_expiring_before_the_refund_is_put_back(self):
+        for num in range(3):
+            self.store.consume('key', 1, 3, 1, now=300)
+
+        def expire(key, delta):
+            self.store.cache.delete(key)
+            raise ValueError(key)
+
+        with mock.patch.object(self.store.cache, 'decr', side_effect=expire):
+            self.assertFalse(self.store.consume('key', 1, 3, 1, now=300)[0])
+        self.assertEqual(self.store.cache.get('key:100'), 3)
+
+
+class ThrottleDecoratorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.mail_address = 'test@example.com'
+        cls.password = '12345'
+        test_user = User.objects.create_user(
+                        username=cls.mail_address,
+                        password=cls.password,
+                        email=cls.mail_address,
+                        first_name='Super',
+                        last_name='John',
+                    )
+        SiteUser.objects.create(user=test_user, bio='user bio')
+
+    @override_settings(THROTTLE=throttle_settings(**{'movie-list': '2/min'}))
+    def test_movie_list_is_throttled(self):
+        for num in range(2):
+            self.assertEqual(self.client.get('/movie/movies?q=a').status_code, 200)
+        resp = self.client.get('/movie/movies?q=a')
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp['Retry-After'], '30')
+
+    @override_settings(THROTTLE=throttle_settings(**{'movie-list': '1/min'}))
+    def test_buckets_are_separated_by_client_address(self):
+        self.client.get('/movie/movies', REMOTE_ADDR='10.0.0.1')
+        resp = self.client.get('/movie/movies', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(resp.status_code, 200)
+
+    @override_settings(THROTTLE=throttle_settings(**{'upload-bytes': '100/hour'}))
+    def test_upload_is_throttled_by_bytes(self):
+        self.client.login(username=self.mail_address, password=self.password)
+        self.assertEqual(self.client.get('/movie/create').status_code, 200)
+        resp = self.client.post(
+                   '/movie/create',
+                   {'movie_name': 'name', 'description': 'desc', }
+               )
+        self.assertEqual(resp.status_code, 200)
+        resp = self.client.post(
+                   '/movie/create',
+                   {'movie_name': 'name', 'description': 'desc', }
+               )
+        self.assertEqual(resp.status_code, 429)
+
+
+class ApiThrottleTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        mail_address = 'admin@example.com'
+        admin_user = User.objects.create_user(
+                         username=mail_address,
+                         password='password',
+                         email=mail_address,
+                         is_staff=True
+                     )
+        cls.api_key, cls.raw_key = APIKey.objects.create_key(admin_user, 'ingest', ['movie:read', ])
+
+    @override_settings(THROTTLE=throttle_settings(api='1/min'))
+    def test_api_is_throttled_per_key(self):
+        auth_header = {'HTTP_AUTHORIZATION': 'Api-Key ' + self.raw_key, }
+        self.assertEqual(self.client.get('/api/v1/movie/', **auth_header).status_code, 200)
+        resp = self.client.get('/api/v1/movie/', **auth_header)
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp['Retry-After'], '60')
@@ -0,0 +1,176 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from movie import (
+                    jobs,
+                    slow_queries,
+                    timelines,
+                  )
+from movie.models import (
+                            BackgroundJob,
+                            Follow,
+                            Movie,
+                            SiteUser,
+                            TimelineEntry,
+                         )
+
+
+TIMELINES = {
+    'FAN_OUT_LIMIT': 3,
+    'BATCH_SIZE': 2,
+    'BACKFILL': 2,
+    'FEED_SIZE': 20,
+}
+
+
+@override_settings(TIMELINES=TIMELINES)
+class TimelineTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=name, email=name, password='password')
+            for name in ('a@example.com', 'b@example.com', 'c@example.com', 'd@example.com')
+        ]
+        cls.siteusers = [SiteUser.objects.create(user=user, bio='bio') for user in cls.users]
+        cls.uploader = cls.siteusers[0]
+
+    def upload(self, name, uploader=None, days=0):
+        return Movie.objects.create(
+                   uploader=uploader or self.uploader,
+                   movie_name=name,
+                   description='description',
+                   uploaded_file='files/movie.mp4',
+                   post_date=timezone.now() - timedelta(days=days)
+               )
+
+    def process_jobs(self):
+        while jobs.work():
+            pass
+
+    def feed(self, siteuser):
+        return [movie.movie_name for movie in timelines.feed(siteuser)]
+
+    def test_follower_count(self):
+        for follower in self.siteusers[1:]:
+            timelines.follow(follower, self.uploader)
+        self.assertFalse(timelines.follow(self.siteusers[1], self.uploader))
+        timelines.unfollow(self.siteusers[1], self.uploader)
+
+        self.uploader.refresh_from_db()
+        self.assertEqual(self.uploader.follower_count, 2)
+        self.assertFalse(timelines.unfollow(self.siteusers[1], self.uploader))
+
+    def test_uploads_are_fanned_out_in_batches_by_jobs(self):
+        followers = self.siteusers[1:3]
+        other_uploader = self.siteusers[3]
+        for follower in followers:
+            timelines.follow(follower, self.uploader)
+        timelines.follow(followers[0], other_uploader)
+
+        self.upload('old', days=2)
+        self.upload('other', uploader=other_uploader, days=1)
+        self.upload('new')
+        self.assertEqual(self.feed(followers[0]), [])
+
+        self.process_jobs()
+        self.assertEqual(self.feed(followers[0]), ['new', 'other', 'old'])
+        self.assertEqual(self.feed(followers[1]), ['new', 'old'])
+        self.assertEqual(self.feed(other_uploader), [])
+        # Two followers per job: a second job per movie finds no one left.
+        self.assertFalse(BackgroundJob.objects.exists())
+
+    def test_fan_out_can_be_retried(self):
+        timelines.follow(self.siteusers[1], self.uploader)
+        movie = self.upload('movie')
+        timelines.fan_out(movie.pk)
+        timelines.fan_out(movie.pk)
+        self.assertEqual(TimelineEntry.objects.filter(movie=movie).count(), 1)
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        for num in range(3):
+            self.upload('movie {num}'.format(num=num), days=3 - num)
+
+        timelines.follow(self.siteusers[1], self.uploader)
+        self.assertEqual(self.feed(self.siteusers[1]), ['movie 2', 'movie 1'])
+
+        timelines.unfollow(self.siteusers[1], self.uploader)
+        self.assertEqual(self.feed(self.siteusers[1]), [])
+
+    def test_uploads_of_popular_uploaders_are_merged_when_read(self):
+        for follower in self.siteusers[1:]:
+            timelines.follow(follower, self.uploader)
+        small = self.siteusers[3]
+        timelines.follow(self.siteusers[1], small)
+        self.upload('popular old', days=2)
+        self.upload('small', uploader=small, days=1)
+        self.upload('popular new')
+        self.process_jobs()
+
+        self.assertFalse(TimelineEntry.objects.filter(movie__uploader=self.uploader).exists())
+        self.assertEqual(self.feed(SiteUser.objects.get(pk=self.siteusers[1].pk)), ['popular new', 'small', 'popular old'])
+
+    def test_pulled_follows_are_counted(self):
+        def counts():
+            return list(SiteUser.objects.order_by('pk').values_list('pulled_follow_count', flat=True))
+
+        timelines.follow(self.siteusers[1], self.uploader)
+        timelines.follow(self.siteusers[2], self.uploader)
+        timelines.follow(self.siteusers[1], self.siteusers[3])
+        self.assertEqual(counts(), [0, 0, 0, 0])
+
+        # The uploader reaches FAN_OUT_LIMIT: all of its followers pull.
+        timelines.follow(self.siteusers[3], self.uploader)
+        self.assertEqual(counts(), [0, 1, 1, 1])
+        self.assertEqual(timelines.recount_pulled_follows(), 4)
+        self.assertEqual(counts(), [0, 1, 1, 1])
+
+        timelines.unfollow(self.siteusers[2], self.uploader)
+        self.assertEqual(counts(), [0, 0, 0, 0])
+
+        timelines.follow(self.siteusers[2], self.uploader)
+        call_command('recount_pulled_follows', stdout=StringIO())
+        self.assertEqual(counts(), [0, 1, 1, 1])
+
+    def test_feed_is_one_index_range(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plans are checked on SQLite.')
+
+        timelines.follow(self.siteusers[1], self.uploader)
+        follower = SiteUser.objects.get(pk=self.siteusers[1].pk)
+        with CaptureQueriesContext(connection) as context:
+            timelines.feed(follower)
+        # No followed uploader is pulled, so the range is the only query.
+        self.assertEqual(len(context.captured_queries), 1)
+        plan = slow_queries.explain(connection, context.captured_queries[0]['sql'], None)
+        self.assertFalse(slow_queries.uses_temp_sort(plan), plan)
+        self.assertTrue(any('timeline_owner_date_idx' in line for line in plan), plan)
+
+    def test_views(self):
+        self.upload('movie')
+        self.client.force_login(self.users[1])
+
+        resp = self.client.post('/movie/user/{pk}/follow'.format(pk=self.uploader.pk))
+        self.assertRedirects(resp, self.uploader.get_absolute_url())
+        self.assertTrue(Follow.objects.filter(follower=self.siteusers[1], uploader=self.uploader).exists())
+        self.assertContains(self.client.get(self.uploader.get_absolute_url()), 'Unfollow')
+        self.assertContains(self.client.get('/movie/'), 'movie</a>')
+
+        self.client.post('/movie/user/{pk}/unfollow'.format(pk=self.uploader.pk))
+        self.assertFalse(Follow.objects.exists())
+        self.assertContains(self.client.get('/movie/'), 'Follow uploaders')
+
+    def test_users_cannot_follow_themselves(self):
+        self.client.force_login(self.users[0])
+        self.client.post('/movie/user/{pk}/follow'.format(pk=self.uploader.pk))
+        self.assertFalse(Follow.objects.exists())
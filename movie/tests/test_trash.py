@@ -0,0 +1,123 @@
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from movie import (
+                    slow_queries,
+                    trash,
+                  )
+from movie.models import (
+                            Comment,
+                            Movie,
+                            SiteUser,
+                         )
+
+
+@override_settings(SOFT_DELETE={'RETENTION': 3600, 'CHUNK_SIZE': 1, 'PAUSE': 0, })
+class SoftDeleteTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.users = [
+            User.objects.create_user(username=name, email=name, password='password')
+            for name in ('a@example.com', 'b@example.com')
+        ]
+        self.siteuser, self.other = [SiteUser.objects.create(user=user, bio='bio') for user in self.users]
+        self.movie = Movie(uploader=self.siteuser, movie_name='movie', description='description')
+        self.movie.uploaded_file.save('movie.mp4', ContentFile(b'movie'), save=False)
+        self.movie.save()
+        self.comments = [
+            Comment.objects.create(movie=self.movie, commenter=self.other, description=description)
+            for description in ('first', 'second')
+        ]
+
+    def test_deleted_rows_are_hidden(self):
+        self.movie.soft_delete()
+        self.comments[0].soft_delete()
+
+        self.assertFalse(Movie.objects.exists())
+        self.assertEqual(Movie.all_objects.get().deleted_at, self.movie.deleted_at)
+        self.assertEqual(list(Movie.all_objects.get().comment_set.all()), [self.comments[1]])
+        self.assertEqual(self.client.get(self.movie.get_absolute_url()).status_code, 404)
+
+    def test_delete_and_restore_views(self):
+        self.client.login(username='a@example.com', password='password')
+        resp = self.client.post('/movie/{pk}/delete'.format(pk=self.movie.pk))
+        self.assertRedirects(resp, '/movie/user/edit')
+        self.assertFalse(Movie.objects.exists())
+        self.assertTrue(self.movie.uploaded_file.storage.exists(self.movie.uploaded_file.name))
+        self.assertContains(self.client.get('/movie/user/edit'), 'Restore')
+
+        self.client.login(username='b@example.com', password='password')
+        resp = self.client.post('/movie/{pk}/restore'.format(pk=self.movie.pk))
+        self.assertEqual(resp.status_code, 404)
+
+        self.client.login(username='a@example.com', password='password')
+        resp = self.client.post('/movie/{pk}/restore'.format(pk=self.movie.pk))
+        self.assertRedirects(resp, '/movie/user/edit')
+        self.assertEqual(list(Movie.objects.all()), [self.movie])
+
+    def test_api_destroy(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        resp = self.client.delete('/api/v1/comment/{pk}/'.format(pk=self.comments[0].pk))
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(list(Comment.objects.all()), [self.comments[1]])
+        self.assertEqual(Comment.all_objects.count(), 2)
+
+    def test_expired_rows_are_purged(self):
+        self.movie.soft_delete()
+        kept = Movie.objects.create(uploader=self.siteuser, movie_name='kept', description='description')
+        comment = Comment.objects.create(movie=kept, commenter=self.other, description='kept')
+        comment.soft_delete()
+        path = self.movie.uploaded_file.name
+
+        self.assertEqual(trash.purge(), {})
+        comment.deleted_at = timezone.now() - timedelta(hours=2)
+        comment.save()
+
+        purged = trash.purge(now=self.movie.deleted_at + timedelta(hours=2))
+        self.assertEqual(purged, {'comments': 3, 'movies': 1})
+        self.assertEqual(list(Movie.all_objects.all()), [kept])
+        self.assertFalse(Comment.all_objects.exists())
+        self.assertFalse(kept.uploaded_file.storage.exists(path))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('purge_deleted', stdout=out)
+        self.assertIn('Nothing to purge.', out.getvalue())
+
+        Movie.objects.update(deleted_at=timezone.now() - timedelta(hours=2))
+        call_command('purge_deleted', '--chunk-size', '10', stdout=out)
+        self.assertIn('Purged 1 movies.', out.getvalue())
+        self.assertIn('Purged 2 comments.', out.getvalue())
+
+    def test_deleted_rows_have_their_own_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plans are checked on SQLite.')
+
+        with CaptureQueriesContext(connection) as context:
+            list(Movie.all_objects.filter(deleted_at__lt=timezone.now()).values_list('pk', flat=True)[:10])
+            list(Movie.objects.all()[:10])
+        purge, visible = [
+            slow_queries.explain(connection, query['sql'], None)
+            for query in context.captured_queries
+        ]
+        self.assertTrue(any('movie_movie_deleted_idx' in line for line in purge), purge)
+        self.assertFalse(slow_queries.uses_temp_sort(visible), visible)
+        self.assertTrue(any('movie_post_date_name_idx' in line for line in visible), visible)
@@ -0,0 +1,148 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.utils.six import StringIO
+
+from movie import uploads
+from movie.asgi import ASGIHandler
+from movie.models import (
+                            Movie,
+                            SiteUser,
+                         )
+from movie.tests.test_asgi import call
+
+MP4 = b'\x00\x00\x00 ftypisom\x00\x00\x02\x00'
+
+
+def put(application, url, body, content_length=None):
+    parts = urlsplit(url)
+    environ = {
+        'REQUEST_METHOD': 'PUT',
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'CONTENT_LENGTH': str(len(body) if content_length is None else content_length),
+        'wsgi.input': io.BytesIO(body),
+    }
+    response = {}
+
+    def start_response(status, headers):
+        response['status'] = int(status.split(' ', 1)[0])
+
+    body = b''.join(application(environ, start_response))
+    return response['status'], body
+
+
+class DirectUploadTest(TestCase):
+
+    def setUp(self):
+        self.staging_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging_root)
+        settings = override_settings(
+                       DIRECT_UPLOAD={'URL_PREFIX': '/upload/', 'MAX_AGE': 60, 'CHUNK_SIZE': 4, 'STAGING_ROOT': self.staging_root, }
+                   )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create_user(username='a@example.com', email='a@example.com', password='password')
+        self.siteuser = SiteUser.objects.create(user=self.user, bio='bio')
+        self.client.login(username='a@example.com', password='password')
+        self.receiver = uploads.UploadReceiver(lambda environ, start_response: self.fail('Passed to Django.'))
+
+    def get_urls(self, size=len(MP4)):
+        resp = self.client.post('/movie/upload', {'size': size, })
+        self.assertEqual(resp.status_code, 200)
+        urls = json.loads(resp.content.decode())
+        return urls['upload_url'], urls['finalize_url']
+
+    def test_upload_and_finalize(self):
+        upload_url, finalize_url = self.get_urls()
+        self.assertEqual(put(self.receiver, upload_url, MP4), (201, b'Uploaded.'))
+        self.assertEqual(put(self.receiver, upload_url, MP4)[0], 409)
+
+        resp = self.client.post(finalize_url, {'movie_name': 'movie', 'description': 'description', })
+        self.assertEqual(resp.status_code, 201)
+        movie = Movie.objects.get()
+        self.addCleanup(movie.uploaded_file.storage.delete, movie.uploaded_file.name)
+        self.assertEqual(json.loads(resp.content.decode())['url'], movie.get_absolute_url())
+        self.assertEqual(movie.uploaded_file.read(), MP4)
+        self.assertEqual(SiteUser.objects.get(pk=self.siteuser.pk).storage_bytes, len(MP4))
+        name = urlsplit(upload_url).path[len('/upload/'):]
+        self.assertEqual(os.listdir(self.staging_root), [name + '.done'])
+
+        # The URL is used up.
+        self.assertEqual(put(self.receiver, upload_url, MP4), (409, b'Already uploaded.'))
+        resp = self.client.post(finalize_url, {'movie_name': 'movie', 'description': 'description', })
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(Movie.objects.count(), 1)
+
+    def test_receiver_checks_signature_and_size(self):
+        upload_url, finalize_url = self.get_urls()
+        self.assertEqual(put(self.receiver, upload_url.replace('size=16', 'size=17'), MP4)[0], 403)
+        self.assertEqual(put(self.receiver, upload_url, MP4 + b'x')[0], 413)
+        self.assertEqual(put(self.receiver, upload_url, MP4[:8], content_length=len(MP4))[0], 400)
+        self.assertEqual(os.listdir(self.staging_root), [])
+
+        with self.assertRaises(uploads.InvalidUpload):
+            uploads.verify(urlsplit(upload_url).path[len('/upload/'):], {}, now=time.time())
+
+        expired = uploads.upload_url(self.siteuser.pk, len(MP4), now=time.time() - 120)
+        self.assertEqual(put(self.receiver, expired, MP4), (403, b'Expired upload URL.'))
+
+    def test_finalize_checks_user_and_content(self):
+        upload_url, finalize_url = self.get_urls()
+        put(self.receiver, upload_url, b'not a movie at all')
+
+        other = User.objects.create_user(username='b@example.com', email='b@example.com', password='password')
+        SiteUser.objects.create(user=other, bio='bio')
+        self.client.login(username='b@example.com', password='password')
+        resp = self.client.post(finalize_url, {'movie_name': 'movie', 'description': 'description', })
+        self.assertEqual(resp.status_code, 403)
+
+        upload_url, finalize_url = self.get_urls(size=18)
+        put(self.receiver, upload_url, b'not a movie at all')
+        resp = self.client.post(finalize_url, {'movie_name': 'movie', 'description': 'description', })
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Movie.objects.exists())
+
+    @override_settings(STORAGE_QUOTA={'QUOTA': 10, })
+    def test_upload_url_is_refused_over_quota(self):
+        resp = self.client.post('/movie/upload', {'size': 11, })
+        self.assertEqual(resp.status_code, 413)
+
+    def test_asgi_receiver(self):
+        upload_url, finalize_url = self.get_urls()
+        parts = urlsplit(upload_url)
+        application = ASGIHandler(lambda environ, start_response: self.fail('Passed to Django.'))
+        status, headers, body, messages = call(
+                                              application,
+                                              parts.path,
+                                              method='PUT',
+                                              headers=[('Content-Length', str(len(MP4))), ],
+                                              body=MP4,
+                                              query_string=parts.query.encode()
+                                          )
+        self.assertEqual((status, body), (201, b'Uploaded.'))
+
+        with open(uploads.staging_path(parts.path[len('/upload/'):]), 'rb') as fp:
+            self.assertEqual(fp.read(), MP4)
+
+    def test_abandoned_uploads_are_removed(self):
+        upload_url, finalize_url = self.get_urls()
+        put(self.receiver, upload_url, MP4)
+        self.assertEqual(uploads.remove_abandoned(), 0)
+
+        out = StringIO()
+        self.assertEqual(uploads.remove_abandoned(now=time.time() + 121), 1)
+        call_command('purge_deleted', stdout=out)
+        self.assertEqual(os.listdir(self.staging_root), [])
@@ -0,0 +1,158 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import (
+                        DatabaseError,
+                        connection,
+                      )
+from django.test import (
+                            RequestFactory,
+                            TestCase,
+                            override_settings,
+                        )
+from django.test.utils import CaptureQueriesContext
+
+from movie import view_counts
+from movie.api.serializers import MovieSerializer
+from movie.models import (
+                            Movie,
+                            SiteUser,
+                         )
+
+
+VIEW_COUNTS = {
+    'ENABLED': True,
+    'BUFFER': 'movie.view_counts.LocalBuffer',
+    'CACHE_ALIAS': 'default',
+    'MAX_PENDING': 1000,
+    'FLUSH_INTERVAL': 3600,
+    'DEDUPE_WINDOW': 60,
+}
+
+
+@override_settings(VIEW_COUNTS=VIEW_COUNTS)
+class ViewCountTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='a@example.com', email='a@example.com', password='password')
+        siteuser = SiteUser.objects.create(user=user, bio='bio')
+        cls.movies = [
+            Movie.objects.create(
+                uploader=siteuser,
+                movie_name='movie {num}'.format(num=num),
+                description='description',
+                uploaded_file='files/movie{num}.mp4'.format(num=num)
+            )
+            for num in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        view_counts.get_buffer().drain()
+        self.addCleanup(view_counts.get_buffer().drain)
+
+    def view(self, movie, addr='10.0.0.1'):
+        resp = self.client.get(movie.get_absolute_url(), REMOTE_ADDR=addr)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_views_are_buffered_until_flush(self):
+        self.view(self.movies[0], '10.0.0.1')
+        self.view(self.movies[0], '10.0.0.2')
+        self.movies[0].refresh_from_db()
+        self.assertEqual(self.movies[0].view_count, 0)
+
+        self.assertEqual(view_counts.flush(), 2)
+        self.movies[0].refresh_from_db()
+        self.assertEqual(self.movies[0].view_count, 2)
+
+    def test_repeat_views_are_counted_once(self):
+        self.view(self.movies[0])
+        self.view(self.movies[0])
+        self.view(self.movies[1])
+        self.assertEqual(view_counts.get_buffer().pending, 2)
+
+    @override_settings(VIEW_COUNTS=dict(VIEW_COUNTS, DEDUPE_WINDOW=0))
+    def test_repeat_views_are_counted_without_window(self):
+        self.view(self.movies[0])
+        self.view(self.movies[0])
+        self.assertEqual(view_counts.get_buffer().pending, 2)
+
+    @override_settings(VIEW_COUNTS=dict(VIEW_COUNTS, MAX_PENDING=2))
+    def test_buffer_is_flushed_at_threshold(self):
+        self.view(self.movies[0], '10.0.0.1')
+        self.view(self.movies[1], '10.0.0.1')
+        self.assertEqual(view_counts.get_buffer().pending, 0)
+        self.assertEqual(list(Movie.objects.order_by('pk').values_list('view_count', flat=True)), [1, 1, 0])
+
+    def test_flush_is_one_update_per_batch(self):
+        buffer = view_counts.get_buffer()
+        for movie, count in zip(self.movies, (3, 1, 2)):
+            for num in range(count):
+                buffer.add(movie.pk)
+
+        with CaptureQueriesContext(connection) as context:
+            view_counts.flush()
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(list(Movie.objects.order_by('pk').values_list('view_count', flat=True)), [3, 1, 2])
+
+    def test_failed_flush_keeps_pending_views(self):
+        view_counts.get_buffer().add(self.movies[0].pk)
+
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                view_counts.flush()
+        self.assertEqual(view_counts.get_buffer().pending, 1)
+
+    @override_settings(VIEW_COUNTS=dict(VIEW_COUNTS, BUFFER='movie.view_counts.CacheBuffer'))
+    def test_cache_buffer(self):
+        buffer = view_counts.get_buffer()
+        buffer.add(self.movies[0].pk)
+        buffer.add(self.movies[0].pk)
+        buffer.add(self.movies[2].pk)
+        self.assertEqual(buffer.pending, 3)
+
+        self.assertEqual(view_counts.flush(), 3)
+        self.assertEqual(cache.get(buffer.key(self.movies[0].pk)), 0)
+        self.assertEqual(list(Movie.objects.order_by('pk').values_list('view_count', flat=True)), [2, 0, 1])
+
+    @override_settings(VIEW_COUNTS=dict(VIEW_COUNTS, BUFFER='movie.view_counts.CacheBuffer'))
+    def test_cache_buffer_views_are_drained_once(self):
+        buffers = [view_counts.CacheBuffer(), view_counts.CacheBuffer()]
+        buffers[0].add(self.movies[0].pk)
+        buffers[1].add(self.movies[0].pk)
+        buffers[1].add(self.movies[0].pk)
+        key = buffers[0].key(self.movies[0].pk)
+
+        # The other process drains between the get_many and the decr.
+        get_many = cache.get_many
+
+        def drain_meanwhile(keys):
+            values = get_many(keys)
+            patch.stop()
+            buffers[1].drain()
+            return values
+
+        patch = mock.patch.object(cache, 'get_many', side_effect=drain_meanwhile)
+        patch.start()
+        self.assertEqual(buffers[0].drain(), {})
+        self.assertEqual(cache.get(key), 0)
+
+        buffers[0].add(self.movies[0].pk)
+        drained = [buffers[0].drain(), buffers[1].drain()]
+        self.assertEqual(sum(sum(counts.values()) for counts in drained), 1)
+        self.assertEqual(cache.get(key), 0)
+
+    def test_flush_at_shutdown(self):
+        view_counts.get_buffer().add(self.movies[0].pk)
+        view_counts.flush_at_shutdown()
+        self.assertEqual(Movie.objects.get(pk=self.movies[0].pk).view_count, 1)
+
+    def test_serializer_exposes_read_only_view_count(self):
+        Movie.objects.filter(pk=self.movies[0].pk).update(view_count=7)
+        self.movies[0].refresh_from_db()
+        serializer = MovieSerializer(self.movies[0], context={'request': RequestFactory().get('/')})
+        self.assertEqual(serializer.data['view_count'], 7)
+        self.assertTrue(serializer.fields['view_count'].read_only)
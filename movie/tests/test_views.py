@@ -14,6 +14,7 @@ from django.urls import reverse
 from django.utils.encoding import force_bytes, force_text
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 
+from movie import jobs
 from movie.models import (
                              Movie,
                              SiteUser,
@@ -719,7 +720,10 @@ class SiteUserDeleteTest(TestCase):
         self.client.login(username=self.mail_address, password=self.password)
         resp = self.client.post(self.url_path)
         self.assertRedirects(resp, reverse('index'))
+        self.assertFalse(User.objects.get(pk=self.site_user.user.pk).is_active)
 
+        while jobs.work():
+            pass
         self.assertFalse(SiteUser.objects.filter(user=self.site_user.user).exists())
         self.assertFalse(User.objects.filter(pk=self.site_user.user.pk).exists())
 
@@ -0,0 +1,176 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import (
+                        DatabaseError,
+                        IntegrityError,
+                        connection,
+                      )
+from django.test import (
+                            TestCase,
+                            override_settings,
+                        )
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from movie import watch_progress
+from movie.models import (
+                            Movie,
+                            SiteUser,
+                            WatchProgress,
+                         )
+
+
+WATCH_PROGRESS = {
+    'ENABLED': True,
+    'HEARTBEAT_INTERVAL': 10,
+    'MAX_PENDING': 1000,
+    'FLUSH_INTERVAL': 3600,
+    'FINISHED_RATIO': 0.95,
+    'CONTINUE_WATCHING': 10,
+}
+
+
+def writes(context):
+    return [query['sql'].split(' ', 1)[0] for query in context.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE'))]
+
+
+@override_settings(WATCH_PROGRESS=WATCH_PROGRESS)
+class WatchProgressTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=name, email=name, password='password')
+            for name in ('a@example.com', 'b@example.com')
+        ]
+        cls.siteusers = [SiteUser.objects.create(user=user, bio='bio') for user in cls.users]
+        cls.movies = [
+            Movie.objects.create(
+                uploader=cls.siteusers[0],
+                movie_name='movie {num}'.format(num=num),
+                description='description',
+                uploaded_file='files/movie{num}.mp4'.format(num=num)
+            )
+            for num in range(3)
+        ]
+
+    def setUp(self):
+        watch_progress.buffer.drain()
+        self.addCleanup(watch_progress.buffer.drain)
+        self.client.force_login(self.users[0])
+
+    def heartbeat(self, movie, position, duration=100):
+        return self.client.post(
+                   '/movie/{pk}/progress'.format(pk=movie.pk),
+                   {'position': position, 'duration': duration, }
+               )
+
+    def test_heartbeats_are_coalesced_until_flush(self):
+        with CaptureQueriesContext(connection) as context:
+            for position in (10, 20, 30):
+                self.assertEqual(self.heartbeat(self.movies[0], position).status_code, 204)
+        self.assertEqual(writes(context), [])
+        self.assertEqual(watch_progress.buffer.pending, 1)
+
+        self.assertEqual(watch_progress.flush(), 1)
+        progress = WatchProgress.objects.get()
+        self.assertEqual((progress.user, progress.movie, progress.position), (self.siteusers[0], self.movies[0], 30))
+
+    def test_flush_is_one_insert_and_one_update(self):
+        watch_progress.record_heartbeat(self.users[0].pk, self.movies[0].pk, 10, 100)
+        watch_progress.flush()
+
+        for user in self.users:
+            for movie in self.movies:
+                watch_progress.record_heartbeat(user.pk, movie.pk, 50, 100)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(watch_progress.flush(), 6)
+        self.assertEqual(writes(context), ['INSERT', 'UPDATE'])
+        self.assertEqual(list(WatchProgress.objects.values_list('position', flat=True).distinct()), [50])
+
+    def test_older_heartbeats_do_not_overwrite_newer_ones(self):
+        now = timezone.now()
+        watch_progress.buffer.add(self.users[0].pk, self.movies[0].pk, 60, 100, now)
+        watch_progress.flush()
+        watch_progress.buffer.add(self.users[0].pk, self.movies[0].pk, 20, 100, now - timedelta(seconds=5))
+        self.assertEqual(watch_progress.flush(), 0)
+        self.assertEqual(WatchProgress.objects.get().position, 60)
+
+    def test_unknown_users_and_movies_are_dropped(self):
+        watch_progress.record_heartbeat(self.users[0].pk, 0, 10)
+        watch_progress.record_heartbeat(0, self.movies[0].pk, 10)
+        self.assertEqual(watch_progress.flush(), 0)
+
+    @override_settings(WATCH_PROGRESS=dict(WATCH_PROGRESS, MAX_PENDING=2))
+    def test_buffer_is_flushed_at_threshold(self):
+        self.heartbeat(self.movies[0], 10)
+        self.heartbeat(self.movies[0], 20)
+        self.assertEqual(WatchProgress.objects.count(), 0)
+        self.heartbeat(self.movies[1], 10)
+        self.assertEqual(WatchProgress.objects.count(), 2)
+        self.assertEqual(watch_progress.buffer.pending, 0)
+
+    def test_failed_flush_keeps_heartbeats(self):
+        watch_progress.record_heartbeat(self.users[0].pk, self.movies[0].pk, 10)
+
+        with mock.patch('django.db.models.query.QuerySet.bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                watch_progress.flush()
+        self.assertEqual(watch_progress.buffer.pending, 1)
+
+    def test_conflicting_inserts_are_retried_once(self):
+        watch_progress.record_heartbeat(self.users[0].pk, self.movies[0].pk, 10)
+
+        with mock.patch('django.db.models.query.QuerySet.bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                watch_progress.flush()
+        self.assertEqual(watch_progress.buffer.pending, 1)
+        self.assertEqual(WatchProgress.objects.count(), 0)
+
+    def test_flush_at_shutdown(self):
+        watch_progress.record_heartbeat(self.users[0].pk, self.movies[0].pk, 10)
+        watch_progress.flush_at_shutdown()
+        self.assertEqual(WatchProgress.objects.get().position, 10)
+
+    def test_invalid_heartbeats(self):
+        self.assertEqual(self.heartbeat(self.movies[0], -1).status_code, 400)
+        self.assertEqual(self.heartbeat(self.movies[0], 'inf').status_code, 400)
+        self.assertEqual(self.client.get('/movie/{pk}/progress'.format(pk=self.movies[0].pk)).status_code, 405)
+        self.client.logout()
+        self.assertEqual(self.heartbeat(self.movies[0], 10).status_code, 403)
+        self.assertEqual(watch_progress.buffer.pending, 0)
+
+    def test_position_is_capped_at_duration(self):
+        self.heartbeat(self.movies[0], 150, 100)
+        self.assertEqual(watch_progress.buffer.get(self.users[0].pk, self.movies[0].pk)[0], 100)
+
+    def test_detail_page_resumes_from_position(self):
+        url = self.movies[0].get_absolute_url()
+        self.assertEqual(self.client.get(url).context['resume_position'], 0)
+
+        self.heartbeat(self.movies[0], 42.5)
+        resp = self.client.get(url)
+        self.assertEqual(resp.context['resume_position'], 42.5)
+        self.assertContains(resp, 'data-resume="42.5"')
+
+        watch_progress.flush()
+        self.assertEqual(self.client.get(url).context['resume_position'], 42.5)
+
+        self.heartbeat(self.movies[0], 99)
+        self.assertEqual(self.client.get(url).context['resume_position'], 0)
+
+    def test_continue_watching(self):
+        for movie, position in zip(self.movies, (10, 99, 30)):
+            self.heartbeat(movie, position)
+            watch_progress.flush()
+
+        resp = self.client.get('/movie/user/edit')
+        self.assertEqual(
+            [progress.movie for progress in resp.context['continue_watching']],
+            [self.movies[2], self.movies[0]]
+        )
+        self.assertContains(resp, '(30%)')
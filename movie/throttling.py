@@ -0,0 +1,227 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+from .models import APIKey
+
+
+PERIODS = {
+    's': 1,
+    'sec': 1,
+    'm': 60,
+    'min': 60,
+    'h': 3600,
+    'hour': 3600,
+    'd': 86400,
+    'day': 86400,
+}
+
+
+def parse_rate(rate):
+    """
+    Turns '<tokens>/<period>' (e.g. '30/min') into (capacity, tokens per second).
+    """
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period]
+
+
+def get_client_ip(request):
+    xff = request.META.get('HTTP_X_FORWARDED_FOR')
+    num_proxies = get_throttle_settings().get('NUM_PROXIES', 0)
+
+    if xff and num_proxies:
+        addrs = xff.split(',')
+        return addrs[-min(num_proxies, len(addrs))].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def get_ident(request):
+    auth = getattr(request, 'auth', None)
+
+    if isinstance(auth, APIKey):
+        return 'key:{pk}'.format(pk=auth.pk)
+
+    user = getattr(request, 'user', None)
+
+    if user is not None and user.is_authenticated:
+        return 'user:{pk}'.format(pk=user.pk)
+    return 'ip:{addr}'.format(addr=get_client_ip(request))
+
+
+def content_length(request):
+    try:
+        return max(int(request.META.get('CONTENT_LENGTH') or 0), 0)
+    except ValueError:
+        return 0
+
+
+class LocalMemoryStore(object):
+    """
+    Exact token buckets kept in this process. Meant for tests and single
+    process deployments.
+
+    A request costing more than the bucket capacity is allowed once the
+    bucket is full and leaves it in debt, so large uploads are not rejected
+    forever by byte-rate buckets.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, cost, capacity, rate, now=None):
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            needed = min(cost, capacity)
+
+            if tokens >= needed:
+                tokens -= cost
+                wait = 0
+            else:
+                wait = (needed - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return wait == 0, wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheStore(object):
+    """
+    Buckets shared between workers through a Django cache.
+
+    Shared caches offer no compare-and-swap, so the bucket is approximated
+    with a sliding window built only from atomic ``incr`` calls: the window
+    is the time the bucket takes to refill, and the previous window's usage
+    is weighted by how much of it still overlaps the sliding window. There
+    is no clear(): caches cannot list the keys of the buckets, which expire
+    two windows after their last use.
+    """
+
+    def __init__(self, cache_alias='default'):
+        self.cache = caches[cache_alias]
+
+    def _incr(self, key, delta, timeout):
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            self.cache.set(key, delta, timeout)
+            return delta
+
+    def consume(self, key, cost, capacity, rate, now=None):
+        if now is None:
+            now = time.time()
+
+        window = capacity / rate
+        index = int(now // window)
+        timeout = int(math.ceil(window * 2)) + 1
+        current_key = '{key}:{index}'.format(key=key, index=index)
+        previous_key = '{key}:{index}'.format(key=key, index=index - 1)
+
+        count = self._incr(current_key, cost, timeout)
+        previous = self.cache.get(previous_key, 0)
+        overlap = 1 - (now - index * window) / window
+        used_before = previous * overlap + count - cost
+        needed = min(cost, capacity)
+
+        if used_before + needed <= capacity:
+            return True, 0
+
+        try:
+            self.cache.decr(current_key, cost)
+        except ValueError:
+            # Expired since the incr: put back the usage it held.
+            self.cache.add(current_key, count - cost, timeout)
+        return False, (used_before + needed - capacity) / rate
+
+
+def get_throttle_settings():
+    return getattr(settings, 'THROTTLE', {})
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                options = get_throttle_settings()
+                store_class = import_string(options.get('STORE', 'movie.throttling.LocalMemoryStore'))
+                _store = store_class(**options.get('STORE_OPTIONS', {}))
+    return _store
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    global _store
+
+    if setting == 'THROTTLE':
+        _store = None
+
+
+def check_rate(scope, ident, cost=1):
+    """
+    Takes ``cost`` tokens from the bucket of ``scope`` for ``ident``.
+    Returns (allowed, seconds to wait). Scopes without a rate are not limited.
+    """
+    options = get_throttle_settings()
+    rate = options.get('RATES', {}).get(scope)
+
+    if not options.get('ENABLED', True) or rate is None or cost <= 0:
+        return True, 0
+
+    capacity, refill_rate = parse_rate(rate)
+    return get_store().consume(
+               'throttle:{scope}:{ident}'.format(scope=scope, ident=ident),
+               cost,
+               capacity,
+               refill_rate
+           )
+
+
+def throttle(scope, methods=None, cost=None):
+    """
+    View decorator answering 429 Too Many Requests once the bucket of
+    ``scope`` is empty. ``cost`` is a callable taking the request and
+    returning the number of tokens to take, one by default.
+    """
+    def decorator(view_func):
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if methods is None or request.method in methods:
+                tokens = cost(request) if cost is not None else 1
+                allowed, wait = check_rate(scope, get_ident(request), tokens)
+
+                if not allowed:
+                    response = HttpResponse('Too many requests.', status=429, content_type='text/plain')
+                    response['Retry-After'] = str(int(math.ceil(wait)))
+                    return response
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,186 @@
+from django.conf import settings
+from django.db import (
+                        models,
+                        transaction,
+                      )
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from . import jobs
+from .models import (
+                        Follow,
+                        Movie,
+                        SiteUser,
+                        TimelineEntry,
+                    )
+
+
+def get_timeline_settings():
+    return getattr(settings, 'TIMELINES', {})
+
+
+def is_fanned_out(follower_count):
+    return follower_count < get_timeline_settings().get('FAN_OUT_LIMIT', 10000)
+
+
+def count_pulled_follows(follow, delta):
+    """
+    Keeps SiteUser.pulled_follow_count up to date once ``follow`` was added
+    (``delta`` 1) or removed (-1): the follower counts it while the uploader
+    has FAN_OUT_LIMIT followers or more, and all of the other followers
+    count it too when the uploader crosses that limit.
+    """
+    limit = get_timeline_settings().get('FAN_OUT_LIMIT', 10000)
+    after = SiteUser.objects.filter(pk=follow.uploader_id).values_list('follower_count', flat=True).first()
+
+    if after is None:
+        return
+
+    before = after - delta
+    pulled_before, pulled_after = before >= limit, after >= limit
+
+    if pulled_before != pulled_after:
+        SiteUser.objects.filter(following__uploader_id=follow.uploader_id) \
+                        .exclude(pk=follow.follower_id) \
+                        .update(pulled_follow_count=F('pulled_follow_count') + (1 if pulled_after else -1))
+
+    # The follower itself, left out above as its Follow row may be gone.
+    if (pulled_after if delta > 0 else pulled_before):
+        SiteUser.objects.filter(pk=follow.follower_id).update(pulled_follow_count=F('pulled_follow_count') + delta)
+
+
+def recount_pulled_follows():
+    """
+    Recounts SiteUser.pulled_follow_count, e.g. after FAN_OUT_LIMIT changed.
+    Returns the number of users.
+    """
+    pulled = Follow.objects.filter(
+                               follower=models.OuterRef('pk'),
+                               uploader__follower_count__gte=get_timeline_settings().get('FAN_OUT_LIMIT', 10000)
+                           ).order_by().values('follower')
+    return SiteUser.objects.update(
+               pulled_follow_count=Coalesce(
+                                       models.Subquery(
+                                           pulled.annotate(count=models.Count('*')).values('count'),
+                                           output_field=models.IntegerField()
+                                       ),
+                                       0
+                                   )
+           )
+
+
+def add_entries(movie_id, post_date, owner_ids):
+    existing = set(
+                   TimelineEntry.objects.filter(movie_id=movie_id, owner_id__in=owner_ids)
+                                        .values_list('owner_id', flat=True)
+               )
+    TimelineEntry.objects.bulk_create([
+        TimelineEntry(owner_id=owner_id, movie_id=movie_id, post_date=post_date)
+        for owner_id in owner_ids if owner_id not in existing
+    ])
+
+
+def movie_created(movie):
+    jobs.enqueue('movie.timelines.fan_out', movie_id=movie.pk)
+
+
+def fan_out(movie_id, after=0):
+    """
+    Background job copying a movie into the timelines of BATCH_SIZE
+    followers of its uploader, those with ids above ``after``, and queueing
+    the next batch.
+    """
+    batch_size = get_timeline_settings().get('BATCH_SIZE', 1000)
+    movie = Movie.objects.filter(pk=movie_id) \
+                         .values_list('uploader', 'uploader__follower_count', 'post_date') \
+                         .first()
+
+    if movie is None or movie[0] is None or not is_fanned_out(movie[1]):
+        return
+
+    uploader_id, follower_count, post_date = movie
+    followers = list(
+                    Follow.objects.filter(uploader_id=uploader_id, follower_id__gt=after)
+                                  .order_by('follower_id')
+                                  .values_list('follower_id', flat=True)[:batch_size]
+                )
+    add_entries(movie_id, post_date, followers)
+
+    if len(followers) == batch_size:
+        jobs.enqueue('movie.timelines.fan_out', movie_id=movie_id, after=followers[-1])
+
+
+def latest_uploads(uploader_ids, limit):
+    return Movie.objects.filter(uploader__in=uploader_ids) \
+                        .select_related('uploader__user') \
+                        .order_by('-post_date', '-movie_name', '-id')[:limit]
+
+
+def follow(follower, uploader):
+    """
+    Adds the BACKFILL latest movies of ``uploader`` to the timeline of
+    ``follower``. Returns False if already following.
+    """
+    with transaction.atomic():
+        relation, created = Follow.objects.get_or_create(follower=follower, uploader=uploader)
+
+        if not created:
+            return False
+
+        uploader.refresh_from_db(fields=['follower_count'])
+
+        if is_fanned_out(uploader.follower_count):
+            recent = latest_uploads([uploader.pk], get_timeline_settings().get('BACKFILL', 20))
+            for movie_id, post_date in recent.values_list('pk', 'post_date'):
+                add_entries(movie_id, post_date, [follower.pk])
+    return True
+
+
+def unfollow(follower, uploader):
+    """
+    Removes the movies of ``uploader`` from the timeline of ``follower``.
+    Returns False if not following.
+    """
+    with transaction.atomic():
+        deleted, rows = Follow.objects.filter(follower=follower, uploader=uploader).delete()
+
+        if not deleted:
+            return False
+
+        TimelineEntry.objects.filter(owner=follower, movie__uploader=uploader).delete()
+    return True
+
+
+def feed(siteuser, limit=None):
+    """
+    The latest movies of the uploaders ``siteuser`` follows, newest first:
+    one index range of the timeline, merged with the latest uploads of
+    followed uploaders whose movies are not fanned out. Users following
+    none of those, by their pulled_follow_count, run the range only.
+    """
+    options = get_timeline_settings()
+    limit = limit or options.get('FEED_SIZE', 20)
+    movies = list(
+                 Movie.objects.filter(timeline_entries__owner=siteuser)
+                              .select_related('uploader__user')
+                              .order_by(F('timeline_entries__post_date').desc(), F('timeline_entries__movie').desc())[:limit]
+             )
+
+    if not siteuser.pulled_follow_count:
+        return movies
+
+    pulled = list(
+                 Follow.objects.filter(
+                                   follower=siteuser,
+                                   uploader__follower_count__gte=options.get('FAN_OUT_LIMIT', 10000)
+                               ).values_list('uploader', flat=True)
+             )
+
+    if pulled:
+        movies.extend(latest_uploads(pulled, limit))
+        movies = sorted(
+                     {movie.pk: movie for movie in movies}.values(),
+                     key=lambda movie: (movie.post_date, movie.pk),
+                     reverse=True
+                 )[:limit]
+    return movies
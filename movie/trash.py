@@ -0,0 +1,64 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+                        Comment,
+                        Movie,
+                        TimelineEntry,
+                        WatchProgress,
+                    )
+
+
+def get_soft_delete_settings():
+    return getattr(settings, 'SOFT_DELETE', {})
+
+
+def purge_stages(cutoff):
+    """
+    The rows deleted before ``cutoff``, with the rows depending on such
+    movies, in the order they are purged. The many rows a movie can have go
+    before it, so deleting a chunk of movies cascades to a few rows only.
+    """
+    return (
+        Comment.all_objects.filter(deleted_at__lt=cutoff),
+        Comment.all_objects.filter(movie__deleted_at__lt=cutoff),
+        TimelineEntry.objects.filter(movie__deleted_at__lt=cutoff),
+        WatchProgress.objects.filter(movie__deleted_at__lt=cutoff),
+        Movie.all_objects.filter(deleted_at__lt=cutoff),
+    )
+
+
+def purge(chunk_size=None, pause=None, now=None):
+    """
+    Hard deletes the rows soft deleted more than RETENTION seconds ago, and
+    the files of such movies, CHUNK_SIZE rows per transaction with PAUSE
+    seconds between them, so other writers are never locked out for long.
+    Returns the number of purged rows per model.
+    """
+    options = get_soft_delete_settings()
+    chunk_size = chunk_size or options.get('CHUNK_SIZE', 100)
+    pause = options.get('PAUSE', 0.1) if pause is None else pause
+    cutoff = (now or timezone.now()) - timedelta(seconds=options.get('RETENTION', 30 * 24 * 3600))
+    purged = {}
+
+    for queryset in purge_stages(cutoff):
+        while True:
+            pks = list(queryset.order_by().values_list('pk', flat=True)[:chunk_size])
+
+            if not pks:
+                break
+
+            with transaction.atomic():
+                # Movies are deleted with their files by the post_delete
+                # signal.
+                queryset.model._base_manager.filter(pk__in=pks).delete()
+            name = queryset.model._meta.verbose_name_plural
+            purged[name] = purged.get(name, 0) + len(pks)
+
+            if pause:
+                time.sleep(pause)
+    return purged
@@ -0,0 +1,276 @@
+import magic
+import os
+import re
+import tempfile
+import time
+import uuid
+from urllib.parse import (
+                            parse_qs,
+                            urlencode,
+                         )
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.db import transaction
+from django.utils.crypto import (
+                                    constant_time_compare,
+                                    salted_hmac,
+                                )
+
+NAME = re.compile(r'^[0-9a-f]{32}\.mp4$')
+
+SALT = 'movie.uploads'
+
+
+def get_direct_upload_settings():
+    return getattr(settings, 'DIRECT_UPLOAD', {})
+
+
+def url_prefix():
+    return get_direct_upload_settings().get('URL_PREFIX', '/upload/')
+
+
+def staging_path(name):
+    return os.path.join(get_direct_upload_settings().get('STAGING_ROOT', settings.MEDIA_ROOT + '-uploads'), name)
+
+
+def finalized_path(name):
+    return staging_path(name + '.done')
+
+
+class InvalidUpload(Exception):
+
+    def __init__(self, message, status=400):
+        super(InvalidUpload, self).__init__(message)
+        self.status = status
+
+
+def sign(name, siteuser_id, size, expires):
+    value = '{name}:{siteuser_id}:{size}:{expires}'.format(
+                name=name,
+                siteuser_id=siteuser_id,
+                size=size,
+                expires=expires
+            )
+    return salted_hmac(SALT, value).hexdigest()
+
+
+def upload_url(siteuser_id, size, now=None):
+    """
+    A new signed URL ``siteuser_id`` may PUT ``size`` bytes to during
+    MAX_AGE seconds, relative to URL_PREFIX.
+    """
+    name = uuid.uuid4().hex + '.mp4'
+    expires = int(now or time.time()) + get_direct_upload_settings().get('MAX_AGE', 3600)
+    query = urlencode([
+                ('user', siteuser_id),
+                ('size', size),
+                ('expires', expires),
+                ('signature', sign(name, siteuser_id, size, expires)),
+            ])
+    return '{prefix}{name}?{query}'.format(prefix=url_prefix(), name=name, query=query)
+
+
+def verify(name, params, now=None):
+    """
+    Returns the SiteUser id and the size signed for upload ``name`` with the
+    query ``params`` of its URL, or raises InvalidUpload.
+    """
+    try:
+        siteuser_id, size, expires = (int(params[key]) for key in ('user', 'size', 'expires'))
+        signature = params['signature']
+    except (KeyError, ValueError):
+        raise InvalidUpload('Unsigned upload URL.', 403)
+
+    if not NAME.match(name) or not constant_time_compare(signature, sign(name, siteuser_id, size, expires)):
+        raise InvalidUpload('Invalid upload URL signature.', 403)
+
+    if expires < (now or time.time()):
+        raise InvalidUpload('Expired upload URL.', 403)
+    return siteuser_id, size
+
+
+class StagedFile(object):
+    """
+    Writes the body of an upload to a temporary file next to its staging
+    path, and links it there once all of the signed size arrived, so an
+    upload is staged whole and once, and never after it was finalized.
+    """
+
+    def __init__(self, name, size):
+        self.path = staging_path(name)
+        self.finalized_path = finalized_path(name)
+        self.size = size
+        self.received = 0
+
+        if os.path.exists(self.path) or os.path.exists(self.finalized_path):
+            raise InvalidUpload('Already uploaded.', 409)
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.fp = tempfile.NamedTemporaryFile(dir=os.path.dirname(self.path), suffix='.part', delete=False)
+
+    def write(self, chunk):
+        self.received += len(chunk)
+
+        if self.received > self.size:
+            raise InvalidUpload('Larger than the signed size.', 413)
+        self.fp.write(chunk)
+
+    def commit(self):
+        self.fp.close()
+
+        if self.received != self.size:
+            raise InvalidUpload('Smaller than the signed size.')
+
+        if os.path.exists(self.finalized_path):
+            raise InvalidUpload('Already uploaded.', 409)
+
+        try:
+            os.link(self.fp.name, self.path)
+        except FileExistsError:
+            raise InvalidUpload('Already uploaded.', 409)
+
+    def close(self):
+        self.fp.close()
+        os.unlink(self.fp.name)
+
+
+def start(path, query_string, content_length):
+    """
+    Checks the PUT of an upload to URL ``path`` and returns its StagedFile.
+    The Content-Length must be the signed size.
+    """
+    params = {key: values[0] for key, values in parse_qs(query_string).items()}
+    name = path[len(url_prefix()):]
+    siteuser_id, size = verify(name, params)
+
+    if content_length is None:
+        raise InvalidUpload('Content-Length required.', 411)
+
+    if content_length != size:
+        raise InvalidUpload('Content-Length is not the signed size.', 413 if content_length > size else 400)
+    return StagedFile(name, size)
+
+
+def content_length(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class UploadReceiver(object):
+    """
+    WSGI application receiving the PUTs to URL_PREFIX without going through
+    Django, and passing every other request to ``application``. Receivers
+    are best run on their own processes (see movie_hosting/wsgi.py).
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+
+        if not path.startswith(url_prefix()):
+            return self.application(environ, start_response)
+
+        status, message = self.receive(environ)
+        start_response(
+            '{status} {reason}'.format(status=status, reason='Created' if status == 201 else 'Error'),
+            [('Content-Type', 'text/plain'), ('Content-Length', str(len(message))), ]
+        )
+        return [message]
+
+    def receive(self, environ):
+        if environ['REQUEST_METHOD'] != 'PUT':
+            return 405, b'PUT the movie to this URL.'
+
+        chunk_size = get_direct_upload_settings().get('CHUNK_SIZE', 64 * 1024)
+        try:
+            staged = start(
+                         environ['PATH_INFO'],
+                         environ.get('QUERY_STRING', ''),
+                         content_length(environ.get('CONTENT_LENGTH'))
+                     )
+            try:
+                while staged.received < staged.size:
+                    chunk = environ['wsgi.input'].read(min(chunk_size, staged.size - staged.received))
+
+                    if not chunk:
+                        break
+                    staged.write(chunk)
+                staged.commit()
+            finally:
+                staged.close()
+        except InvalidUpload as e:
+            return e.status, str(e).encode()
+        return 201, b'Uploaded.'
+
+
+def finalize(movie, name):
+    """
+    Moves staged upload ``name``, when it is a movie, to the storage of
+    ``movie`` and saves ``movie`` with it, once per name. The file is
+    renamed, not copied, when both are on the same file system.
+    """
+    path = staging_path(name)
+
+    if os.path.exists(finalized_path(name)):
+        raise InvalidUpload('Already finalized.', 409)
+
+    try:
+        with open(path, 'rb') as fp:
+            mime = magic.from_buffer(fp.read(1024), mime=True)
+    except FileNotFoundError:
+        raise InvalidUpload('Not uploaded.', 404)
+
+    if mime != 'video/mp4':
+        os.unlink(path)
+        raise InvalidUpload('Invalid File Type - this file is not movie one')
+
+    # The marker left in staging consumes the name: its URL can neither be
+    # uploaded to nor finalized again.
+    try:
+        os.close(os.open(finalized_path(name), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        raise InvalidUpload('Already finalized.', 409)
+
+    field = movie._meta.get_field('uploaded_file')
+    target = field.storage.get_available_name(field.generate_filename(movie, name))
+    os.makedirs(os.path.dirname(field.storage.path(target)), exist_ok=True)
+
+    try:
+        file_move_safe(path, field.storage.path(target))
+    except FileNotFoundError:
+        # Finalized meanwhile by another request.
+        raise InvalidUpload('Not uploaded.', 404)
+
+    movie.uploaded_file = target
+    try:
+        with transaction.atomic():
+            movie.save()
+    except Exception:
+        field.storage.delete(target)
+        raise
+    return movie
+
+
+def remove_abandoned(now=None):
+    """
+    Removes the staged uploads, and partial ones, older than twice MAX_AGE,
+    which were never finalized. Returns their number. The markers of
+    finalized uploads go too, as their URLs expired by then.
+    """
+    root = staging_path('')
+    cutoff = (now or time.time()) - 2 * get_direct_upload_settings().get('MAX_AGE', 3600)
+    removed = 0
+
+    if not os.path.isdir(root):
+        return removed
+
+    for entry in os.scandir(root):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.unlink(entry.path)
+            removed += 1
+    return removed
@@ -6,6 +6,8 @@ from . import views
 urlpatterns = [
     url(r'^$', views.index, name='index'),
     url(r'^user/(?P<pk>\d+)$', views.SiteUserDetailView.as_view(), name='user-detail'),
+    url(r'^user/(?P<pk>\d+)/follow$', views.follow_user, name='follow-user'),
+    url(r'^user/(?P<pk>\d+)/unfollow$', views.unfollow_user, name='unfollow-user'),
     url(r'^user/create$', views.SiteUserCreateView.as_view(), name='create-user'),
     url(r'^user/create/temp$', views.SiteUserCreateTemporarilyView.as_view(), name='created-user-temporarily'),
     url(r'^user/create/complete/(?P<uidb64>[0-9A-Za-z_\-]+)/(?P<token>[0-9A-Za-z]{1,13}-[0-9A-Za-z]{1,20})/$', views.SiteUserCreateCompletelyView.as_view(), name='created-user-completely'),
@@ -17,9 +19,14 @@ urlpatterns = [
     url(r'^user/edit$', views.SiteUserUpdateIndexView.as_view(), name='user-edit-index'),
     url(r'^user/delete$', views.SiteUserDeleteView.as_view(), name='user-delete'),
     url(r'^(?P<pk>\d+)$', views.MovieDetailView.as_view(), name='movie-detail'),
+    url(r'^(?P<pk>\d+)/progress$', views.movie_progress, name='movie-progress'),
     url(r'^(?P<pk>\d+)/comment$', views.MovieCommentCreateView.as_view(), name='create-comment'),
     url(r'^(?P<pk>\d+)/edit$', views.MovieUpdateView.as_view(), name='movie-edit'),
     url(r'^(?P<pk>\d+)/delete$', views.MovieDeleteView.as_view(), name='movie-delete'),
+    url(r'^(?P<pk>\d+)/restore$', views.restore_movie, name='movie-restore'),
     url(r'^movies$', views.MovieListView.as_view(), name='movie-list'),
+    url(r'^movies/autocomplete$', views.movie_autocomplete, name='movie-autocomplete'),
     url(r'^create$', views.MovieCreateView.as_view(), name='upload-movie'),
+    url(r'^upload$', views.movie_upload_url, name='movie-upload-url'),
+    url(r'^upload/(?P<name>[0-9a-f]{32}\.mp4)/finalize$', views.finalize_movie_upload, name='movie-upload-finalize'),
 ]
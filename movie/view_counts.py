@@ -0,0 +1,252 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import (
+                                    request_finished,
+                                    setting_changed,
+                                )
+from django.db import (
+                        DatabaseError,
+                        models,
+                        transaction,
+                      )
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from . import rankings
+from .models import Movie
+from .throttling import get_ident
+
+
+logger = logging.getLogger('movie.view_counts')
+
+BATCH_SIZE = 500
+
+
+def get_view_count_settings():
+    return getattr(settings, 'VIEW_COUNTS', {})
+
+
+class LocalBuffer(object):
+    """
+    Pending increments kept in this process. A crash loses the views since
+    the last flush, at most MAX_PENDING or FLUSH_INTERVAL seconds of them.
+    """
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return sum(self._counts.values())
+
+    def add(self, movie_id):
+        with self._lock:
+            self._counts[movie_id] += 1
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return counts
+
+    def restore(self, counts):
+        with self._lock:
+            self._counts.update(counts)
+
+
+class CacheBuffer(object):
+    """
+    Pending increments kept in a shared cache, so they survive a worker
+    crash and are flushed with the next view of the movie. The ids to flush
+    are tracked per process, as caches cannot list their keys. The cache
+    must allow counters below zero (not memcached).
+    """
+
+    def __init__(self, cache_alias='default'):
+        self.cache = caches[cache_alias]
+        self._movie_ids = set()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def key(self, movie_id):
+        return 'movie:views:{movie_id}'.format(movie_id=movie_id)
+
+    def _incr(self, key, delta):
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key, delta)
+        except ValueError:
+            self.cache.set(key, delta, None)
+
+    def add(self, movie_id):
+        self._incr(self.key(movie_id), 1)
+
+        with self._lock:
+            self._movie_ids.add(movie_id)
+            self._pending += 1
+
+    def drain(self):
+        with self._lock:
+            movie_ids, self._movie_ids, self._pending = self._movie_ids, set(), 0
+
+        counts = Counter()
+        for key, count in self.cache.get_many([self.key(movie_id) for movie_id in movie_ids]).items():
+            if count <= 0:
+                continue
+
+            # Other processes may drain the same key: only what this decr
+            # took from the counter is flushed here, the rest is given back.
+            try:
+                left = self.cache.incr(key, -count)
+            except ValueError:
+                continue
+            taken = min(count, max(count + left, 0))
+
+            if taken < count:
+                self._incr(key, count - taken)
+
+            if taken:
+                counts[int(key.rsplit(':', 1)[1])] = taken
+        return counts
+
+    def restore(self, counts):
+        for movie_id, count in counts.items():
+            self._incr(self.key(movie_id), count)
+
+        with self._lock:
+            self._movie_ids.update(counts)
+            self._pending += sum(counts.values())
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def get_buffer():
+    global _buffer
+
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                options = get_view_count_settings()
+                buffer_class = import_string(options.get('BUFFER', 'movie.view_counts.LocalBuffer'))
+                _buffer = buffer_class(**options.get('BUFFER_OPTIONS', {}))
+    return _buffer
+
+
+@receiver(setting_changed)
+def reset_buffer(setting, **kwargs):
+    global _buffer
+
+    if setting == 'VIEW_COUNTS':
+        _buffer = None
+
+
+def flush():
+    """
+    Adds the pending views to Movie.view_count, one UPDATE per BATCH_SIZE
+    movies, and to the daily views of the rankings. Returns the number of
+    views written.
+    """
+    global _flushed_at
+
+    with _flush_lock:
+        _flushed_at = time.monotonic()
+        buffer = get_buffer()
+        counts = buffer.drain()
+
+        if not counts:
+            return 0
+
+        movie_ids = sorted(counts)
+        try:
+            with transaction.atomic():
+                for start in range(0, len(movie_ids), BATCH_SIZE):
+                    batch = movie_ids[start:start + BATCH_SIZE]
+                    Movie.objects.filter(pk__in=batch).update(
+                        view_count=models.F('view_count') + models.Case(
+                                                                *[models.When(pk=pk, then=counts[pk]) for pk in batch],
+                                                                output_field=models.PositiveIntegerField()
+                                                            )
+                    )
+                rankings.record_views(counts)
+        except DatabaseError:
+            buffer.restore(counts)
+            raise
+        return sum(counts.values())
+
+
+def maybe_flush():
+    options = get_view_count_settings()
+
+    if get_buffer().pending < options.get('MAX_PENDING', 100) \
+       and time.monotonic() - _flushed_at < options.get('FLUSH_INTERVAL', 10):
+        return
+
+    try:
+        flush()
+    except DatabaseError:
+        logger.exception('Could not flush view counts.')
+
+
+def flush_at_shutdown():
+    """
+    Flushes the pending views, from the shutdown hook of the server (see
+    movie.asgi), as they are lost with the process otherwise.
+    """
+    if _buffer is not None and _buffer.pending:
+        try:
+            flush()
+        except DatabaseError:
+            logger.exception('Could not flush view counts at shutdown.')
+
+
+@receiver(request_finished)
+def flush_after_request(sender, **kwargs):
+    # A process gone idle flushes with its next request, of any page.
+    if _buffer is not None and _buffer.pending:
+        maybe_flush()
+
+
+def is_repeat_view(request, movie_id):
+    """
+    Whether the viewer (user, else session, else address) already viewed the
+    movie within DEDUPE_WINDOW seconds.
+    """
+    options = get_view_count_settings()
+    window = options.get('DEDUPE_WINDOW', 0)
+
+    if not window:
+        return False
+
+    viewer = get_ident(request)
+    session = getattr(request, 'session', None)
+
+    if viewer.startswith('ip:') and session is not None and session.session_key:
+        viewer = 'session:{key}'.format(key=session.session_key)
+
+    key = 'movie:viewed:{movie_id}:{viewer}'.format(
+              movie_id=movie_id,
+              viewer=hashlib.sha1(viewer.encode()).hexdigest()
+          )
+    return not caches[options.get('CACHE_ALIAS', 'default')].add(key, 1, window)
+
+
+def record_view(request, movie_id):
+    if not get_view_count_settings().get('ENABLED', True) or is_repeat_view(request, movie_id):
+        return
+
+    get_buffer().add(movie_id)
+    maybe_flush()
@@ -1,14 +1,28 @@
+import os
+import time
+
+from django.contrib.auth import logout
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.sites.shortcuts import get_current_site
 from django.conf import settings
 from django.core import mail
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import (
+                                    PermissionDenied,
+                                    SuspiciousFileOperation,
+                                   )
+from django.core.files.storage import default_storage
 from django.core.urlresolvers import reverse_lazy
+from django.db import transaction
 from django.http import (
                             Http404,
+                            HttpResponse,
+                            HttpResponseBadRequest,
+                            HttpResponseForbidden,
                             HttpResponseRedirect,
+                            JsonResponse,
                         )
 from django.template.loader import get_template
 from django.shortcuts import (
@@ -16,6 +30,7 @@ from django.shortcuts import (
                                 render,
                              )
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.utils.encoding import (
                                     force_bytes,
                                     force_text,
@@ -24,30 +39,237 @@ from django.utils.http import (
                                 urlsafe_base64_encode,
                                 urlsafe_base64_decode,
                               )
-from django.views import generic
-
+from django.views import (
+                            generic,
+                            static,
+                         )
+from django.views.decorators.http import require_POST
+
+from . import (
+                accounts,
+                autocomplete,
+                metrics,
+                quotas,
+                rankings,
+                signed_media,
+                timelines,
+                trash,
+                uploads,
+                view_counts,
+                watch_progress,
+              )
 from .forms import (
+                        DirectUploadForm,
                         MovieUploadForm,
                         SiteUserCreateForm,
                         SiteUserUpdateEmailForm,
+                        UploadURLForm,
+                        WatchProgressForm,
                    )
 from .models import (
                         Comment,
                         Movie,
                         SiteUser,
                     )
+from .throttling import (
+                            content_length,
+                            throttle,
+                        )
 
 
 def index(request):
+    context = {}
+
+    if request.user.is_authenticated:
+        siteuser = SiteUser.objects.filter(user=request.user).first()
+
+        if siteuser is not None:
+            context['feed'] = timelines.feed(siteuser)
+
     return render(
                request,
                'movie/index.html',
+               context,
+           )
+
+
+def metrics_exposition(request):
+    if not metrics.can_scrape(request):
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+               metrics.generate_latest(),
+               content_type='text/plain; version=0.0.4; charset=utf-8'
            )
 
 
+def serve_media(request, path):
+    """
+    Serves uploaded file ``path`` where Django routes MEDIA_URL (DEBUG only,
+    see movie_hosting/urls.py), checking its signature as movie.asgi does.
+    """
+    if signed_media.is_enabled() and not signed_media.verify(
+        path,
+        request.META.get('QUERY_STRING', ''),
+        request.META.get('HTTP_COOKIE')
+    ):
+        return HttpResponseForbidden()
+
+    try:
+        full_path = default_storage.path(path)
+    except SuspiciousFileOperation:
+        raise Http404
+
+    return static.serve(request, os.path.basename(full_path), document_root=os.path.dirname(full_path))
+
+
+def movie_autocomplete(request):
+    """
+    Movie names matching the words typed so far, from the in-memory index.
+    """
+    results = autocomplete.get_index().search(
+                  request.GET.get('q', ''),
+                  autocomplete.get_autocomplete_settings().get('RESULTS', 10)
+              )
+    return JsonResponse({
+        'results': [
+            {'id': pk, 'name': name, 'url': reverse('movie-detail', args=(pk, ))}
+            for pk, name in results
+        ],
+    })
+
+
+@require_POST
+def movie_progress(request, pk):
+    """
+    Player heartbeat with the position reached, buffered and written in
+    batches.
+    """
+    if not request.user.is_authenticated:
+        return HttpResponseForbidden()
+
+    form = WatchProgressForm(request.POST)
+
+    if not form.is_valid():
+        return HttpResponseBadRequest()
+
+    watch_progress.record_heartbeat(
+        request.user.pk,
+        int(pk),
+        form.cleaned_data['position'],
+        form.cleaned_data['duration']
+    )
+    return HttpResponse(status=204)
+
+
+@login_required
+@require_POST
+def restore_movie(request, pk):
+    movie = get_object_or_404(
+                Movie.all_objects,
+                pk=pk,
+                uploader__user=request.user,
+                deleted_at__isnull=False
+            )
+    movie.restore()
+    return HttpResponseRedirect(reverse('user-edit-index'))
+
+
+@login_required
+@require_POST
+def movie_upload_url(request):
+    """
+    A signed URL to PUT a movie of the posted size to, straight to the
+    upload receiver, and the URL to finalize it with once it is there.
+    """
+    form = UploadURLForm(request.POST)
+
+    if not form.is_valid():
+        return JsonResponse(form.errors, status=400)
+
+    size = form.cleaned_data['size']
+    siteuser = get_object_or_404(SiteUser, user=request.user)
+    remaining = quotas.remaining_bytes(request.user)
+
+    if size > remaining:
+        return JsonResponse({'size': [quotas.exceeded_message(remaining)], }, status=413)
+
+    url = uploads.upload_url(siteuser.pk, size)
+    base_url = uploads.get_direct_upload_settings().get('BASE_URL')
+    name, query = url[len(uploads.url_prefix()):].split('?', 1)
+    return JsonResponse({
+        'upload_url': base_url + url if base_url else request.build_absolute_uri(url),
+        'finalize_url': reverse('movie-upload-finalize', kwargs={'name': name, }) + '?' + query,
+    })
+
+
+@login_required
+@require_POST
+def finalize_movie_upload(request, name):
+    """
+    Creates the movie of an upload PUT to its signed URL, with the posted
+    name and description. The file is moved, not read, by this view.
+    """
+    siteuser = get_object_or_404(SiteUser, user=request.user)
+    max_age = uploads.get_direct_upload_settings().get('MAX_AGE', 3600)
+
+    # Uploads may finish up to MAX_AGE after their URL expired.
+    try:
+        siteuser_id, size = uploads.verify(name, request.GET.dict(), now=time.time() - max_age)
+    except uploads.InvalidUpload as e:
+        return JsonResponse({'detail': str(e), }, status=e.status)
+
+    if siteuser_id != siteuser.pk:
+        return HttpResponseForbidden()
+
+    form = DirectUploadForm(request.POST)
+
+    if not form.is_valid():
+        return JsonResponse(form.errors, status=400)
+
+    remaining = quotas.remaining_bytes(request.user)
+
+    if size > remaining:
+        return JsonResponse({'detail': quotas.exceeded_message(remaining), }, status=413)
+
+    movie = form.save(commit=False)
+    movie.uploader = siteuser
+    try:
+        uploads.finalize(movie, name)
+    except uploads.InvalidUpload as e:
+        return JsonResponse({'detail': str(e), }, status=e.status)
+    return JsonResponse({'url': movie.get_absolute_url(), }, status=201)
+
+
+@login_required
+@require_POST
+def follow_user(request, pk):
+    uploader = get_object_or_404(SiteUser, pk=pk)
+    follower = get_object_or_404(SiteUser, user=request.user)
+
+    if follower != uploader:
+        timelines.follow(follower, uploader)
+    return HttpResponseRedirect(uploader.get_absolute_url())
+
+
+@login_required
+@require_POST
+def unfollow_user(request, pk):
+    uploader = get_object_or_404(SiteUser, pk=pk)
+    timelines.unfollow(get_object_or_404(SiteUser, user=request.user), uploader)
+    return HttpResponseRedirect(uploader.get_absolute_url())
+
+
 class SiteUserDetailView(generic.DetailView):
     model = SiteUser
 
+    def get_context_data(self, **kwargs):
+        context = super(SiteUserDetailView, self).get_context_data(**kwargs)
+
+        if self.request.user.is_authenticated:
+            context['is_following'] = self.object.followers.filter(follower__user=self.request.user).exists()
+        return context
+
 
 class SiteUserCreateView(generic.CreateView):
     model = SiteUser
@@ -69,12 +291,14 @@ class SiteUserCreateView(generic.CreateView):
                                     'uid': urlsafe_base64_encode(force_bytes(user.pk)),
                                     'token': default_token_generator.make_token(user),
                                }
-        mail.send_mail(
-              subject=subject_template.render(),
-              message=message_body_template.render(message_body_context),
-              from_email=settings.DEFAULT_FROM_EMAIL,
-              recipient_list=[user.email, ],
-        )
+        with metrics.EMAIL_SEND_DURATION.time():
+            mail.send_mail(
+                  subject=subject_template.render(),
+                  message=message_body_template.render(message_body_context),
+                  from_email=settings.DEFAULT_FROM_EMAIL,
+                  recipient_list=[user.email, ],
+            )
+        metrics.EMAILS_SENT.inc()
 
         return super(SiteUserCreateView, self).form_valid(form)
 
@@ -149,12 +373,14 @@ class SiteUserUpdateEmailView(LoginRequiredMixin, generic.UpdateView):
                                     'token': default_token_generator.make_token(user),
                                     'new_email': urlsafe_base64_encode(force_bytes(new_email_address)),
                                }
-        mail.send_mail(
-              subject=subject_template.render(),
-              message=message_body_template.render(message_body_context),
-              from_email=settings.DEFAULT_FROM_EMAIL,
-              recipient_list=[new_email_address, ],
-        )
+        with metrics.EMAIL_SEND_DURATION.time():
+            mail.send_mail(
+                  subject=subject_template.render(),
+                  message=message_body_template.render(message_body_context),
+                  from_email=settings.DEFAULT_FROM_EMAIL,
+                  recipient_list=[new_email_address, ],
+            )
+        metrics.EMAILS_SENT.inc()
 
         return HttpResponseRedirect(self.get_success_url())
         # return super(SiteUserUpdateEmailView, self).form_valid(form)
@@ -201,6 +427,14 @@ class SiteUserUpdateIndexView(LoginRequiredMixin, generic.DetailView):
     def get_object(self):
         return get_object_or_404(SiteUser, user=self.request.user)
 
+    def get_context_data(self, **kwargs):
+        context = super(SiteUserUpdateIndexView, self).get_context_data(**kwargs)
+        context['continue_watching'] = watch_progress.continue_watching(self.object)
+        context['deleted_movies'] = Movie.all_objects.filter(uploader=self.object, deleted_at__isnull=False) \
+                                                     .order_by('-deleted_at')
+        context['storage_quota'] = quotas.get_quota(self.object)
+        return context
+
 
 class SiteUserDeleteView(LoginRequiredMixin, generic.DeleteView):
     model = SiteUser
@@ -211,16 +445,45 @@ class SiteUserDeleteView(LoginRequiredMixin, generic.DeleteView):
 
     def post(self, request, *args, **kwargs):
         siteuser = get_object_or_404(SiteUser, user=self.request.user)
-        siteuser.delete()
-        user = get_object_or_404(User, pk=self.request.user.pk)
-        user.delete()
+        # The account is disabled now and purged by a background job.
+        accounts.delete_account(siteuser)
+        logout(request)
         return HttpResponseRedirect(self.success_url)
 
 
 class MovieDetailView(generic.DetailView):
     model = Movie
 
+    def get(self, request, *args, **kwargs):
+        response = super(MovieDetailView, self).get(request, *args, **kwargs)
+        view_counts.record_view(request, self.object.pk)
+
+        if self.bind_media_url():
+            signed_media.set_cookie(response, request.user.pk)
+        return response
+
+    def bind_media_url(self):
+        return signed_media.is_enabled() \
+            and signed_media.get_signed_media_settings().get('BIND_TO_USER', False) \
+            and self.request.user.is_authenticated
+
+    def get_context_data(self, **kwargs):
+        context = super(MovieDetailView, self).get_context_data(**kwargs)
+        # Precomputed by the update_related_movies command.
+        context['related_movies'] = Movie.objects.filter(related_to__movie=self.object).order_by('related_to__rank')
+
+        if self.bind_media_url():
+            context['media_url'] = signed_media.sign_url(self.object.uploaded_file.name, self.request.user.pk)
+        else:
+            context['media_url'] = self.object.uploaded_file.url
 
+        if self.request.user.is_authenticated:
+            context['resume_position'] = watch_progress.resume_position(self.request.user, self.object)
+            context['heartbeat_interval'] = watch_progress.get_watch_progress_settings().get('HEARTBEAT_INTERVAL', 10)
+        return context
+
+
+@method_decorator(throttle('movie-list'), name='dispatch')
 class MovieListView(generic.ListView):
     model = Movie
     paginate_by = 10
@@ -232,17 +495,23 @@ class MovieListView(generic.ListView):
         if q:
             for keyward in q.split(' '):
                 queryset = queryset.filter(movie_name__icontains=keyward)
-            return queryset
-        return queryset
+        return rankings.order_by_ranking(queryset, self.request.GET.get('sort'))
 
 
+@method_decorator(throttle('upload', methods=('POST', )), name='dispatch')
+@method_decorator(throttle('upload-bytes', methods=('POST', ), cost=content_length), name='dispatch')
 class MovieCreateView(LoginRequiredMixin, generic.CreateView):
     model = Movie
     form_class = MovieUploadForm
+    is_movie_upload = True
 
     def form_valid(self, form):
         form.instance.uploader = get_object_or_404(SiteUser, user_id=self.request.user)
-        return super(MovieCreateView, self).form_valid(form)
+
+        # The movie and the storage counters of its uploader are saved
+        # together.
+        with transaction.atomic():
+            return super(MovieCreateView, self).form_valid(form)
 
 
 class MovieUpdateView(LoginRequiredMixin, generic.UpdateView):
@@ -273,7 +542,19 @@ class MovieDeleteView(LoginRequiredMixin, generic.DeleteView):
         else:
             raise PermissionDenied
 
+    def get_context_data(self, **kwargs):
+        context = super(MovieDeleteView, self).get_context_data(**kwargs)
+        context['retention_days'] = trash.get_soft_delete_settings().get('RETENTION', 30 * 24 * 3600) // (24 * 3600)
+        return context
+
+    def delete(self, request, *args, **kwargs):
+        # Restorable until "manage.py purge_deleted" purges it.
+        self.object = self.get_object()
+        self.object.soft_delete()
+        return HttpResponseRedirect(self.get_success_url())
+
 
+@method_decorator(throttle('comment', methods=('POST', )), name='dispatch')
 class MovieCommentCreateView(LoginRequiredMixin, generic.CreateView):
     model = Comment
     fields = ['description', ]
@@ -0,0 +1,235 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import (
+                        DatabaseError,
+                        IntegrityError,
+                        models,
+                        transaction,
+                      )
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+                        Movie,
+                        SiteUser,
+                        WatchProgress,
+                    )
+
+
+logger = logging.getLogger('movie.watch_progress')
+
+BATCH_SIZE = 500
+
+
+def get_watch_progress_settings():
+    return getattr(settings, 'WATCH_PROGRESS', {})
+
+
+def is_finished(position, duration):
+    return bool(duration) and position >= duration * get_watch_progress_settings().get('FINISHED_RATIO', 0.95)
+
+
+class ProgressBuffer(object):
+    """
+    The latest heartbeat per (user id, movie id) since the last flush, kept
+    in this process. Heartbeats replace each other, so a flush writes each
+    watched movie once however many heartbeats it got.
+    """
+
+    def __init__(self):
+        self._heartbeats = {}
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return len(self._heartbeats)
+
+    def add(self, user_id, movie_id, position, duration, when):
+        with self._lock:
+            self._heartbeats[user_id, movie_id] = (position, duration, when)
+
+    def get(self, user_id, movie_id):
+        return self._heartbeats.get((user_id, movie_id))
+
+    def drain(self):
+        with self._lock:
+            heartbeats, self._heartbeats = self._heartbeats, {}
+        return heartbeats
+
+    def restore(self, heartbeats):
+        with self._lock:
+            for key, heartbeat in heartbeats.items():
+                # Heartbeats received since the drain are newer.
+                self._heartbeats.setdefault(key, heartbeat)
+
+
+buffer = ProgressBuffer()
+_flush_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def upsert(heartbeats):
+    """
+    Writes heartbeats of at most BATCH_SIZE movies: a SELECT of the existing
+    rows, one INSERT of the new ones and one UPDATE of the others. A row is
+    only updated by a newer heartbeat, whichever process flushes first.
+    Returns the number of rows written.
+    """
+    siteusers = dict(
+                    SiteUser.objects.filter(user_id__in={user_id for user_id, movie_id in heartbeats})
+                                    .order_by('-pk')
+                                    .values_list('user_id', 'pk')
+                )
+    movies = set(
+                 Movie.objects.filter(pk__in={movie_id for user_id, movie_id in heartbeats})
+                              .values_list('pk', flat=True)
+             )
+    progress = {
+        (siteusers[user_id], movie_id): heartbeat
+        for (user_id, movie_id), heartbeat in heartbeats.items()
+        if user_id in siteusers and movie_id in movies
+    }
+
+    for attempt in range(2):
+        existing = {
+            (user_id, movie_id): (pk, updated)
+            for user_id, movie_id, pk, updated in WatchProgress.objects.filter(
+                                                                            user_id__in={user_id for user_id, movie_id in progress},
+                                                                            movie_id__in={movie_id for user_id, movie_id in progress}
+                                                                        ).values_list('user_id', 'movie_id', 'pk', 'updated')
+            if (user_id, movie_id) in progress
+        }
+        try:
+            with transaction.atomic():
+                created = WatchProgress.objects.bulk_create([
+                              WatchProgress(
+                                  user_id=user_id,
+                                  movie_id=movie_id,
+                                  position=position,
+                                  duration=duration,
+                                  finished=is_finished(position, duration),
+                                  updated=when
+                              )
+                              for (user_id, movie_id), (position, duration, when) in progress.items()
+                              if (user_id, movie_id) not in existing
+                          ])
+        except IntegrityError:
+            # Another process inserted some of the rows meanwhile. Twice
+            # means something else is wrong: the caller restores them.
+            if attempt:
+                raise
+            continue
+        break
+
+    # Rows already holding a newer heartbeat are left alone.
+    newer_rows = {key: pk for key, (pk, updated) in existing.items() if updated < progress[key][2]}
+    updated = 0
+
+    if newer_rows:
+        def newer(field, value):
+            return models.Case(
+                       *[models.When(pk=pk, updated__lt=progress[key][2], then=models.Value(value(*progress[key])))
+                         for key, pk in newer_rows.items()],
+                       default=models.F(field),
+                       output_field=WatchProgress._meta.get_field(field)
+                   )
+
+        updated = WatchProgress.objects.filter(pk__in=list(newer_rows.values())).update(
+                      position=newer('position', lambda position, duration, when: position),
+                      duration=newer('duration', lambda position, duration, when: duration),
+                      finished=newer('finished', lambda position, duration, when: is_finished(position, duration)),
+                      updated=newer('updated', lambda position, duration, when: when)
+                  )
+    return len(created) + updated
+
+
+def flush():
+    """
+    Writes the buffered positions, BATCH_SIZE movies per transaction.
+    Returns the number of positions written.
+    """
+    global _flushed_at
+
+    with _flush_lock:
+        _flushed_at = time.monotonic()
+        heartbeats = buffer.drain()
+        keys = sorted(heartbeats)
+        written = 0
+
+        try:
+            for start in range(0, len(keys), BATCH_SIZE):
+                with transaction.atomic():
+                    written += upsert({key: heartbeats[key] for key in keys[start:start + BATCH_SIZE]})
+        except DatabaseError:
+            buffer.restore({key: heartbeats[key] for key in keys[start:]})
+            raise
+        return written
+
+
+def maybe_flush():
+    options = get_watch_progress_settings()
+
+    if buffer.pending < options.get('MAX_PENDING', 500) \
+       and time.monotonic() - _flushed_at < options.get('FLUSH_INTERVAL', 30):
+        return
+
+    try:
+        flush()
+    except DatabaseError:
+        logger.exception('Could not flush watch progress.')
+
+
+def flush_at_shutdown():
+    """
+    Flushes the buffered positions, from the shutdown hook of the server
+    (see movie.asgi), as they are lost with the process otherwise.
+    """
+    if buffer.pending:
+        try:
+            flush()
+        except DatabaseError:
+            logger.exception('Could not flush watch progress at shutdown.')
+
+
+@receiver(request_finished)
+def flush_after_request(sender, **kwargs):
+    # A process gone idle flushes with its next request, of any page.
+    if buffer.pending:
+        maybe_flush()
+
+
+def record_heartbeat(user_id, movie_id, position, duration=None):
+    if not get_watch_progress_settings().get('ENABLED', True):
+        return
+
+    buffer.add(user_id, movie_id, position, duration, timezone.now())
+    maybe_flush()
+
+
+def resume_position(user, movie):
+    """
+    Where ``user`` stopped watching ``movie`` in seconds, 0 once finished.
+    """
+    heartbeat = buffer.get(user.pk, movie.pk)
+
+    if heartbeat is not None:
+        position, duration = heartbeat[:2]
+    else:
+        progress = WatchProgress.objects.filter(user__user=user, movie=movie).values_list('position', 'duration').first()
+        if progress is None:
+            return 0
+        position, duration = progress
+    return 0 if is_finished(position, duration) else position
+
+
+def continue_watching(siteuser):
+    """
+    The unfinished movies ``siteuser`` watched, most recent first.
+    """
+    return WatchProgress.objects.filter(user=siteuser, finished=False, movie__deleted_at=None) \
+                                .select_related('movie') \
+                                .order_by('-updated')[:get_watch_progress_settings().get('CONTINUE_WATCHING', 10)]
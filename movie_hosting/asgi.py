@@ -0,0 +1,21 @@
+"""
+ASGI config for movie_hosting project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with an ASGI server, for example::
+
+    uvicorn movie_hosting.asgi:application
+
+Media files are streamed asynchronously; other requests are handled by the
+WSGI application (see movie_hosting/wsgi.py) on a thread pool.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "movie_hosting.settings")
+
+from movie.asgi import ASGIHandler  # noqa: E402 (needs the settings module)
+
+application = ASGIHandler(get_wsgi_application())
@@ -44,11 +44,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'movie.middleware.MetricsMiddleware',
+    'movie.middleware.RequestTimingMiddleware',
+    'movie.profiling.ProfilingMiddleware',
+    'movie.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'movie.staticfiles.StaticFilesMiddleware',
+    'movie.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'movie.quotas.UploadQuotaMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'movie.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -123,10 +129,71 @@ USE_TZ = True
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 STATIC_URL = '/static/'
+STATICFILES_STORAGE = 'movie.storage.CompressedManifestStaticFilesStorage'
+
+# "manage.py collectstatic" writes content hashed names, the manifest used by
+# {% static %}, and gzip (and brotli, if the brotli package is installed)
+# variants of COMPRESS_EXTENSIONS files of at least MIN_SIZE bytes.
+# StaticFilesMiddleware serves them by Accept-Encoding; hashed names are
+# cached as immutable.
+STATIC_FILES = {
+    'ENABLED': True,
+    'COMPRESS_EXTENSIONS': ('.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.xml', ),
+    'MIN_SIZE': 256,
+    'GZIP_LEVEL': 9,
+    'BROTLI_QUALITY': 11,
+    'MAX_AGE': 60,
+    'IMMUTABLE_MAX_AGE': 60 * 60 * 24 * 365,
+}
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# movie_hosting.asgi streams MEDIA_URL asynchronously in MEDIA_CHUNK_SIZE
+# chunks read on FILE_THREADS threads, and runs every other request with the
+# WSGI application on WSGI_THREADS threads. Request bodies over
+# MAX_BUFFERED_BODY bytes are spooled to disk.
+ASGI = {
+    'MEDIA_CHUNK_SIZE': 64 * 1024,
+    'FILE_THREADS': 16,
+    'WSGI_THREADS': 32,
+    'MAX_BUFFERED_BODY': 1024 * 1024,
+}
+
+DEFAULT_FILE_STORAGE = 'movie.storage.ShardedFileSystemStorage'
+
+# Media files are spread over the ROOTS directories, one per disk, by
+# consistent hashing of their names with VNODES points per root (MEDIA_ROOT
+# alone if there are none). After adding a root, run "manage.py
+# rebalance_media", which moves the files now owned by it on WORKERS
+# threads, BATCH_SIZE movies at a time; until they are moved, they are read
+# from their old root.
+MEDIA_SHARDS = {
+    'ROOTS': [],
+    'VNODES': 64,
+    'WORKERS': 8,
+    'BATCH_SIZE': 500,
+}
+
+# Media URLs are signed with an HMAC of the file name and an expiry MAX_AGE
+# seconds ahead, rounded up to GRANULARITY seconds, and movie_hosting.asgi
+# serves MEDIA_URL to valid signatures only, checked without queries, as
+# does the DEBUG route of movie_hosting/urls.py. A web server serving
+# MEDIA_ROOT itself does not check them. New URLs are signed with a key
+# derived from CURRENT_KEY of KEYS (SECRET_KEY if there are none); to
+# rotate, add a key, make it current, and remove the old one MAX_AGE seconds
+# later. With BIND_TO_USER, the URLs movie pages give logged in users only
+# work with their signed COOKIE_NAME cookie.
+SIGNED_MEDIA = {
+    'ENABLED': True,
+    'KEYS': {},
+    'CURRENT_KEY': None,
+    'MAX_AGE': 6 * 3600,
+    'GRANULARITY': 600,
+    'BIND_TO_USER': False,
+    'COOKIE_NAME': 'media_user',
+}
+
 
 if DEBUG:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -135,9 +202,287 @@ DEFAULT_FROM_EMAIL = 'test@example.com'
 
 LOGIN_REDIRECT_URL = '/'
 
-# django REST framework settings
+# django REST framework settings. The API is for staff users, and for API
+# keys of any user within the scopes of the key.
 REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+        'movie.api.authentication.APIKeyAuthentication',
+    ),
     'DEFAULT_PERMISSION_CLASSES': (
-        'rest_framework.permissions.IsAdminUser',
+        'movie.api.permissions.IsAdminUserOrAPIKey',
+        'movie.api.permissions.HasAPIKeyScope',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'movie.api.throttling.TokenBucketThrottle',
+        'movie.api.throttling.UploadBytesThrottle',
     ),
+    'EXCEPTION_HANDLER': 'movie.api.exceptions.exception_handler',
+}
+
+# Responses of CONTENT_TYPES are compressed with brotli (when the brotli
+# package is installed) or gzip, by Accept-Encoding. Non-streaming responses
+# under MIN_SIZE bytes are sent as they are. Media such as video/mp4 is not
+# listed, as it is already compressed.
+COMPRESSION = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    'CONTENT_TYPES': (
+        'text/',
+        'application/json',
+        'application/javascript',
+        'application/xml',
+        'image/svg+xml',
+    ),
+}
+
+# Verified API keys are cached per process. Revocation is propagated through
+# the default cache, so it must be shared (e.g. memcached) between workers.
+API_KEY_CACHE = {
+    'max_size': 1024,
+    'ttl': 300,
+    'revalidate_interval': 5,
+}
+
+# Token bucket rates per scope as '<tokens>/<period>'. Byte buckets take one
+# token per request body byte. LocalMemoryStore keeps buckets per process;
+# use 'movie.throttling.CacheStore' with a shared cache for several workers.
+THROTTLE = {
+    'ENABLED': True,
+    'STORE': 'movie.throttling.LocalMemoryStore',
+    'NUM_PROXIES': 0,
+    'RATES': {
+        'movie-list': '120/min',
+        'comment': '30/min',
+        'upload': '20/hour',
+        'upload-bytes': '{bytes}/hour'.format(bytes=4 * 1024 ** 3),
+        'api': '600/min',
+        'api-upload-bytes': '{bytes}/hour'.format(bytes=4 * 1024 ** 3),
+    },
+}
+
+# Requests over these budgets are logged at WARNING level to the
+# 'movie.request' logger, the others at INFO level.
+REQUEST_TIMING = {
+    'QUERY_COUNT_BUDGET': 50,
+    'LATENCY_BUDGET': 0.5,
+}
+
+# Movie views are buffered by BUFFER and added to Movie.view_count in
+# batched UPDATEs once MAX_PENDING views are pending or FLUSH_INTERVAL
+# seconds passed, checked after every request; the ASGI server flushes the
+# rest on shutdown. A viewer is counted once per movie and DEDUPE_WINDOW
+# seconds. 'movie.view_counts.CacheBuffer' keeps the pending views in the
+# shared cache instead of the process.
+VIEW_COUNTS = {
+    'ENABLED': True,
+    'BUFFER': 'movie.view_counts.LocalBuffer',
+    'CACHE_ALIAS': 'default',
+    'MAX_PENDING': 100,
+    'FLUSH_INTERVAL': 10,
+    'DEDUPE_WINDOW': 30 * 60,
+}
+
+# Players post the position every HEARTBEAT_INTERVAL seconds. The latest
+# position per user and movie is kept in the process and upserted into
+# WatchProgress in batches once MAX_PENDING movies are pending or
+# FLUSH_INTERVAL seconds passed, checked after every request; the ASGI
+# server flushes the rest on shutdown. A movie watched to FINISHED_RATIO of its
+# duration starts over and leaves the CONTINUE_WATCHING list of the account
+# page.
+WATCH_PROGRESS = {
+    'ENABLED': True,
+    'HEARTBEAT_INTERVAL': 10,
+    'MAX_PENDING': 500,
+    'FLUSH_INTERVAL': 30,
+    'FINISHED_RATIO': 0.95,
+    'CONTINUE_WATCHING': 10,
+}
+
+# Rankings are updated by "manage.py update_rankings", to be run every few
+# minutes. Trending scores add up event weights halving every HALF_LIFE
+# seconds: an upload counts UPLOAD_WEIGHT, a comment COMMENT_WEIGHT and a
+# view VIEW_WEIGHT.
+RANKING = {
+    'HALF_LIFE': 24 * 60 * 60,
+    'UPLOAD_WEIGHT': 10,
+    'COMMENT_WEIGHT': 5,
+    'VIEW_WEIGHT': 1,
+}
+
+# Related movies shown on the movie page, precomputed by the
+# update_related_movies command (needs numpy and scipy). Similarity mixes
+# tf-idf of the words of names (counted NAME_WEIGHT times) and descriptions
+# with the overlap of commenters, weighted COMMENTER_WEIGHT. Words found in
+# more than MAX_DF of the movies are ignored, which keeps the similarity
+# products sparse, as are similarities below MIN_SCORE. BLOCK_SIZE movies are
+# compared with the catalogue at a time.
+RECOMMENDATIONS = {
+    'COUNT': 6,
+    'NAME_WEIGHT': 2,
+    'COMMENTER_WEIGHT': 0.3,
+    'MAX_DF': 0.01,
+    'MIN_SCORE': 0.05,
+    'BLOCK_SIZE': 2000,
 }
+
+# Uploads are copied into the timelines of the followers of their uploader
+# by background jobs, BATCH_SIZE followers per job. Uploads of uploaders with
+# FAN_OUT_LIMIT followers or more are not copied but merged into the feeds
+# when read. Following an uploader adds their BACKFILL latest movies. The
+# home page shows the FEED_SIZE latest movies of the feed. Run "manage.py
+# recount_pulled_follows" after changing FAN_OUT_LIMIT.
+TIMELINES = {
+    'FAN_OUT_LIMIT': 10000,
+    'BATCH_SIZE': 1000,
+    'BACKFILL': 20,
+    'FEED_SIZE': 20,
+}
+
+# Background jobs, run by "manage.py process_jobs". A worker claims
+# BATCH_SIZE due jobs at a time for LEASE seconds, after which they are due
+# again in case the worker died, and polls every POLL_INTERVAL seconds when
+# idle. Failing jobs are retried after RETRY_DELAY seconds, doubled for each
+# attempt, and kept as failed after MAX_ATTEMPTS attempts.
+JOBS = {
+    'BATCH_SIZE': 10,
+    'LEASE': 300,
+    'POLL_INTERVAL': 1,
+    'RETRY_DELAY': 10,
+    'MAX_ATTEMPTS': 5,
+}
+
+# Deleted accounts are disabled at once and purged by background jobs,
+# BATCH_SIZE rows per job. Queue purges that failed for good again with
+# "manage.py resume_account_deletions".
+ACCOUNT_DELETION = {
+    'BATCH_SIZE': 100,
+}
+
+# Movies and comments deleted on the site are hidden and can be restored
+# for RETENTION seconds. "manage.py purge_deleted", to be run daily, then
+# deletes them and their files, CHUNK_SIZE rows per transaction with PAUSE
+# seconds between them.
+SOFT_DELETE = {
+    'RETENTION': 30 * 24 * 3600,
+    'CHUNK_SIZE': 100,
+    'PAUSE': 0.1,
+}
+
+# Each user may store QUOTA bytes of movies, unless their SiteUser sets
+# another quota. Uploads over it are refused with 413 as soon as their
+# Content-Length or the file bytes received so far exceed what is left;
+# other forms only count their files, so edits work at quota. Deleted
+# movies count until they are purged, and concurrent uploads may each fit
+# on their own. "manage.py reconcile_storage" measures the stored files on
+# WORKERS threads and recounts the usage, BATCH_SIZE rows at a time.
+STORAGE_QUOTA = {
+    'QUOTA': 10 * 1024 ** 3,
+    'WORKERS': 8,
+    'BATCH_SIZE': 500,
+}
+
+FILE_UPLOAD_HANDLERS = [
+    'movie.quotas.QuotaUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Movies may also be uploaded without passing through Django: the
+# movie-upload-url view signs a URL under URL_PREFIX that is valid for
+# MAX_AGE seconds, the receiver of movie_hosting.asgi or movie_hosting.wsgi
+# writes the PUT body to STAGING_ROOT in CHUNK_SIZE chunks, and the
+# movie-upload-finalize view moves it to MEDIA_ROOT and creates the movie.
+# STAGING_ROOT should be on the file system of MEDIA_ROOT, so the move is a
+# rename. BASE_URL, if set, is the origin of the upload receiver.
+DIRECT_UPLOAD = {
+    'URL_PREFIX': '/upload/',
+    'MAX_AGE': 3600,
+    'CHUNK_SIZE': 64 * 1024,
+    'STAGING_ROOT': os.path.join(BASE_DIR, 'uploads'),
+    'BASE_URL': None,
+}
+
+# Search suggestions are served from an in-memory prefix index of the movie
+# names, ordered by view count, without database queries. Each process loads
+# it from SNAPSHOT, written by "manage.py build_autocomplete_index" and
+# reloaded when it changes (checked every CHECK_INTERVAL seconds), or builds
+# it from the database without one, at startup under ASGI. Movies saved or
+# deleted by a process are indexed at once there only: the other processes
+# serve stale suggestions until they load the next snapshot, so rebuild it
+# periodically (e.g. every few minutes from cron). Queries without a word of
+# MIN_LENGTH characters get no suggestions; results of queries matching more
+# than SCAN_LIMIT words are cached, up to CACHE_SIZE of them, until a
+# matching movie changes.
+AUTOCOMPLETE = {
+    'SNAPSHOT': os.path.join(BASE_DIR, 'autocomplete.json'),
+    'CHECK_INTERVAL': 30,
+    'RESULTS': 10,
+    'MIN_LENGTH': 2,
+    'SCAN_LIMIT': 500,
+    'CACHE_SIZE': 1000,
+}
+
+# The admin counts changelists up to COUNT_LIMIT rows. Larger tables show
+# an estimate from the table statistics, larger search results COUNT_LIMIT.
+ADMIN = {
+    'COUNT_LIMIT': 10000,
+}
+
+# Prometheus metrics served at /metrics. With prefork servers such as mod_wsgi
+# set MULTIPROCESS_DIR to a directory shared by the processes of one
+# deployment; each process writes its snapshot there every FLUSH_INTERVAL
+# seconds and the scraped process merges them. Staff users may read it, and
+# scrapers from ALLOWED_IPS sending "Authorization: Bearer <TOKEN>" when
+# TOKEN is set. Behind a reverse proxy every request comes from the proxy's
+# address, so set TOKEN there.
+METRICS = {
+    'MULTIPROCESS_DIR': os.environ.get('DJANGO_METRICS_DIR'),
+    'FLUSH_INTERVAL': 5,
+    'ALLOWED_IPS': ('127.0.0.1', '::1', ),
+    'TOKEN': os.environ.get('DJANGO_METRICS_TOKEN'),
+}
+
+# Profiles SAMPLE_RATE of the requests, and requests whose HEADER carries a
+# token from "manage.py profile_token", into DIRECTORY. Read them with
+# "manage.py profile_report". The middleware removes itself when disabled.
+PROFILING = {
+    'ENABLED': bool(os.environ.get('DJANGO_PROFILING', False)),
+    'SAMPLE_RATE': 0.0,
+    'DIRECTORY': os.path.join(BASE_DIR, 'profiles'),
+    'HEADER': 'X-Profile',
+    'TOKEN_MAX_AGE': 3600,
+    'SAMPLING_INTERVAL': 0.001,
+}
+
+# Queries slower than THRESHOLD seconds are logged to the 'movie.slow_query'
+# logger and appended to PATH as JSON lines with their query plan, without
+# their parameters. PATH is rotated past MAX_BYTES, keeping BACKUP_COUNT
+# old files. Summarize them with "manage.py slow_query_report".
+SLOW_QUERY_LOG = {
+    'ENABLED': bool(os.environ.get('DJANGO_SLOW_QUERY_LOG', False)),
+    'THRESHOLD': 0.1,
+    'PATH': os.path.join(BASE_DIR, 'slow_queries.jsonl'),
+    'MAX_BYTES': 10 * 1024 ** 2,
+    'BACKUP_COUNT': 3,
+}
+
+# Serves sessions (write-through to the database) and the users of
+# authenticated requests from CACHE_ALIAS, which saves the session and user
+# SELECTs on cache hits. The cache must be shared by all workers. Sessions
+# are only written when their data or key changed; purge expired ones with
+# "manage.py clear_expired_sessions". Saving a user drops its cached copy;
+# after changing users with QuerySet.update() (e.g. deactivating them) run
+# "manage.py invalidate_cached_users", or they stay cached for USER_TIMEOUT.
+CACHED_AUTH = {
+    'ENABLED': bool(os.environ.get('DJANGO_CACHED_AUTH', False)),
+    'CACHE_ALIAS': 'default',
+    'USER_TIMEOUT': 300,
+}
+
+if CACHED_AUTH['ENABLED']:
+    SESSION_ENGINE = 'movie.sessions'
+    SESSION_CACHE_ALIAS = CACHED_AUTH['CACHE_ALIAS']
@@ -18,12 +18,18 @@ from django.conf.urls import include, url
 from django.contrib import admin
 from django.views.generic.base import RedirectView
 
+from movie.views import (
+                            metrics_exposition,
+                            serve_media,
+                         )
+
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^$', RedirectView.as_view(pattern_name='index'), name='top-page'),
     url(r'^movie/', include('movie.urls')),
     url(r'^accounts/', include('django.contrib.auth.urls')),
     url(r'^api/v1/', include('movie.api.urls')),
+    url(r'^metrics$', metrics_exposition, name='metrics'),
 ]
 
 # This is not needed because this helper function works only in debug mode
@@ -32,5 +38,6 @@ urlpatterns = [
 if settings.DEBUG:
     from django.conf.urls.static import static
 
-    urlpatterns += static(settings.MEDIA_URL, document_root=(settings.MEDIA_ROOT))
+    # Media URLs are signed, so they are checked before being served.
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media)
     urlpatterns += static(settings.STATIC_URL, document_root=(settings.STATIC_ROOT))
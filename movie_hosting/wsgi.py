@@ -2,6 +2,10 @@
 WSGI config for movie_hosting project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+PUTs to the signed upload URLs (DIRECT_UPLOAD['URL_PREFIX']) are received
+without going through Django; run them on processes of their own, so
+uploads tie up no application workers, by routing that prefix to another
+server running this module.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/1.11/howto/deployment/wsgi/
@@ -13,4 +17,6 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "movie_hosting.settings")
 
-application = get_wsgi_application()
+from movie.uploads import UploadReceiver  # noqa: E402 (needs the settings module)
+
+application = UploadReceiver(get_wsgi_application())